@@ -30,7 +30,7 @@ Features:
         'web',
     ],
     'external_dependencies': {
-        'python': ['dateutil'],
+        'python': ['dateutil', 'numpy'],
     },
     'data': [
         # Security
@@ -40,6 +40,7 @@ Features:
 
         # Data
         'data/sequences.xml',
+        'data/cron.xml',
         
         
         
@@ -50,8 +51,14 @@ Features:
         'views/apartment_views.xml',
         'views/person_views.xml',
         'views/person_apartment_views.xml',
+        'views/appel_fond_line_views.xml',
         'views/appel_fond_views.xml',
         'views/reglement_views.xml',
+        'views/reglement_allocation_views.xml',
+        'views/bordereau_remise_views.xml',
+        'views/arrears_views.xml',
+        'views/collection_cube_views.xml',
+        'views/perf_stat_views.xml',
         #reports
         'report/reglement_receipt_report.xml',
         'report/report_reglement_receipt_templates.xml',
@@ -60,7 +67,16 @@ Features:
         'views/contact_views.xml',
         'views/bank_account_views.xml',
         'views/charge_category_views.xml',
+        'views/repartition_key_views.xml',
         'views/budget_views.xml',
+        'views/expense_views.xml',
+
+        # Wizards
+        'wizard/bank_statement_import_views.xml',
+        'wizard/encaissement_wizard_views.xml',
+        'wizard/ledger_export_wizard_views.xml',
+        'wizard/onboarding_import_views.xml',
+        'wizard/receipt_download_views.xml',
 
         # Menu last
         'views/menu.xml',
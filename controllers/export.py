@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import tempfile
+
+from werkzeug.exceptions import BadRequest, NotFound
+from werkzeug.wsgi import wrap_file
+
+from odoo import api, http
+from odoo.exceptions import UserError
+from odoo.http import request, content_disposition
+from odoo.modules.registry import Registry
+
+from ..models.export_api import EXPORT_PAGE_DEFAULT, EXPORT_PAGE_MAX, encode_token, decode_token
+
+EXPORT_RESOURCES = {
+    'reglements': 'syndic.reglement',
+    'appels': 'syndic.appel.fond',
+    'lignes': 'syndic.appel.fond.line',
+}
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+LEDGER_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Taille des morceaux envoyés au client
+EXPORT_CHUNK = 64 * 1024
+
+
+class SyndicExport(http.Controller):
+
+    @http.route('/syndic/export/<string:resource>', type='http', auth='user', methods=['GET'])
+    def export(self, resource, since=None, limit=None, format='ndjson', **kwargs):
+        """Export incrémental des règlements, appels ou lignes d'appel.
+
+        Paramètres : ``since`` (jeton d'une réponse précédente, absent pour
+        un export complet), ``limit`` (lignes par page) et ``format``
+        (``ndjson`` ou ``csv``). La réponse porte ``X-Syndic-Next-Token``,
+        à repasser en ``since`` pour la page suivante ou la prochaine
+        synchronisation, et ``X-Syndic-Has-More``. Exemple ::
+
+            curl -b session_id=... 'http://localhost:8069/syndic/export/reglements?limit=50000'
+        """
+        model_name = EXPORT_RESOURCES.get(resource)
+        if not model_name:
+            raise NotFound()
+        if format not in EXPORT_FORMATS:
+            raise BadRequest("Format inconnu : %s" % format)
+        try:
+            limit = int(limit or EXPORT_PAGE_DEFAULT)
+        except ValueError:
+            raise BadRequest("Paramètre limit invalide.")
+        if not 0 < limit <= EXPORT_PAGE_MAX:
+            raise BadRequest("limit doit être compris entre 1 et %s." % EXPORT_PAGE_MAX)
+        try:
+            since_key = decode_token(model_name, since) if since else None
+        except UserError as e:
+            raise BadRequest(str(e))
+
+        until, has_more = request.env[model_name]._export_page(since_key, limit)
+        headers = [
+            ('Content-Type', EXPORT_FORMATS[format]),
+            ('X-Syndic-Next-Token', encode_token(model_name, *until) if until else (since or '')),
+            ('X-Syndic-Has-More', '1' if has_more else '0'),
+        ]
+        if not until:
+            return request.make_response('', headers)
+        stream = self._export_stream(model_name, since_key, until, format)
+        return request.make_response(stream, headers)
+
+    def _export_stream(self, model_name, since, until, format):
+        """Générateur de la réponse, avec son propre curseur.
+
+        La réponse est consommée après la fermeture du curseur de la
+        requête : le flux ouvre le sien, sous le même utilisateur.
+        """
+        dbname, uid, context = request.db, request.env.uid, dict(request.env.context)
+
+        def generate():
+            with Registry(dbname).cursor() as cr:
+                Model = api.Environment(cr, uid, context)[model_name]
+                buffer = io.StringIO()
+                if format == 'csv':
+                    writer = csv.DictWriter(buffer, ['id', 'write_date'] + list(Model._export_fields))
+                    writer.writeheader()
+                for row in Model._export_rows(since, until):
+                    if format == 'csv':
+                        writer.writerow({key: '' if value is False else value for key, value in row.items()})
+                    else:
+                        buffer.write(json.dumps(row, default=str) + '\n')
+                    if buffer.tell() >= EXPORT_CHUNK:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue()
+
+        return generate()
+
+    @http.route('/syndic/ledger/<int:wizard_id>', type='http', auth='user', methods=['GET'])
+    def ledger(self, wizard_id, **kwargs):
+        """Grand livre d'une résidence, préparé par ``syndic.ledger.export.wizard``.
+
+        Le fichier est écrit dans un fichier temporaire au fil de la lecture
+        SQL puis renvoyé par morceaux : rien n'est chargé en mémoire.
+        """
+        wizard = request.env['syndic.ledger.export.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            raise NotFound()
+        fileobj = tempfile.TemporaryFile()
+        wizard._write_ledger(fileobj)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        headers = [
+            ('Content-Type', LEDGER_MIMETYPES[wizard.file_format]),
+            ('Content-Length', size),
+            ('Content-Disposition', content_disposition(wizard._ledger_filename())),
+        ]
+        return request.make_response(wrap_file(request.httprequest.environ, fileobj), headers)
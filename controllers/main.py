@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from odoo import http
+from odoo.http import request
+
+
+class SyndicDashboard(http.Controller):
+
+    @http.route('/syndic/collection_cube', type='json', auth='user')
+    def collection_cube(self, domain=None, groupby=None):
+        """Agrégats dû / encaissé du cube de collecte.
+
+        Exemple : ``{"groupby": ["residence_id", "date:month"],
+        "domain": [["annee", "=", 2024]]}``. Les droits d'accès et règles de
+        l'utilisateur s'appliquent.
+        """
+        return request.env['syndic.collection.cube']._get_dashboard_data(domain, groupby)
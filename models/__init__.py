@@ -1,11 +1,25 @@
+from . import ir_sequence
+from . import bulk_state
+from . import search_mixin
+from . import display_name
+from . import export_api
 from . import residence
 from . import building
 from . import apartment
 from . import person
 from . import person_apartment
 from . import appel_fond
+from . import appel_fond_line
 from . import reglement
+from . import reglement_allocation
+from . import bordereau_remise
+from . import arrears
+from . import collection_cube
 from . import contact
 from . import bank_account
 from . import charge_category
-from . import budget
\ No newline at end of file
+from . import repartition_key
+from . import budget
+from . import expense
+from . import benchmark
+from . import perf_stat
\ No newline at end of file
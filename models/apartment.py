@@ -2,12 +2,20 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .display_name import selection_label_sql
+
 
 class Apartment(models.Model):
     _name = 'syndic.apartment'
     _description = 'Appartement / Lot'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.search.mixin', 'syndic.display.name.mixin']
     _order = 'num'
+    _search_key_fields = ('display_name',)
+    _search_exact_fields = ('num',)
+    _display_name_flush = {
+        'syndic.building': ['name'],
+        'syndic.apartment': ['num', 'type', 'building_id'],
+    }
 
     num = fields.Char(
         string='Numéro',
@@ -60,7 +68,8 @@ class Apartment(models.Model):
     # Computed fields
     owner_count = fields.Integer(
         string='Nombre de propriétaires',
-        compute='_compute_owner_count'
+        compute='_compute_owner_count',
+        store=True
     )
     total_quote_part = fields.Float(
         string='Total quote-part',
@@ -76,7 +85,8 @@ class Apartment(models.Model):
     # Display name
     display_name = fields.Char(
         compute='_compute_display_name',
-        store=True
+        store=True,
+        index='trigram'
     )
     
     @api.depends('num', 'building_id.name', 'type')
@@ -87,11 +97,22 @@ class Apartment(models.Model):
                 record.display_name = f"{record.building_id.name} - {record.num} ({type_label})"
             else:
                 record.display_name = f"{record.num} ({type_label})"
+
+    def _display_name_sql(self):
+        type_label, params = selection_label_sql(self._fields['type'], 's.type')
+        return (
+            "LEFT JOIN syndic_building b ON b.id = s.building_id",
+            "concat(CASE WHEN b.id IS NOT NULL THEN concat(b.name, ' - ') END, s.num, ' (', %s, ')')"
+            % type_label,
+            params,
+        )
     
-    @api.depends('person_apartment_ids')
+    @api.depends('person_apartment_ids', 'person_apartment_ids.active')
     def _compute_owner_count(self):
+        counts = dict(self.env['syndic.person.apartment']._read_group(
+            [('apartment_id', 'in', self.ids)], ['apartment_id'], ['__count']))
         for record in self:
-            record.owner_count = len(record.person_apartment_ids)
+            record.owner_count = counts.get(record, 0)
     
     @api.depends('person_apartment_ids.quote_part')
     def _compute_total_quote_part(self):
@@ -1,13 +1,36 @@
 # -*- coding: utf-8 -*-
+import logging
+import threading
+from collections import defaultdict
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+_logger = logging.getLogger(__name__)
+
+# Champs dont la modification change les faits du cube de collecte
+CUBE_FIELDS = {'residence_id', 'annee', 'mois', 'date_emission', 'type_charge', 'state', 'active'}
+# Nombre de mois entre deux appels d'une même récurrence
+PERIODE_MONTHS = {
+    'mensuel': 1,
+    'trimestriel': 3,
+    'semestriel': 6,
+    'annuel': 12,
+}
+
 
 class AppelFond(models.Model):
     _name = 'syndic.appel.fond'
     _description = 'Appel de Fonds / Cotisation'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.bulk.state.mixin', 'syndic.export.mixin']
     _order = 'date_emission desc'
+    _export_fields = (
+        'name', 'libelle', 'residence_id', 'type_charge', 'category_id', 'annee', 'mois',
+        'date_emission', 'date_echeance', 'montant', 'montant_total', 'state', 'active',
+    )
 
     name = fields.Char(
         string='Référence',
@@ -47,6 +70,20 @@ class AppelFond(models.Model):
         ('semestriel', 'Semestriel'),
         ('annuel', 'Annuel'),
     ], string='Périodicité', default='mensuel', required=True, tracking=True)
+    recurrent = fields.Boolean(
+        string='Récurrent',
+        tracking=True,
+        copy=False,
+        help='Sert de modèle : l\'appel de la période suivante est généré automatiquement'
+    )
+    template_id = fields.Many2one(
+        'syndic.appel.fond',
+        string='Modèle récurrent',
+        copy=False,
+        readonly=True,
+        ondelete='set null',
+        index=True
+    )
 
     # Type
     type_charge = fields.Selection([
@@ -56,6 +93,21 @@ class AppelFond(models.Model):
         ('provision', 'Provision'),
         ('exceptionnelle', 'Charge exceptionnelle'),
     ], string='Type de charge', default='generale', required=True, tracking=True)
+    category_id = fields.Many2one(
+        'syndic.charge_category',
+        string='Catégorie de charge',
+        index=True,
+        tracking=True,
+        help='Rattache l\'appel au budget de cette catégorie'
+    )
+    repartition_key_id = fields.Many2one(
+        'syndic.repartition.key',
+        string='Clé de répartition',
+        domain="[('residence_id', '=', residence_id)]",
+        tracking=True,
+        help='Si renseignée, le montant est le total à répartir selon les tantièmes '
+             'de la clé ; sinon il est multiplié par la quote-part de chaque lot'
+    )
 
     # Relations
     residence_id = fields.Many2one(
@@ -71,6 +123,13 @@ class AppelFond(models.Model):
         string='Règlements',
         help='Liste des règlements liés à cet appel de fonds'
     )
+    line_ids = fields.One2many(
+        'syndic.appel.fond.line',
+        'appel_fond_id',
+        string='Lignes par lot',
+        readonly=True,
+        help='Montant dû par appartement et copropriétaire, générés à la confirmation'
+    )
 
     # Dates
     date_emission = fields.Date(
@@ -116,14 +175,26 @@ class AppelFond(models.Model):
         string='Nombre d\'appartements',
         compute='_compute_nb_apartments'
     )
+    nb_lines = fields.Integer(
+        string='Nombre de lignes',
+        compute='_compute_nb_lines'
+    )
     montant_collecte = fields.Float(
         string='Montant collecté',
-        compute='_compute_montant_collecte'
+        compute='_compute_montant_collecte',
+        store=True
     )
     taux_collecte = fields.Float(
         string='Taux de collecte (%)',
-        compute='_compute_taux_collecte'
+        compute='_compute_taux_collecte',
+        store=True,
+        group_operator='avg'
     )
+    etat_collecte = fields.Selection([
+        ('aucun', 'Non collecté'),
+        ('partiel', 'Partiellement collecté'),
+        ('complet', 'Entièrement collecté'),
+    ], string='État de collecte', compute='_compute_taux_collecte', store=True)
 
     active = fields.Boolean(
         string='Actif',
@@ -135,11 +206,53 @@ class AppelFond(models.Model):
         string='Notes'
     )
 
-    @api.model
-    def create(self, vals):
-        if vals.get('name', _('Nouveau')) == _('Nouveau'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('syndic.appel.fond') or _('Nouveau')
-        return super(AppelFond, self).create(vals)
+    def init(self):
+        # Recherche des appels par période
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS syndic_appel_fond_period_key_index
+                ON syndic_appel_fond (residence_id, type_charge, annee, mois)
+        """)
+        # Un appel par modèle récurrent et par période : deux modèles du même
+        # type de charge dans une résidence ne se bloquent pas mutuellement
+        self.env.cr.execute("DROP INDEX IF EXISTS syndic_appel_fond_recurrent_unique")
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS syndic_appel_fond_template_period_unique
+                ON syndic_appel_fond (template_id, annee, COALESCE(mois, ''))
+             WHERE template_id IS NOT NULL
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        to_name = [vals for vals in vals_list if vals.get('name', _('Nouveau')) == _('Nouveau')]
+        names = self.env['ir.sequence']._next_block_by_code('syndic.appel.fond', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or _('Nouveau')
+        return super(AppelFond, self).create(vals_list)
+
+    def write(self, vals):
+        if not CUBE_FIELDS.intersection(vals):
+            return super(AppelFond, self).write(vals)
+        cube_keys = self._cube_keys()
+        res = super(AppelFond, self).write(vals)
+        self.env['syndic.collection.cube']._mark_dirty(cube_keys | self._cube_keys())
+        return res
+
+    def unlink(self):
+        cube_keys = self._cube_keys()
+        res = super(AppelFond, self).unlink()
+        self.env['syndic.collection.cube']._mark_dirty(cube_keys)
+        return res
+
+    def _cube_keys(self):
+        """Périodes ``(résidence, année, mois)`` du cube de collecte concernées."""
+        return {
+            (record.residence_id.id, record.annee, record.mois or '%02d' % record.date_emission.month)
+            for record in self if record.residence_id and record.date_emission
+        }
+
+    def _bulk_after_state(self, state, old_states):
+        super(AppelFond, self)._bulk_after_state(state, old_states)
+        self.env['syndic.collection.cube']._mark_dirty(self._cube_keys())
 
     @api.depends('residence_id')
     def _compute_nb_apartments(self):
@@ -152,25 +265,47 @@ class AppelFond(models.Model):
             else:
                 record.nb_apartments = 0
 
-    @api.depends('montant', 'residence_id')
+    @api.depends('line_ids')
+    def _compute_nb_lines(self):
+        counts = dict(self.env['syndic.appel.fond.line']._read_group(
+            [('appel_fond_id', 'in', self.ids)], ['appel_fond_id'], ['__count']))
+        for record in self:
+            record.nb_lines = counts.get(record, 0)
+
+    @api.depends(
+        'montant',
+        'repartition_key_id',
+        'residence_id',
+        'residence_id.person_apartment_ids.quote_part',
+        'residence_id.person_apartment_ids.active',
+        'residence_id.person_apartment_ids.apartment_id',
+        'residence_id.person_apartment_ids.apartment_id.active',
+        'residence_id.person_apartment_ids.building_id.active',
+    )
     def _compute_montant_total(self):
+        """Somme des quotes-parts par résidence en une seule agrégation."""
+        quote_parts = dict(self.env['syndic.person.apartment']._read_group(
+            self.env['syndic.person.apartment']._residence_links_domain(self.residence_id.ids),
+            ['residence_id'],
+            ['quote_part:sum'],
+        ))
         for record in self:
-            total = 0.0
-            if record.residence_id:
-                for building in record.residence_id.building_ids:
-                    for apartment in building.apartment_ids:
-                        for pa in apartment.person_apartment_ids:
-                            total += record.montant * pa.quote_part
-            record.montant_total = total
+            if record.repartition_key_id:
+                # Réparti par tantièmes : les lignes totalisent exactement le montant
+                record.montant_total = record.montant
+            else:
+                record.montant_total = record.montant * quote_parts.get(record.residence_id, 0.0)
 
+    @api.depends('reglement_ids.state', 'reglement_ids.montant', 'reglement_ids.active')
     def _compute_montant_collecte(self):
         """Montant déjà encaissé pour cet appel de fonds."""
-        # À finaliser : somme des règlements au statut 'encaisse'
+        collecte = dict(self.env['syndic.reglement']._read_group(
+            [('appel_fond_id', 'in', self.ids), ('state', '=', 'encaisse')],
+            ['appel_fond_id'],
+            ['montant:sum'],
+        ))
         for rec in self:
-            rec.montant_collecte = sum(
-                reg.montant for reg in rec.reglement_ids
-                if reg.state == 'encaisse'
-            )
+            rec.montant_collecte = collecte.get(rec, 0.0)
 
     @api.depends('montant_total', 'montant_collecte')
     def _compute_taux_collecte(self):
@@ -179,21 +314,208 @@ class AppelFond(models.Model):
                 (record.montant_collecte / record.montant_total * 100)
                 if record.montant_total else 0.0
             )
+            if not record.montant_collecte:
+                record.etat_collecte = 'aucun'
+            elif record.taux_collecte >= 100:
+                record.etat_collecte = 'complet'
+            else:
+                record.etat_collecte = 'partiel'
+
+    @api.model
+    def _cron_check_collecte(self):
+        """Recalcule en SQL les métriques de collecte et corrige les écarts.
+
+        ``montant_collecte``, ``taux_collecte`` et ``etat_collecte`` sont
+        comparés à leur valeur recalculée ; une seule divergence suffit à
+        corriger l'appel. Retourne la liste des appels corrigés (référence,
+        anciens et nouveaux montant collecté et état).
+        """
+        self.env['syndic.reglement'].flush_model(['appel_fond_id', 'state', 'montant', 'active'])
+        self.flush_model(['montant_total', 'montant_collecte', 'taux_collecte', 'etat_collecte'])
+        self.env.cr.execute("""
+            WITH actual AS (
+                SELECT af.id,
+                       COALESCE(SUM(r.montant) FILTER (
+                           WHERE r.state = 'encaisse' AND r.active
+                       ), 0) AS collecte,
+                       COALESCE(af.montant_total, 0) AS total
+                  FROM syndic_appel_fond af
+             LEFT JOIN syndic_reglement r ON r.appel_fond_id = af.id
+              GROUP BY af.id
+            ), rated AS (
+                SELECT id, collecte,
+                       CASE WHEN total <> 0 THEN collecte / total * 100 ELSE 0 END AS taux
+                  FROM actual
+            ), expected AS (
+                SELECT id, collecte, taux,
+                       CASE
+                           WHEN collecte = 0 THEN 'aucun'
+                           WHEN taux >= 100 THEN 'complet'
+                           ELSE 'partiel'
+                       END AS etat
+                  FROM rated
+            )
+            UPDATE syndic_appel_fond af
+               SET montant_collecte = e.collecte,
+                   taux_collecte = e.taux,
+                   etat_collecte = e.etat
+              FROM expected e, syndic_appel_fond old
+             WHERE e.id = af.id
+               AND old.id = af.id
+               AND (ROUND(COALESCE(old.montant_collecte, 0)::numeric, 2) <> ROUND(e.collecte::numeric, 2)
+                    OR ROUND(COALESCE(old.taux_collecte, 0)::numeric, 2) <> ROUND(e.taux::numeric, 2)
+                    OR old.etat_collecte IS DISTINCT FROM e.etat)
+         RETURNING af.id, af.name, old.montant_collecte, e.collecte, old.etat_collecte, e.etat
+        """)
+        drift = self.env.cr.fetchall()
+        if drift:
+            self.invalidate_model(['montant_collecte', 'taux_collecte', 'etat_collecte'])
+            _logger.warning(
+                "Collecte: %d appel(s) de fonds corrigé(s): %s", len(drift),
+                ", ".join("%s (%s/%s -> %s/%s)" % (name, old or 0.0, old_etat, new, new_etat)
+                          for _id, name, old, new, old_etat, new_etat in drift[:50]),
+            )
+        else:
+            _logger.info("Collecte: aucun écart détecté.")
+        return drift
+
+    # Récurrence
+    @api.model
+    def _cron_generate_recurring(self, batch_size=200, today=None, backfill=False):
+        """Génère les appels de la période suivante pour tous les modèles récurrents.
+
+        Seuls les modèles confirmés ou envoyés (et actifs) sont pris en compte.
+        Les modèles sont traités par lots de ``batch_size`` avec un commit après
+        chaque lot : en cas d'interruption, la relance reprend là où elle s'est
+        arrêtée puisque les périodes déjà générées (clé modèle, année, mois)
+        sont ignorées. ``backfill`` rattrape les périodes passées jamais
+        générées ; sinon la génération commence à la période en cours.
+        """
+        today = today or fields.Date.context_today(self)
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        templates = self.search([
+            ('recurrent', '=', True),
+            ('periode', '!=', 'unique'),
+            ('state', 'in', ('confirme', 'envoye')),
+        ], order='residence_id, id')
+        created = self.browse()
+        for start in range(0, len(templates), batch_size):
+            batch = templates[start:start + batch_size]
+            vals_list = batch._prepare_recurring_vals(today, backfill)
+            if vals_list:
+                created |= self.create(vals_list)
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info("Appels récurrents: %d appel(s) généré(s) pour %d modèle(s).",
+                     len(created), len(templates))
+        return created
+
+    def _prepare_recurring_vals(self, today, backfill=False):
+        """Valeurs des appels à créer pour ces modèles jusqu'au mois suivant ``today``.
+
+        Sans ``backfill``, les périodes antérieures à celle qui contient
+        ``today`` ne sont pas rattrapées.
+        """
+        if not self:
+            return []
+        horizon = today + relativedelta(months=1)
+        current = today.replace(day=1)
+        self.flush_model(['template_id', 'annee', 'mois', 'date_emission'])
+        # Périodes couvertes par modèle (modèle lui-même ou appels générés) ;
+        # sans mois (appel annuel...), la période est le mois d'émission
+        self.env.cr.execute("""
+            SELECT COALESCE(template_id, id), annee,
+                   COALESCE(NULLIF(mois, ''), to_char(date_emission, 'MM'))
+              FROM syndic_appel_fond
+             WHERE id IN %(ids)s OR template_id IN %(ids)s
+        """, {'ids': tuple(self.ids)})
+        periods = defaultdict(set)
+        for template_id, annee, mois in self.env.cr.fetchall():
+            periods[template_id].add((annee, mois))
+
+        vals_list = []
+        for template in self:
+            step = relativedelta(months=PERIODE_MONTHS[template.periode])
+            done = periods[template.id]
+            annee, mois = max(done)
+            period_start = date(annee, int(mois), 1) + step
+            if not backfill:
+                while period_start + step <= current:
+                    period_start += step
+            echeance_delay = (
+                template.date_echeance - template.date_emission
+                if template.date_echeance and template.date_emission else None
+            )
+            while period_start <= horizon:
+                mois = '%02d' % period_start.month
+                if (period_start.year, mois) not in done:
+                    done.add((period_start.year, mois))
+                    vals_list.append(template._recurring_vals(period_start, mois, echeance_delay))
+                period_start += step
+        return vals_list
+
+    def _recurring_vals(self, period_start, mois, echeance_delay):
+        self.ensure_one()
+        return {
+            'libelle': self.libelle,
+            'description': self.description,
+            'montant': self.montant,
+            'periode': self.periode,
+            'type_charge': self.type_charge,
+            'category_id': self.category_id.id,
+            'repartition_key_id': self.repartition_key_id.id,
+            'residence_id': self.residence_id.id,
+            'template_id': self.id,
+            'annee': period_start.year,
+            'mois': mois,
+            'date_emission': period_start,
+            'date_echeance': period_start + echeance_delay if echeance_delay is not None else False,
+        }
 
     # Actions
     def action_confirm(self):
-        self.write({'state': 'confirme'})
+        self._set_state('confirme')
+        lines = self.env['syndic.appel.fond.line']._generate_for(self)
+        self.env['syndic.reglement.allocation']._reallocate(lines.person_id.ids)
 
     def action_send(self):
-        self.write({'state': 'envoye'})
+        self._set_state('envoye')
 
     def action_cancel(self):
-        self.write({'state': 'annule'})
+        self._set_state('annule')
+        self.env['syndic.reglement.allocation']._reallocate(self.line_ids.person_id.ids)
 
     def action_draft(self):
-        self.write({'state': 'brouillon'})
+        # Les lignes sont régénérées à la prochaine confirmation
+        person_ids = self.line_ids.person_id.ids
+        self.line_ids.sudo().unlink()
+        self._set_state('brouillon')
+        self.env['syndic.reglement.allocation']._reallocate(person_ids)
+
+    @api.onchange('category_id', 'residence_id')
+    def _onchange_category_id(self):
+        """Propose la clé de la résidence associée à la catégorie."""
+        if self.category_id and self.residence_id:
+            key = self.env['syndic.repartition.key'].search([
+                ('residence_id', '=', self.residence_id.id),
+                ('category_ids', 'in', self.category_id.ids),
+            ], limit=1)
+            if key:
+                self.repartition_key_id = key
 
     # Contraintes
+    @api.constrains('repartition_key_id', 'residence_id', 'category_id', 'state')
+    def _check_repartition_key(self):
+        for record in self:
+            key = record.repartition_key_id
+            if key and key.residence_id != record.residence_id:
+                raise ValidationError(_('La clé de répartition doit appartenir à la résidence de l\'appel!'))
+            if (not key and record.state != 'brouillon'
+                    and record.category_id.is_repartition_key_required):
+                raise ValidationError(_(
+                    'La catégorie %s impose une clé de répartition pour l\'appel %s!',
+                    record.category_id.display_name, record.name))
+
     @api.constrains('montant')
     def _check_montant(self):
         for record in self:
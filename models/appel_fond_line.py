@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from odoo import models, fields, api, _
+
+
+def distribute(amounts, weights, precision_digits=2):
+    """Répartit chaque montant au prorata des poids, au plus fort reste.
+
+    ``amounts`` : un montant par appel ; ``weights`` : poids communs à tous
+    les appels (une colonne par bénéficiaire). Retourne une matrice appels ×
+    bénéficiaires dont chaque ligne, arrondie à ``precision_digits``, a pour
+    somme exacte le montant de l'appel.
+    """
+    factor = 10 ** precision_digits
+    amounts = np.rint(np.asarray(amounts, dtype=np.float64) * factor)
+    weights = np.asarray(weights, dtype=np.float64)
+    total = weights.sum()
+    if not total:
+        return np.zeros((len(amounts), len(weights)))
+    raw = np.outer(amounts, weights / total)
+    shares = np.floor(raw)
+    missing = (amounts - shares.sum(axis=1)).astype(np.int64)
+    # Rang de chaque reste dans sa ligne (stable : à reste égal, ordre des colonnes)
+    ranks = np.argsort(np.argsort(shares - raw, axis=1, kind='stable'), axis=1, kind='stable')
+    shares += ranks < missing[:, None]
+    return shares / factor
+
+
+class AppelFondLine(models.Model):
+    _name = 'syndic.appel.fond.line'
+    _description = 'Ligne d\'appel de fonds (par lot et copropriétaire)'
+    _inherit = ['syndic.export.mixin']
+    _order = 'appel_fond_id, building_id, apartment_id, person_id'
+    # État et échéance suivent l'appel sans modifier write_date : un appel
+    # exporté comme modifié implique de relire ses lignes.
+    _export_fields = (
+        'appel_fond_id', 'residence_id', 'building_id', 'apartment_id', 'person_id',
+        'quote_part', 'montant', 'state', 'date_echeance',
+    )
+
+    appel_fond_id = fields.Many2one(
+        'syndic.appel.fond',
+        string='Appel de fonds',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    building_id = fields.Many2one(
+        'syndic.building',
+        string='Immeuble'
+    )
+    apartment_id = fields.Many2one(
+        'syndic.apartment',
+        string='Appartement',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    person_id = fields.Many2one(
+        'syndic.person',
+        string='Personne',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    person_apartment_id = fields.Many2one(
+        'syndic.person.apartment',
+        string='Copropriété',
+        ondelete='set null'
+    )
+
+    quote_part = fields.Float(
+        string='Quote-part'
+    )
+    montant = fields.Float(
+        string='Montant dû',
+        help='Montant de base de l\'appel multiplié par la quote-part'
+    )
+    tantiemes = fields.Float(
+        string='Tantièmes',
+        help='Tantièmes de la clé de répartition attribués au copropriétaire '
+             '(tantièmes du lot au prorata de sa quote-part) ; vide sans clé'
+    )
+    part_repartition = fields.Float(
+        string='Part de la clé (%)',
+        digits=(16, 4),
+        help='Part du copropriétaire dans le total des tantièmes de la clé ; vide sans clé'
+    )
+
+    # Related fields used in filters / reporting  →  store=True
+    state = fields.Selection(
+        related='appel_fond_id.state',
+        store=True,
+        readonly=True
+    )
+    date_echeance = fields.Date(
+        related='appel_fond_id.date_echeance',
+        store=True,
+        readonly=True
+    )
+
+    @api.model
+    def _generated_fields(self):
+        return [
+            'appel_fond_id', 'residence_id', 'building_id', 'apartment_id', 'person_id',
+            'person_apartment_id', 'quote_part', 'tantiemes', 'part_repartition', 'montant',
+            'state', 'date_echeance',
+        ]
+
+    @api.model
+    def _generate_for(self, appels):
+        """Génère les lignes des appels qui n'en ont pas.
+
+        Sans clé de répartition : une ligne par liaison personne/appartement
+        active de la résidence de l'appel (mêmes critères que
+        ``montant_total``), montant = montant de base × quote-part, en une
+        seule requête. Avec clé : voir ``_generate_keyed``. Retourne les
+        lignes créées.
+        """
+        if not appels:
+            return self.browse()
+        keyed = appels.filtered('repartition_key_id')
+        lines = self._generate_keyed(keyed)
+        appels -= keyed
+        if not appels:
+            return lines
+        self.env['syndic.person.apartment'].flush_model(
+            ['residence_id', 'building_id', 'apartment_id', 'person_id', 'quote_part', 'active'])
+        self.env['syndic.apartment'].flush_model(['active'])
+        self.env['syndic.building'].flush_model(['active'])
+        appels.flush_recordset(['residence_id', 'montant', 'state', 'date_echeance'])
+        self.env.cr.execute("""
+            INSERT INTO syndic_appel_fond_line (
+                appel_fond_id, residence_id, building_id, apartment_id, person_id,
+                person_apartment_id, quote_part, montant, state, date_echeance,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT af.id, pa.residence_id, pa.building_id, pa.apartment_id, pa.person_id,
+                   pa.id, pa.quote_part, af.montant * pa.quote_part, af.state, af.date_echeance,
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM syndic_appel_fond af
+              JOIN syndic_person_apartment pa ON pa.residence_id = af.residence_id AND pa.active
+              JOIN syndic_apartment a ON a.id = pa.apartment_id AND a.active
+              JOIN syndic_building b ON b.id = pa.building_id AND b.active
+             WHERE af.id IN %(ids)s
+               AND NOT EXISTS (
+                   SELECT 1 FROM syndic_appel_fond_line l WHERE l.appel_fond_id = af.id
+               )
+            RETURNING id
+        """, {'uid': self.env.uid, 'ids': tuple(appels.ids)})
+        new_lines = self.browse([row[0] for row in self.env.cr.fetchall()])
+        appels.invalidate_recordset(['line_ids'])
+        # Lignes créées hors ORM : prévenir les champs calculés qui en dépendent
+        new_lines.modified(self._generated_fields(), create=True)
+        return lines | new_lines
+
+    @api.model
+    def _generate_keyed(self, appels):
+        """Répartit le montant des appels selon leur clé de répartition.
+
+        Le montant de l'appel est le total à répartir : chaque lot reçoit sa
+        part de tantièmes, partagée entre ses copropriétaires actifs au
+        prorata de leur quote-part. Les appels d'une même clé sont répartis
+        ensemble par ``distribute`` (arrondi au plus fort reste, la somme des
+        lignes est exactement le montant de l'appel) puis insérés en une
+        requête ``unnest``.
+        """
+        if not appels:
+            return self.browse()
+        self.env['syndic.repartition.key.line'].flush_model(['key_id', 'apartment_id', 'tantiemes'])
+        self.env['syndic.person.apartment'].flush_model(['apartment_id', 'quote_part', 'active'])
+        self.env['syndic.apartment'].flush_model(['active'])
+        self.env['syndic.building'].flush_model(['active'])
+        appels.flush_recordset(['repartition_key_id', 'montant', 'state', 'date_echeance'])
+        self.env.cr.execute("""
+            SELECT id, repartition_key_id, montant
+              FROM syndic_appel_fond af
+             WHERE id IN %s
+               AND NOT EXISTS (SELECT 1 FROM syndic_appel_fond_line l WHERE l.appel_fond_id = af.id)
+          ORDER BY id
+        """, [tuple(appels.ids)])
+        by_key = {}
+        for call_id, key_id, montant in self.env.cr.fetchall():
+            by_key.setdefault(key_id, []).append((call_id, montant))
+        if not by_key:
+            return self.browse()
+        self.env.cr.execute("""
+            SELECT kl.key_id, pa.id,
+                   kl.tantiemes * CASE
+                       WHEN SUM(pa.quote_part) OVER w > 0 THEN pa.quote_part / SUM(pa.quote_part) OVER w
+                       ELSE 1.0 / COUNT(*) OVER w
+                   END
+              FROM syndic_repartition_key_line kl
+              JOIN syndic_person_apartment pa ON pa.apartment_id = kl.apartment_id AND pa.active
+              JOIN syndic_apartment a ON a.id = pa.apartment_id AND a.active
+              JOIN syndic_building b ON b.id = a.building_id AND b.active
+             WHERE kl.key_id IN %s AND kl.tantiemes > 0
+            WINDOW w AS (PARTITION BY kl.key_id, pa.apartment_id)
+          ORDER BY kl.key_id, pa.id
+        """, [tuple(by_key)])
+        units = {}
+        for key_id, link_id, weight in self.env.cr.fetchall():
+            units.setdefault(key_id, ([], []))
+            units[key_id][0].append(link_id)
+            units[key_id][1].append(weight)
+
+        precision = self.env.company.currency_id.decimal_places
+        call_ids, link_ids, weights, parts, montants = [], [], [], [], []
+        for key_id, calls in by_key.items():
+            if key_id not in units:
+                continue
+            key_links, key_weights = units[key_id]
+            total = sum(key_weights)
+            key_parts = [weight / total * 100 for weight in key_weights]
+            shares = distribute([montant for _call_id, montant in calls], key_weights, precision)
+            for (call_id, _montant), row in zip(calls, shares):
+                call_ids.extend([call_id] * len(key_links))
+                link_ids.extend(key_links)
+                weights.extend(key_weights)
+                parts.extend(key_parts)
+                montants.extend(row.tolist())
+        if not call_ids:
+            return self.browse()
+        self.env.cr.execute("""
+            INSERT INTO syndic_appel_fond_line (
+                appel_fond_id, residence_id, building_id, apartment_id, person_id,
+                person_apartment_id, quote_part, tantiemes, part_repartition, montant,
+                state, date_echeance, create_uid, create_date, write_uid, write_date
+            )
+            SELECT af.id, af.residence_id, pa.building_id, pa.apartment_id, pa.person_id,
+                   pa.id, pa.quote_part, d.weight, d.part, d.montant,
+                   af.state, af.date_echeance,
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%s::int[], %s::int[], %s::float8[], %s::float8[], %s::float8[])
+                   AS d(call_id, link_id, weight, part, montant)
+              JOIN syndic_appel_fond af ON af.id = d.call_id
+              JOIN syndic_person_apartment pa ON pa.id = d.link_id
+            RETURNING id
+        """, [self.env.uid, self.env.uid, call_ids, link_ids, weights, parts, montants])
+        lines = self.browse([row[0] for row in self.env.cr.fetchall()])
+        appels.invalidate_recordset(['line_ids'])
+        lines.modified(self._generated_fields(), create=True)
+        return lines
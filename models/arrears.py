@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+
+class Arrears(models.Model):
+    _name = 'syndic.arrears'
+    _description = 'Impayés et balance âgée'
+    _auto = False
+    _order = 'date_echeance, residence_id, person_id'
+
+    appel_fond_id = fields.Many2one('syndic.appel.fond', string='Appel de fonds', readonly=True)
+    residence_id = fields.Many2one('syndic.residence', string='Résidence', readonly=True)
+    building_id = fields.Many2one('syndic.building', string='Immeuble', readonly=True)
+    apartment_id = fields.Many2one('syndic.apartment', string='Appartement', readonly=True)
+    person_id = fields.Many2one('syndic.person', string='Personne', readonly=True)
+    type_charge = fields.Selection(
+        selection='_selection_type_charge',
+        string='Type de charge',
+        readonly=True
+    )
+
+    date_echeance = fields.Date(string='Date d\'échéance', readonly=True)
+    montant_du = fields.Float(string='Montant dû', readonly=True)
+    montant_paye = fields.Float(string='Montant payé', readonly=True)
+    reste_du = fields.Float(string='Reste dû', readonly=True)
+    jours_retard = fields.Integer(string='Jours de retard', readonly=True, group_operator='max')
+
+    tranche = fields.Selection([
+        ('solde', 'Soldé'),
+        ('non_echu', 'Non échu'),
+        ('0_30', '0 - 30 jours'),
+        ('31_60', '31 - 60 jours'),
+        ('61_90', '61 - 90 jours'),
+        ('90_plus', 'Plus de 90 jours'),
+    ], string='Ancienneté', readonly=True)
+    montant_non_echu = fields.Float(string='Non échu', readonly=True)
+    montant_0_30 = fields.Float(string='0 - 30 jours', readonly=True)
+    montant_31_60 = fields.Float(string='31 - 60 jours', readonly=True)
+    montant_61_90 = fields.Float(string='61 - 90 jours', readonly=True)
+    montant_90_plus = fields.Float(string='+ 90 jours', readonly=True)
+
+    date_calcul = fields.Date(string='Calculé le', readonly=True)
+
+    @api.model
+    def _selection_type_charge(self):
+        return self.env['syndic.appel.fond']._fields['type_charge'].selection
+
+    def _query(self):
+        """Une ligne par ligne d'appel confirmé ou envoyé.
+
+        Le montant payé est celui imputé à la ligne par le lettrage FIFO
+        (``syndic.reglement.allocation``).
+        """
+        return """
+            WITH alloc AS (
+                SELECT appel_fond_line_id, SUM(montant) AS montant
+                  FROM syndic_reglement_allocation
+              GROUP BY appel_fond_line_id
+            ), balance AS (
+                SELECT l.id, l.appel_fond_id, l.residence_id, l.building_id, l.apartment_id,
+                       l.person_id, af.type_charge, l.montant,
+                       COALESCE(l.date_echeance, af.date_emission) AS date_echeance,
+                       COALESCE(a.montant, 0) AS paye,
+                       CURRENT_DATE - COALESCE(l.date_echeance, af.date_emission) AS retard
+                  FROM syndic_appel_fond_line l
+                  JOIN syndic_appel_fond af ON af.id = l.appel_fond_id
+             LEFT JOIN alloc a ON a.appel_fond_line_id = l.id
+                 WHERE l.state IN ('confirme', 'envoye') AND af.active
+            ), aged AS (
+                SELECT b.*,
+                       b.montant - b.paye AS reste,
+                       CASE
+                           WHEN b.montant - b.paye <= 0.005 THEN 'solde'
+                           WHEN b.retard < 0 THEN 'non_echu'
+                           WHEN b.retard <= 30 THEN '0_30'
+                           WHEN b.retard <= 60 THEN '31_60'
+                           WHEN b.retard <= 90 THEN '61_90'
+                           ELSE '90_plus'
+                       END AS tranche
+                  FROM balance b
+            )
+            SELECT id, appel_fond_id, residence_id, building_id, apartment_id, person_id,
+                   type_charge, date_echeance,
+                   montant AS montant_du,
+                   paye AS montant_paye,
+                   reste AS reste_du,
+                   GREATEST(retard, 0) AS jours_retard,
+                   tranche,
+                   CASE WHEN tranche = 'non_echu' THEN reste ELSE 0 END AS montant_non_echu,
+                   CASE WHEN tranche = '0_30' THEN reste ELSE 0 END AS montant_0_30,
+                   CASE WHEN tranche = '31_60' THEN reste ELSE 0 END AS montant_31_60,
+                   CASE WHEN tranche = '61_90' THEN reste ELSE 0 END AS montant_61_90,
+                   CASE WHEN tranche = '90_plus' THEN reste ELSE 0 END AS montant_90_plus,
+                   CURRENT_DATE AS date_calcul
+              FROM aged
+        """
+
+    def init(self):
+        self.env.cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s CASCADE" % self._table)
+        self.env.cr.execute("CREATE MATERIALIZED VIEW %s AS (%s)" % (self._table, self._query()))
+        # Index unique requis par REFRESH ... CONCURRENTLY
+        self.env.cr.execute("CREATE UNIQUE INDEX %s_id_index ON %s (id)" % (self._table, self._table))
+        for column in ('residence_id', 'person_id', 'apartment_id', 'tranche'):
+            self.env.cr.execute("CREATE INDEX %s_%s_index ON %s (%s)" % (
+                self._table, column, self._table, column))
+
+    @api.model
+    def _refresh(self):
+        """Recalcule la vue matérialisée sans bloquer les lectures."""
+        self.env.flush_all()
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % self._table)
+        self.invalidate_model()
+        _logger.info("Balance âgée des impayés actualisée.")
+
+    @api.model
+    def action_refresh(self):
+        self._refresh()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
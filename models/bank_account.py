@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+from collections import Counter
+
 from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import sql
 
 class BankAccount(models.Model):
     _name = 'syndic.bank_account'
@@ -16,6 +20,20 @@ class BankAccount(models.Model):
         required=True,
         tracking=True
     )
+    # Propriétaire éclaté en colonnes indexables (la Reference est un texte 'modèle,id')
+    owner_model = fields.Char(
+        string='Modèle du propriétaire',
+        compute='_compute_owner',
+        store=True,
+        readonly=True
+    )
+    owner_id = fields.Many2oneReference(
+        string='ID du propriétaire',
+        model_field='owner_model',
+        compute='_compute_owner',
+        store=True,
+        readonly=True
+    )
 
     bank_name = fields.Char(string='Nom de la banque', required=True, tracking=True)
     account_number = fields.Char(string='Numéro de compte', tracking=True)
@@ -25,27 +43,78 @@ class BankAccount(models.Model):
     is_default = fields.Boolean(string='Par défaut', default=False)
     active = fields.Boolean(default=True)
 
-    @api.constrains('is_default', 'owner_ref')
-    def _check_default_account(self):
-        """Ensure only one default account per owner"""
-        for record in self:
-            if record.is_default and record.owner_ref:
-                # Find other default accounts for the same owner
-                domain = [
-                    ('id', '!=', record.id),
-                    ('is_default', '=', True),
-                    ('owner_ref', '=', record.owner_ref) # Reference equality works in search
-                ]
-                 # Note: Searching a Reference field can sometimes be tricky depending on Odoo version nuances
-                 # Alternative approach if Reference search is flaky: check generic string representation
-                 
-                others = self.search(domain)
-                if others:
-                   # Auto-unset others or raise error? Usually better to raise error or toggle others off.
-                   # For simplicity, let's raise a warning or just silently allow user to fix.
-                   # Here strictly enforcing uniqueness might be annoying if UX doesn't auto-handle it.
-                   pass 
-
     _sql_constraints = [
-        ('iban_unique', 'UNIQUE(iban)', 'Cet IBAN existe déjà!')
+        ('iban_unique', 'UNIQUE(iban)', 'Cet IBAN existe déjà!'),
+        # Index unique partiel : un seul compte par défaut actif par propriétaire
+        ('default_account_unique',
+         'EXCLUDE USING btree (owner_model WITH =, owner_id WITH =) WHERE (is_default AND active)',
+         'Ce propriétaire a déjà un compte bancaire par défaut!'),
     ]
+
+    def _auto_init(self):
+        # Avant la pose de la contrainte : ne garder que le dernier compte par défaut
+        if sql.table_exists(self.env.cr, self._table):
+            self.env.cr.execute("""
+                UPDATE syndic_bank_account b
+                   SET is_default = FALSE
+                 WHERE b.is_default AND b.active
+                   AND EXISTS (
+                       SELECT 1 FROM syndic_bank_account o
+                        WHERE o.owner_ref = b.owner_ref AND o.is_default AND o.active AND o.id > b.id
+                   )
+            """)
+        return super(BankAccount, self)._auto_init()
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS syndic_bank_account_owner_index
+                ON syndic_bank_account (owner_model, owner_id)
+             WHERE active
+        """)
+
+    @api.depends('owner_ref')
+    def _compute_owner(self):
+        for record in self:
+            record.owner_model = record.owner_ref._name if record.owner_ref else False
+            record.owner_id = record.owner_ref.id if record.owner_ref else False
+
+    @api.constrains('is_default', 'owner_ref', 'active')
+    def _check_default_account(self):
+        """Un seul compte par défaut par propriétaire, vérifié en une requête."""
+        defaults = self.filtered(lambda r: r.is_default and r.active and r.owner_ref)
+        if not defaults:
+            return
+        keys = Counter((record.owner_ref._name, record.owner_ref.id) for record in defaults)
+        conflicts = {key for key, count in keys.items() if count > 1}
+        self.env.cr.execute("""
+            SELECT owner_model, owner_id
+              FROM syndic_bank_account
+             WHERE is_default AND active
+               AND id NOT IN %s
+               AND (owner_model, owner_id) IN %s
+        """, [tuple(defaults.ids), tuple(keys)])
+        conflicts.update(self.env.cr.fetchall())
+        if conflicts:
+            owners = ', '.join(sorted(
+                self.env[model].browse(owner_id).display_name for model, owner_id in conflicts))
+            raise ValidationError(_('Un seul compte bancaire par défaut est autorisé par propriétaire : %s', owners))
+
+    @api.model
+    def _get_default_accounts(self, owners, fallback=False):
+        """Compte par défaut de chaque propriétaire, en une requête indexée.
+
+        ``owners`` est un recordset de résidences ou de personnes. Avec
+        ``fallback``, un propriétaire sans compte par défaut reçoit son plus
+        ancien compte actif. Retourne ``{owner_id: compte}``.
+        """
+        if not owners:
+            return {}
+        self.flush_model(['owner_model', 'owner_id', 'is_default', 'active'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (owner_id) owner_id, id
+              FROM syndic_bank_account
+             WHERE owner_model = %s AND owner_id IN %s AND active
+               AND (is_default OR %s)
+          ORDER BY owner_id, is_default DESC, id
+        """, [owners._name, tuple(owners.ids), bool(fallback)])
+        return {owner_id: self.browse(account_id) for owner_id, account_id in self.env.cr.fetchall()}
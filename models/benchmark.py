@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
+
+from dateutil.relativedelta import relativedelta
+from lxml import etree
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+BENCH_CONTEXT = {
+    'tracking_disable': True,
+    'mail_create_nolog': True,
+    'mail_notrack': True,
+}
+
+
+# Tailles du jeu de données par défaut de la suite (``run_suite``)
+SUITE_SIZES = {
+    'nb_residences': 20,
+    'lots_per_residence': 100,
+    'owners_ratio': 0.8,
+    'calls_per_residence': 12,
+    'nb_payments': 20000,
+}
+# Date de référence fixe : le jeu généré ne dépend pas du jour d'exécution
+GENERATOR_START = date(2024, 1, 1)
+GENERATOR_BATCH = 10000
+
+
+class _Rollback(Exception):
+    """Annule les données générées à la fin d'un benchmark."""
+
+
+class SyndicBenchmark(models.AbstractModel):
+    _name = 'syndic.benchmark'
+    _description = 'Benchmarks de performance Syndic'
+
+    # ------------------------------------------------------------------
+    # OUTILS
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _rollback(self):
+        """Exécute le bloc dans un savepoint systématiquement annulé."""
+        try:
+            with self.env.cr.savepoint():
+                yield
+                self.env.flush_all()
+                raise _Rollback()
+        except _Rollback:
+            pass
+        self.env.invalidate_all()
+
+    @contextmanager
+    def _measure(self, label, results):
+        """Mesure le temps et le nombre de requêtes SQL du bloc."""
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        start = time.perf_counter()
+        yield
+        self.env.flush_all()
+        results[label] = {
+            'seconds': round(time.perf_counter() - start, 4),
+            'queries': cr.sql_log_count - queries,
+        }
+        _logger.info("Benchmark %s: %.3fs, %d requêtes",
+                     label, results[label]['seconds'], results[label]['queries'])
+
+    @api.model
+    def _create_residences(self, nb_residences, lots_per_residence, prefix='BENCH'):
+        """Crée des résidences avec un immeuble, des lots et un propriétaire par lot."""
+        env = self.with_context(**BENCH_CONTEXT).env
+        residences = env['syndic.residence'].create([
+            {'name': '%s Résidence %d' % (prefix, i), 'code': '%s%d' % (prefix, i)}
+            for i in range(nb_residences)
+        ])
+        buildings = env['syndic.building'].create([
+            {'name': 'Immeuble A', 'residence_id': residence.id}
+            for residence in residences
+        ])
+        apartments = env['syndic.apartment'].create([
+            {'num': str(n), 'building_id': building.id}
+            for building in buildings
+            for n in range(lots_per_residence)
+        ])
+        persons = env['syndic.person'].create([
+            {'name': '%s Propriétaire' % prefix, 'prenom': str(apartment.id),
+             'cin': '%s%d' % (prefix, apartment.id)}
+            for apartment in apartments
+        ])
+        env['syndic.person.apartment'].create([
+            {'person_id': person.id, 'apartment_id': apartment.id,
+             'quote_part': 1.0 + (apartment.id % 7)}
+            for person, apartment in zip(persons, apartments)
+        ])
+        return residences
+
+    @api.model
+    def _batched_create(self, model, vals_list, batch_size=GENERATOR_BATCH, keep_ids=True):
+        """Création ORM par lots, caches vidés entre deux lots pour borner la mémoire.
+
+        ``vals_list`` peut être un générateur : seul le lot en cours est
+        construit en mémoire. Sans ``keep_ids``, retourne le nombre
+        d'enregistrements créés au lieu du recordset.
+        """
+        Model = self.env[model].with_context(**BENCH_CONTEXT)
+        vals_iter = iter(vals_list)
+        ids = []
+        count = 0
+        while True:
+            batch = list(islice(vals_iter, batch_size))
+            if not batch:
+                break
+            records = Model.create(batch)
+            count += len(records)
+            if keep_ids:
+                ids += records.ids
+            self.env.flush_all()
+            self.env.invalidate_all()
+        return Model.browse(ids) if keep_ids else count
+
+    @api.model
+    def generate_dataset(self, nb_residences=100, lots_per_residence=500, owners_ratio=0.8,
+                         calls_per_residence=12, nb_payments=2000000, seed=42, prefix='GEN'):
+        """Génère un jeu de données reproductible (même graine = mêmes données).
+
+        Résidences avec deux immeubles, ``lots_per_residence`` lots chacune,
+        ``owners_ratio`` propriétaire par lot (certains possèdent donc
+        plusieurs lots), ``calls_per_residence`` appels mensuels confirmés à
+        partir de ``GENERATOR_START`` puis ``nb_payments`` règlements répartis
+        aléatoirement sur les lignes d'appel, générés et créés par lots de
+        ``GENERATOR_BATCH`` (seul leur nombre est retourné, sous
+        ``reglements``). Les données sont conservées :
+        l'appeler dans ``_rollback()`` pour un jeu jetable. Exemple pour 50k
+        lots et 2M de règlements, depuis ``odoo-bin shell`` :
+        ``env['syndic.benchmark'].generate_dataset(); env.cr.commit()``
+        """
+        rng = random.Random(seed)
+        residences = self._batched_create('syndic.residence', [
+            {'name': '%s Résidence %d' % (prefix, i), 'code': '%s%d' % (prefix, i)}
+            for i in range(nb_residences)
+        ])
+        buildings = self._batched_create('syndic.building', [
+            {'name': 'Immeuble %s' % letter, 'residence_id': residence_id}
+            for residence_id in residences.ids
+            for letter in 'AB'
+        ])
+        building_ids = buildings.ids
+        apartments = self._batched_create('syndic.apartment', [
+            {'num': str(n), 'building_id': building_ids[2 * r + n % 2],
+             'floor': n // 10}
+            for r in range(nb_residences)
+            for n in range(lots_per_residence)
+        ])
+        nb_persons = max(1, int(len(apartments) * owners_ratio))
+        persons = self._batched_create('syndic.person', [
+            {'name': '%s Propriétaire %d' % (prefix, i), 'prenom': str(i),
+             'cin': '%s%d-%d' % (prefix, seed, i)}
+            for i in range(nb_persons)
+        ])
+        # Chaque personne reçoit au moins un lot, les lots restants sont tirés au sort
+        owners = list(persons.ids) + [rng.choice(persons.ids)
+                                      for _i in range(len(apartments) - nb_persons)]
+        rng.shuffle(owners)
+        links = self._batched_create('syndic.person.apartment', [
+            {'person_id': person_id, 'apartment_id': apartment_id,
+             'quote_part': round(rng.uniform(0.5, 3.0), 2),
+             'date_debut': GENERATOR_START - relativedelta(years=1)}
+            for person_id, apartment_id in zip(owners, apartments.ids)
+        ])
+
+        calls = self._batched_create('syndic.appel.fond', [
+            {'libelle': '%s Appel %02d' % (prefix, m + 1), 'montant': 100.0,
+             'residence_id': residence_id, 'periode': 'mensuel',
+             'annee': (GENERATOR_START + relativedelta(months=m)).year,
+             'mois': '%02d' % (GENERATOR_START + relativedelta(months=m)).month,
+             'date_emission': GENERATOR_START + relativedelta(months=m),
+             'date_echeance': GENERATOR_START + relativedelta(months=m, days=30)}
+            for residence_id in residences.ids
+            for m in range(calls_per_residence)
+        ])
+        for start in range(0, len(calls), 50):
+            calls[start:start + 50].action_confirm()
+            self.env.flush_all()
+            self.env.invalidate_all()
+
+        self.env.cr.execute("""
+            SELECT appel_fond_id, person_id, apartment_id, montant, date_echeance
+              FROM syndic_appel_fond_line
+             WHERE appel_fond_id IN %s
+          ORDER BY id
+        """, [tuple(calls.ids) or (0,)])
+        lines = self.env.cr.fetchall()
+        modes = ['virement', 'cheque', 'espece', 'prelevement']
+        states = ['encaisse'] * 8 + ['valide', 'brouillon']
+
+        def payments():
+            for i in range(nb_payments if lines else 0):
+                call_id, person_id, apartment_id, montant, echeance = rng.choice(lines)
+                mode = rng.choice(modes)
+                yield {
+                    'person_id': person_id,
+                    # Un paiement sur dix n'est pas rattaché à un lot (acompte global)
+                    'apartment_id': apartment_id if rng.random() > 0.1 else False,
+                    'appel_fond_id': call_id,
+                    'mode': mode,
+                    'num_cheque': 'CHQ%08d' % i if mode == 'cheque' else False,
+                    'reference_virement': 'VIR%08d' % i if mode == 'virement' else False,
+                    'montant': round(montant * rng.choice([0.5, 1.0, 1.0, 2.0]), 2) or 1.0,
+                    'date': (echeance or GENERATOR_START) + relativedelta(days=rng.randint(-20, 40)),
+                    'state': rng.choice(states),
+                }
+
+        nb_reglements = self._batched_create('syndic.reglement', payments(), keep_ids=False)
+        _logger.info(
+            "Jeu de données %s (graine %s) : %d résidences, %d lots, %d personnes, "
+            "%d appels, %d lignes, %d règlements",
+            prefix, seed, len(residences), len(apartments), len(persons),
+            len(calls), len(lines), nb_reglements)
+        return {
+            'residences': residences, 'apartments': apartments, 'persons': persons,
+            'links': links, 'calls': calls, 'reglements': nb_reglements,
+        }
+
+    # ------------------------------------------------------------------
+    # BENCHMARKS
+    # ------------------------------------------------------------------
+    @api.model
+    def bench_montant_total(self, nb_calls=1000, nb_residences=50, lots_per_residence=40):
+        """Recalcul de montant_total pour nb_calls appels répartis sur nb_residences.
+
+        À lancer depuis ``odoo-bin shell`` :
+        ``env['syndic.benchmark'].bench_montant_total()``
+        Les données générées sont annulées en fin d'exécution.
+        """
+        results = {}
+        with self._rollback():
+            residences = self._create_residences(nb_residences, lots_per_residence)
+            calls = self.env['syndic.appel.fond'].with_context(**BENCH_CONTEXT).create([
+                {'libelle': 'Bench %d' % i, 'montant': 100.0,
+                 'residence_id': residences[i % nb_residences].id}
+                for i in range(nb_calls)
+            ])
+            self.env.invalidate_all()
+            with self._measure('appel_fond.montant_total', results):
+                calls._compute_montant_total()
+        return results
+
+    @api.model
+    def bench_confirm(self, nb_lots=3000):
+        """Confirmation d'un appel de fonds (génération des lignes) sur nb_lots lots."""
+        results = {}
+        with self._rollback():
+            residence = self._create_residences(1, nb_lots, prefix='BENCHCONF')
+            call = self.env['syndic.appel.fond'].with_context(**BENCH_CONTEXT).create({
+                'libelle': 'Bench confirmation', 'montant': 100.0, 'residence_id': residence.id,
+            })
+            self.env.invalidate_all()
+            with self._measure('appel_fond.action_confirm', results):
+                call.action_confirm()
+            results['appel_fond.action_confirm']['lines'] = call.nb_lines
+        return results
+
+    @api.model
+    def bench_reglement_import(self, nb_payments=20000, lots=500):
+        """Import de nb_payments virements : création unitaire vs création par lot."""
+        results = {}
+        with self._rollback():
+            residence = self._create_residences(1, lots, prefix='BENCHIMP')
+            call = self.env['syndic.appel.fond'].with_context(**BENCH_CONTEXT).create({
+                'libelle': 'Bench import', 'montant': 100.0, 'residence_id': residence.id,
+            })
+            links = residence.person_apartment_ids
+            Reglement = self.env['syndic.reglement'].with_context(**BENCH_CONTEXT)
+
+            def vals_list():
+                return [{
+                    'person_id': links[i % len(links)].person_id.id,
+                    'apartment_id': links[i % len(links)].apartment_id.id,
+                    'appel_fond_id': call.id,
+                    'mode': 'virement',
+                    'montant': 100.0,
+                    'reference_virement': 'VIR%08d' % i,
+                } for i in range(nb_payments)]
+
+            single = vals_list()
+            with self._measure('reglement.create_single', results):
+                for vals in single:
+                    Reglement.create(vals)
+            batch = vals_list()
+            with self._measure('reglement.create_batch', results):
+                Reglement.create(batch)
+        return results
+
+    @api.model
+    def bench_repartition(self, nb_lots=5000, nb_keys=6, nb_calls=12, seed=42):
+        """Répartition par clés : nb_calls appels mensuels par clé sur nb_lots lots."""
+        rng = random.Random(seed)
+        results = {}
+        with self._rollback():
+            residence = self._create_residences(1, nb_lots, prefix='BENCHKEY')
+            apartments = residence.apartment_ids
+            keys = self.env['syndic.repartition.key'].with_context(**BENCH_CONTEXT).create([{
+                'name': 'Clé %d' % k, 'code': 'K%d' % k, 'residence_id': residence.id,
+                'line_ids': [(0, 0, {'apartment_id': apartment.id, 'tantiemes': rng.randint(1, 200)})
+                             for apartment in apartments],
+            } for k in range(nb_keys)])
+            calls = self.env['syndic.appel.fond'].with_context(**BENCH_CONTEXT).create([{
+                'libelle': 'Bench clé %s / %d' % (key.code, m + 1),
+                'montant': round(rng.uniform(1000, 50000), 2),
+                'residence_id': residence.id,
+                'repartition_key_id': key.id,
+                'mois': '%02d' % (m + 1),
+            } for key in keys for m in range(nb_calls)])
+            self.env.invalidate_all()
+            with self._measure('appel_fond_line.generate_keyed', results):
+                lines = self.env['syndic.appel.fond.line']._generate_for(calls)
+            results['appel_fond_line.generate_keyed']['lines'] = len(lines)
+            # Contrôle : chaque appel est réparti au centime près
+            self.env.cr.execute("""
+                SELECT COUNT(*) FROM syndic_appel_fond af
+                 WHERE af.id IN %s AND ABS(af.montant - (
+                       SELECT SUM(l.montant) FROM syndic_appel_fond_line l WHERE l.appel_fond_id = af.id
+                 )) > 0.001
+            """, [tuple(calls.ids)])
+            results['appel_fond_line.generate_keyed']['unbalanced_calls'] = self.env.cr.fetchone()[0]
+        return results
+
+    # ------------------------------------------------------------------
+    # SUITE
+    # ------------------------------------------------------------------
+    @api.model
+    def _list_specification(self, model):
+        """Spécification ``web_search_read`` équivalente à la vue liste du modèle."""
+        Model = self.env[model]
+        arch = etree.fromstring(Model.get_view(view_type='tree')['arch'])
+        specification = {}
+        for name in arch.xpath('//field/@name'):
+            field = Model._fields.get(name)
+            if field is not None:
+                specification[name] = {'fields': {'display_name': {}}} if field.relational else {}
+        return specification
+
+    @api.model
+    def _module_version(self):
+        module = self.env['ir.module.module'].sudo().search(
+            [('name', '=', 'syndic_cotisation')], limit=1)
+        return module.latest_version or module.installed_version or 'unknown'
+
+    @api.model
+    def run_suite(self, output=None, seed=42, sample=1000, **sizes):
+        """Suite complète : génère un jeu de données puis mesure les chemins critiques.
+
+        Chaque mesure enregistre la durée et le nombre de requêtes SQL. Le
+        résultat est écrit en JSON (version du module incluse) dans
+        ``output`` ou dans le répertoire temporaire, pour comparer deux
+        versions. Les données générées sont annulées en fin d'exécution.
+        ``env['syndic.benchmark'].run_suite(nb_payments=100000)``
+        """
+        sizes = dict(SUITE_SIZES, **sizes)
+        results = {}
+        counts = {}
+        with self._rollback():
+            with self._measure('generate_dataset', results):
+                data = self.generate_dataset(seed=seed, prefix='SUITE%s' % seed, **sizes)
+            counts = {
+                key: value if isinstance(value, int) else len(value)
+                for key, value in data.items()
+            }
+            calls, residences = data['calls'], data['residences']
+
+            # Calculs stockés
+            for label, records, method in [
+                ('appel_fond.montant_total', calls, '_compute_montant_total'),
+                ('appel_fond.montant_collecte', calls, '_compute_montant_collecte'),
+                ('appel_fond.taux_collecte', calls, '_compute_taux_collecte'),
+                ('residence.building_count', residences, '_compute_building_count'),
+                ('residence.apartment_count', residences, '_compute_apartment_count'),
+                ('residence.owner_count', residences, '_compute_owner_count'),
+                ('person.financial_totals', data['persons'], '_compute_payment_totals'),
+            ]:
+                self.env.invalidate_all()
+                with self._measure(label, results):
+                    getattr(records, method)()
+
+            # Lecture des vues liste (première page, comme le client web)
+            for model in ('syndic.appel.fond', 'syndic.reglement', 'syndic.person',
+                          'syndic.residence', 'syndic.appel.fond.line'):
+                specification = self._list_specification(model)
+                self.env.invalidate_all()
+                with self._measure('%s.list_read' % model, results):
+                    self.env[model].web_search_read([], specification, limit=80)
+
+            # Création et transitions d'état des règlements
+            lines = calls.line_ids[:sample]
+            Reglement = self.env['syndic.reglement'].with_context(**BENCH_CONTEXT)
+            with self._measure('reglement.create_batch', results):
+                reglements = Reglement.create([{
+                    'person_id': line.person_id.id,
+                    'apartment_id': line.apartment_id.id,
+                    'appel_fond_id': line.appel_fond_id.id,
+                    'mode': 'virement',
+                    'montant': line.montant or 1.0,
+                } for line in lines])
+            with self._measure('reglement.action_validate', results):
+                reglements.action_validate()
+            with self._measure('reglement.action_encaisse', results):
+                reglements.action_encaisse()
+
+            # Confirmation d'un nouvel appel par résidence
+            next_period = max(calls.mapped('date_emission')) + relativedelta(months=1)
+            new_calls = self.env['syndic.appel.fond'].with_context(**BENCH_CONTEXT).create([{
+                'libelle': 'Suite confirmation', 'montant': 100.0, 'residence_id': residence.id,
+                'annee': next_period.year, 'mois': '%02d' % next_period.month,
+                'date_emission': next_period,
+            } for residence in residences])
+            with self._measure('appel_fond.action_confirm', results):
+                new_calls.action_confirm()
+
+            with self._measure('reglement_allocation.reallocate', results):
+                self.env['syndic.reglement.allocation']._reallocate_residences(residences.ids)
+            with self._measure('arrears.refresh', results):
+                self.env['syndic.arrears']._refresh()
+
+            # Rendu des reçus : seul un wkhtmltopdf absent ou en échec est toléré
+            receipts = reglements[:50]
+            try:
+                with self._measure('reglement.render_receipts', results):
+                    receipts._render_receipts()
+                results['reglement.render_receipts']['records'] = len(receipts)
+            except (UserError, OSError) as e:
+                _logger.warning("Benchmark des reçus ignoré (wkhtmltopdf) : %s", e)
+                results['reglement.render_receipts'] = {'error': str(e)}
+
+        version = self._module_version()
+        report = {
+            'module': 'syndic_cotisation',
+            'version': version,
+            'database': self.env.cr.dbname,
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+            'seed': seed,
+            'sizes': sizes,
+            'counts': counts,
+            'results': results,
+        }
+        output = output or os.path.join(
+            tempfile.gettempdir(),
+            'syndic_benchmark_%s_%s.json' % (version, time.strftime('%Y%m%d-%H%M%S')))
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        _logger.info("Résultats du benchmark écrits dans %s", output)
+        return report
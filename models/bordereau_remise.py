@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+
+
+class BordereauRemise(models.Model):
+    _name = 'syndic.bordereau.remise'
+    _description = 'Bordereau de remise en banque'
+    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _order = 'date desc, id desc'
+
+    name = fields.Char(
+        string='Référence',
+        required=True,
+        copy=False,
+        readonly=True,
+        default=lambda self: _('Nouveau')
+    )
+    date = fields.Date(
+        string='Date de remise',
+        required=True,
+        default=fields.Date.today,
+        tracking=True
+    )
+    bank_account_id = fields.Many2one(
+        'syndic.bank_account',
+        string='Compte bancaire',
+        tracking=True
+    )
+    reference_banque = fields.Char(
+        string='Référence banque',
+        help='Numéro du bordereau communiqué par la banque',
+        tracking=True
+    )
+    reglement_ids = fields.One2many(
+        'syndic.reglement',
+        'bordereau_id',
+        string='Règlements',
+        readonly=True
+    )
+    nb_reglements = fields.Integer(
+        string='Nombre de règlements',
+        compute='_compute_totals',
+        store=True
+    )
+    montant_total = fields.Float(
+        string='Montant total',
+        compute='_compute_totals',
+        store=True
+    )
+    notes = fields.Text(string='Notes')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        to_name = [vals for vals in vals_list if vals.get('name', _('Nouveau')) == _('Nouveau')]
+        names = self.env['ir.sequence']._next_block_by_code('syndic.bordereau.remise', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or _('Nouveau')
+        return super(BordereauRemise, self).create(vals_list)
+
+    @api.depends('reglement_ids', 'reglement_ids.montant')
+    def _compute_totals(self):
+        totals = {
+            bordereau: (count, montant)
+            for bordereau, count, montant in self.env['syndic.reglement']._read_group(
+                [('bordereau_id', 'in', self.ids)], ['bordereau_id'], ['__count', 'montant:sum'])
+        }
+        for record in self:
+            record.nb_reglements, record.montant_total = totals.get(record, (0, 0.0))
+
+    def action_view_reglements(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Règlements remis'),
+            'res_model': 'syndic.reglement',
+            'view_mode': 'tree,form',
+            'domain': [('bordereau_id', '=', self.id)],
+        }
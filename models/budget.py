@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
+import logging
+
 from odoo import models, fields, api, _
 
+_logger = logging.getLogger(__name__)
+
 class Budget(models.Model):
     _name = 'syndic.budget'
     _description = 'Budget Prévisionnel / Réel'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.bulk.state.mixin']
     _order = 'year desc, residence_id'
 
     residence_id = fields.Many2one(
@@ -54,13 +58,94 @@ class Budget(models.Model):
             record.total_amount = sum(line.planned_amount for line in record.line_ids)
 
     def action_approve(self):
-        self.write({'state': 'approved'})
+        self._set_state('approved')
 
     def action_close(self):
-        self.write({'state': 'closed'})
+        self._set_state('closed')
     
     def action_draft(self):
-        self.write({'state': 'draft'})
+        self._set_state('draft')
+
+    def action_refresh_actuals(self):
+        self._refresh_actuals()
+
+    def action_view_category_rollup(self):
+        """Synthèse prévu / réalisé / écart cumulée le long de l'arbre des catégories."""
+        totals = self.env['syndic.charge_category']._budget_rollup(self.ids)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Synthèse par catégorie'),
+            'res_model': 'syndic.charge_category',
+            'view_mode': 'tree',
+            'views': [(self.env.ref('syndic_cotisation.view_syndic_charge_category_budget_tree').id, 'tree')],
+            'domain': [('id', 'in', list(totals))],
+            'context': {'syndic_budget_ids': self.ids},
+        }
+
+    def _refresh_actuals(self):
+        """Recalcule en une requête le réalisé et l'appelé de toutes les lignes.
+
+        Réalisé : dépenses validées de l'année, de la résidence, dans la
+        catégorie exacte de la ligne. Appelé : montant total des appels
+        confirmés ou envoyés de l'année rattachés à cette catégorie. Le
+        cumul sur les catégories parentes est fait par
+        ``syndic.charge_category._budget_rollup``.
+        """
+        if not self:
+            return
+        self.env['syndic.expense'].flush_model(
+            ['residence_id', 'category_id', 'date', 'montant', 'state', 'active'])
+        self.env['syndic.appel.fond'].flush_model(
+            ['residence_id', 'category_id', 'annee', 'montant_total', 'state', 'active'])
+        self.env['syndic.budget.line'].flush_model(['budget_id', 'category_id', 'planned_amount'])
+        self.flush_model(['residence_id', 'year'])
+        self.env.cr.execute("""
+            WITH lines AS (
+                SELECT bl.id, b.residence_id, b.year, bl.category_id
+                  FROM syndic_budget_line bl
+                  JOIN syndic_budget b ON b.id = bl.budget_id
+                 WHERE bl.budget_id IN %(ids)s
+            ), expenses AS (
+                SELECT l.id, SUM(e.montant) AS montant
+                  FROM lines l
+                  JOIN syndic_expense e ON e.category_id = l.category_id
+                                       AND e.residence_id = l.residence_id
+                                       AND e.state = 'valide' AND e.active
+                                       AND e.date >= make_date(l.year, 1, 1)
+                                       AND e.date < make_date(l.year + 1, 1, 1)
+              GROUP BY l.id
+            ), calls AS (
+                SELECT l.id, SUM(af.montant_total) AS montant
+                  FROM lines l
+                  JOIN syndic_appel_fond af ON af.category_id = l.category_id
+                                           AND af.residence_id = l.residence_id
+                                           AND af.annee = l.year
+                                           AND af.state IN ('confirme', 'envoye') AND af.active
+              GROUP BY l.id
+            )
+            UPDATE syndic_budget_line bl
+               SET actual_amount = COALESCE(e.montant, 0),
+                   called_amount = COALESCE(c.montant, 0),
+                   variance = bl.planned_amount - COALESCE(e.montant, 0),
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM lines l
+         LEFT JOIN expenses e ON e.id = l.id
+         LEFT JOIN calls c ON c.id = l.id
+             WHERE bl.id = l.id
+        """, {'ids': tuple(self.ids), 'uid': self.env.uid})
+        nb_lines = self.env.cr.rowcount
+        # Écart écrit dans la même requête : rien à recalculer côté ORM
+        self.env['syndic.budget.line'].invalidate_model(
+            ['actual_amount', 'called_amount', 'variance', 'write_uid', 'write_date'])
+        _logger.info("Réalisés recalculés pour %d budget(s), %d ligne(s).",
+                     len(self), nb_lines)
+
+    @api.model
+    def _cron_refresh_actuals(self, year=None):
+        """Recalcule en un seul lot tous les budgets non clôturés de l'année."""
+        year = year or fields.Date.today().year
+        self.search([('year', '=', year), ('state', '!=', 'closed')])._refresh_actuals()
 
     _sql_constraints = [
         ('residence_year_type_unique', 'UNIQUE(residence_id, year, type)', 
@@ -88,7 +173,19 @@ class BudgetLine(models.Model):
     description = fields.Char(string='Description')
     
     planned_amount = fields.Float(string='Montant Prévisionnel', required=True, default=0.0)
-    actual_amount = fields.Float(string='Montant Réel', default=0.0)
+    actual_amount = fields.Float(
+        string='Montant Réel',
+        default=0.0,
+        readonly=True,
+        help="Dépenses validées de la catégorie (hors sous-catégories), "
+             "recalculées par « Actualiser le réalisé »"
+    )
+    called_amount = fields.Float(
+        string='Montant Appelé',
+        default=0.0,
+        readonly=True,
+        help="Appels de fonds de l'année rattachés à la catégorie (hors sous-catégories)"
+    )
     
     variance = fields.Float(
         string='Écart',
@@ -101,3 +198,8 @@ class BudgetLine(models.Model):
     def _compute_variance(self):
         for record in self:
             record.variance = record.planned_amount - record.actual_amount
+
+    _sql_constraints = [
+        ('budget_category_unique', 'UNIQUE(budget_id, category_id)',
+         'Cette catégorie a déjà une ligne dans ce budget!')
+    ]
@@ -6,8 +6,12 @@ from odoo.exceptions import ValidationError
 class Building(models.Model):
     _name = 'syndic.building'
     _description = 'Immeuble / Bâtiment'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.display.name.mixin']
     _order = 'name'
+    _display_name_flush = {
+        'syndic.residence': ['name'],
+        'syndic.building': ['name', 'residence_id'],
+    }
 
     name = fields.Char(
         string='Nom de l\'immeuble',
@@ -46,7 +50,8 @@ class Building(models.Model):
     # Computed fields
     apartment_count = fields.Integer(
         string='Nombre d\'appartements',
-        compute='_compute_apartment_count'
+        compute='_compute_apartment_count',
+        store=True
     )
     
     active = fields.Boolean(
@@ -67,11 +72,20 @@ class Building(models.Model):
                 record.display_name = f"{record.residence_id.name} - {record.name}"
             else:
                 record.display_name = record.name
+
+    def _display_name_sql(self):
+        return (
+            "LEFT JOIN syndic_residence r ON r.id = s.residence_id",
+            "CASE WHEN r.id IS NOT NULL THEN concat(r.name, ' - ', s.name) ELSE s.name END",
+            {},
+        )
     
-    @api.depends('apartment_ids')
+    @api.depends('apartment_ids', 'apartment_ids.active')
     def _compute_apartment_count(self):
+        counts = dict(self.env['syndic.apartment']._read_group(
+            [('building_id', 'in', self.ids)], ['building_id'], ['__count']))
         for record in self:
-            record.apartment_count = len(record.apartment_ids)
+            record.apartment_count = counts.get(record, 0)
     
     @api.constrains('nb_floors')
     def _check_nb_floors(self):
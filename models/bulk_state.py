@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+
+from markupsafe import Markup, escape
+
+from odoo import models, _
+
+_logger = logging.getLogger(__name__)
+
+BULK_THRESHOLD_PARAM = 'syndic_cotisation.bulk_threshold'
+BULK_THRESHOLD_DEFAULT = 100
+
+
+class BulkStateMixin(models.AbstractModel):
+    """Transitions d'état en masse sans suivi de messagerie par enregistrement.
+
+    Au-delà du seuil, l'état est écrit en une requête SQL et un seul message
+    récapitulatif (références et ancien état) est posté sur chaque parent
+    (``_bulk_parent_fields``) au lieu d'un suivi par enregistrement.
+    Le mode est forcé ou désactivé par le contexte ``syndic_bulk``, le seuil
+    se règle avec le paramètre ``syndic_cotisation.bulk_threshold``.
+    """
+    _name = 'syndic.bulk.state.mixin'
+    _description = 'Transitions d\'état en masse'
+
+    # Champs many2one candidats, dans l'ordre, pour porter le message récapitulatif
+    _bulk_parent_fields = ('residence_id',)
+
+    def _use_bulk(self):
+        forced = self.env.context.get('syndic_bulk')
+        if forced is not None:
+            return bool(forced)
+        threshold = int(self.env['ir.config_parameter'].sudo().get_param(
+            BULK_THRESHOLD_PARAM, BULK_THRESHOLD_DEFAULT))
+        return 0 < threshold <= len(self)
+
+    def _set_state(self, state, vals=None):
+        """Point d'entrée des actions : écriture ORM ou mode masse selon le seuil."""
+        if self._use_bulk():
+            return self._bulk_set_state(state, vals)
+        return self.write(dict(vals or {}, state=state))
+
+    def _bulk_set_state(self, state, vals=None, exprs=None):
+        """Passe tous les enregistrements à ``state`` en une seule requête.
+
+        ``vals`` complète l'écriture avec des champs stockés simples (dates,
+        booléens...) ; ``exprs`` associe à un champ une expression SQL et ses
+        paramètres, évaluée sur la ligne avant mise à jour (alias ``old``).
+        Les droits, les règles d'accès et les contraintes Python sur les
+        champs écrits sont vérifiés comme pour ``write``.
+        """
+        if not self:
+            return True
+        vals = dict(vals or {}, state=state)
+        exprs = exprs or {}
+        fnames = list(vals) + list(exprs)
+        self.check_access_rights('write')
+        self.check_access_rule('write')
+        self.flush_recordset(fnames)
+
+        columns = []
+        params = []
+        for fname, value in vals.items():
+            field = self._fields[fname]
+            columns.append('"%s" = %%s' % fname)
+            params.append(field.convert_to_column(value, self))
+        for fname, (expression, expression_params) in exprs.items():
+            columns.append('"%s" = %s' % (fname, expression))
+            params.extend(expression_params)
+        self.env.cr.execute("""
+            UPDATE {table} t
+               SET {columns}, write_uid = %s, write_date = NOW() AT TIME ZONE 'UTC'
+              FROM {table} old
+             WHERE old.id = t.id AND t.id IN %s
+         RETURNING t.id, old.state
+        """.format(table=self._table, columns=', '.join(columns)),
+            params + [self.env.uid, tuple(self.ids)])
+        old_states = dict(self.env.cr.fetchall())
+
+        self.invalidate_recordset(fnames + ['write_uid', 'write_date'])
+        self.modified(fnames)
+        self._validate_fields(fnames)
+        self._bulk_post_summary(state, old_states)
+        self._bulk_after_state(state, old_states)
+        _logger.info("%s : %d enregistrement(s) passés à l'état %s en mode masse.",
+                     self._name, len(old_states), state)
+        return True
+
+    def _bulk_after_state(self, state, old_states):
+        """Point d'extension appelé après une transition en masse."""
+
+    def _bulk_parent(self):
+        self.ensure_one()
+        for fname in self._bulk_parent_fields:
+            if self[fname]:
+                return self[fname]
+        return self.browse()
+
+    def _bulk_post_summary(self, state, old_states):
+        """Un message par parent : nombre, ancien état et références concernées."""
+        selection = dict(self._fields['state']._description_selection(self.env))
+        by_parent = defaultdict(lambda: self.browse())
+        for record in self:
+            by_parent[record._bulk_parent()] |= record
+        for parent, records in by_parent.items():
+            if not parent:
+                # Sans parent, le message reste sur chaque enregistrement
+                for record in records:
+                    record.message_post(body=_('État modifié en masse : %s → %s.',
+                                               selection.get(old_states.get(record.id), '-'),
+                                               selection.get(state, state)),
+                                        subtype_xmlid='mail.mt_note')
+                continue
+            by_old = defaultdict(list)
+            for record in records:
+                by_old[old_states.get(record.id)].append(record.display_name)
+            items = Markup('').join(
+                Markup('<li>%s → %s (%s) : %s</li>') % (
+                    selection.get(old, old or '-'), selection.get(state, state),
+                    len(names), ', '.join(names))
+                for old, names in by_old.items()
+            )
+            body = Markup('<p>%s</p><ul>%s</ul>') % (
+                escape(_('%(count)s %(model)s modifié(s) en masse par %(user)s.',
+                         count=len(records), model=self._description, user=self.env.user.name)),
+                items)
+            parent.message_post(body=body, subtype_xmlid='mail.mt_note')
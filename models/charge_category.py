@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields
+from odoo import models, fields, api
 
 class ChargeCategory(models.Model):
     _name = 'syndic.charge_category'
@@ -31,6 +31,12 @@ class ChargeCategory(models.Model):
 
     display_name = fields.Char(compute='_compute_display_name', store=True)
 
+    # Synthèse budgétaire cumulée (budgets passés dans le contexte syndic_budget_ids)
+    budget_planned = fields.Float(string='Prévu (cumul)', compute='_compute_budget_rollup')
+    budget_actual = fields.Float(string='Réalisé (cumul)', compute='_compute_budget_rollup')
+    budget_called = fields.Float(string='Appelé (cumul)', compute='_compute_budget_rollup')
+    budget_variance = fields.Float(string='Écart (cumul)', compute='_compute_budget_rollup')
+
     def _compute_display_name(self):
         for record in self:
             if record.code:
@@ -38,6 +44,40 @@ class ChargeCategory(models.Model):
             else:
                 record.display_name = record.name
 
+    @api.depends_context('syndic_budget_ids')
+    def _compute_budget_rollup(self):
+        totals = self._budget_rollup(self.env.context.get('syndic_budget_ids') or [])
+        for record in self:
+            (record.budget_planned, record.budget_actual,
+             record.budget_called, record.budget_variance) = totals.get(record.id, (0.0, 0.0, 0.0, 0.0))
+
+    @api.model
+    def _budget_rollup(self, budget_ids):
+        """Totaux des lignes de budget cumulés sur chaque catégorie ancêtre.
+
+        Une seule requête groupée : une catégorie agrège les lignes de toutes
+        les catégories dont le ``parent_path`` commence par le sien. Les
+        montants des lignes portent sur leur seule catégorie (voir
+        ``syndic.budget._refresh_actuals``) : chacun n'est compté qu'une
+        fois par ancêtre. Retourne
+        ``{category_id: (prévu, réalisé, appelé, écart)}``.
+        """
+        if not budget_ids:
+            return {}
+        self.flush_model(['parent_path'])
+        self.env['syndic.budget.line'].flush_model(
+            ['budget_id', 'category_id', 'planned_amount', 'actual_amount', 'called_amount', 'variance'])
+        self.env.cr.execute("""
+            SELECT c.id, SUM(bl.planned_amount), SUM(bl.actual_amount),
+                   SUM(bl.called_amount), SUM(bl.variance)
+              FROM syndic_budget_line bl
+              JOIN syndic_charge_category lc ON lc.id = bl.category_id
+              JOIN syndic_charge_category c ON lc.parent_path LIKE c.parent_path || '%%'
+             WHERE bl.budget_id IN %s
+          GROUP BY c.id
+        """, [tuple(budget_ids)])
+        return {row[0]: tuple(row[1:]) for row in self.env.cr.fetchall()}
+
     _sql_constraints = [
         ('code_unique', 'UNIQUE(code)', 'Le code de catégorie doit être unique!')
     ]
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import date
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Clé des périodes à recalculer dans ``cr.precommit.data``
+CUBE_PENDING_KEY = 'syndic.collection.cube.pending'
+CUBE_DIMENSIONS = ('residence_id', 'annee', 'mois', 'date', 'type_charge', 'mode')
+CUBE_MEASURES = ('montant_du', 'montant_encaisse', 'nb_reglements')
+
+# Faits agrégés : dû (lignes d'appel confirmées ou envoyées, sans mode) et
+# encaissé (règlements encaissés, par mode et type de charge de l'appel).
+# ``{scope}`` restreint le calcul à des périodes (résidence, année, mois).
+CUBE_INSERT = """
+    INSERT INTO syndic_collection_cube (
+        residence_id, annee, mois, date, type_charge, mode,
+        montant_du, montant_encaisse, nb_reglements,
+        create_uid, create_date, write_uid, write_date
+    )
+    SELECT f.residence_id, f.annee, f.mois, make_date(f.annee, f.mois::int, 1),
+           f.type_charge, f.mode,
+           SUM(f.montant_du), SUM(f.montant_encaisse), SUM(f.nb_reglements),
+           %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+      FROM (
+            SELECT af.residence_id, af.annee,
+                   COALESCE(NULLIF(af.mois, ''), to_char(af.date_emission, 'MM')) AS mois,
+                   af.type_charge, NULL AS mode,
+                   l.montant AS montant_du, 0 AS montant_encaisse, 0 AS nb_reglements
+              FROM syndic_appel_fond_line l
+              JOIN syndic_appel_fond af ON af.id = l.appel_fond_id
+             WHERE l.state IN ('confirme', 'envoye') AND af.active
+         UNION ALL
+            SELECT COALESCE(r.residence_id, a.residence_id),
+                   EXTRACT(YEAR FROM COALESCE(r.date_encaissement, r.date))::int,
+                   to_char(COALESCE(r.date_encaissement, r.date), 'MM'),
+                   af.type_charge, r.mode,
+                   0, r.montant, 1
+              FROM syndic_reglement r
+         LEFT JOIN syndic_appel_fond af ON af.id = r.appel_fond_id
+         LEFT JOIN syndic_apartment a ON a.id = r.apartment_id
+             WHERE r.state = 'encaisse' AND r.active
+           ) f
+     WHERE f.residence_id IS NOT NULL {scope}
+  GROUP BY f.residence_id, f.annee, f.mois, f.type_charge, f.mode
+"""
+CUBE_SCOPE = """
+       AND (f.residence_id, f.annee, f.mois) IN (
+            SELECT * FROM unnest(%(residence_ids)s::int[], %(annees)s::int[], %(mois)s::varchar[]))
+"""
+
+
+class CollectionCube(models.Model):
+    """Table de faits dû / encaissé par résidence × mois × type de charge × mode.
+
+    Alimentée uniquement en SQL : les appels de fonds et règlements signalent
+    les périodes touchées (``_mark_dirty``), recalculées une seule fois au
+    moment du commit (``cr.precommit``). ``_rebuild`` reconstruit toute la
+    table en une requête groupée.
+    """
+    _name = 'syndic.collection.cube'
+    _description = 'Cube de collecte (dû / encaissé)'
+    _order = 'date desc, residence_id'
+
+    residence_id = fields.Many2one('syndic.residence', string='Résidence', readonly=True, index=True)
+    annee = fields.Integer(string='Année', readonly=True, group_operator=False)
+    mois = fields.Selection(
+        selection='_selection_mois',
+        string='Mois',
+        readonly=True
+    )
+    date = fields.Date(string='Période', readonly=True)
+    type_charge = fields.Selection(
+        selection='_selection_type_charge',
+        string='Type de charge',
+        readonly=True
+    )
+    mode = fields.Selection(
+        selection='_selection_mode',
+        string='Mode de paiement',
+        readonly=True
+    )
+    montant_du = fields.Float(string='Montant dû', readonly=True)
+    montant_encaisse = fields.Float(string='Montant encaissé', readonly=True)
+    nb_reglements = fields.Integer(string='Règlements', readonly=True)
+
+    @api.model
+    def _selection_mois(self):
+        return self.env['syndic.appel.fond']._fields['mois'].selection
+
+    @api.model
+    def _selection_type_charge(self):
+        return self.env['syndic.appel.fond']._fields['type_charge'].selection
+
+    @api.model
+    def _selection_mode(self):
+        return self.env['syndic.reglement']._fields['mode'].selection
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS syndic_collection_cube_period_index
+                ON syndic_collection_cube (residence_id, annee, mois)
+        """)
+        # Installation sur une base existante : alimentation initiale
+        self.env.cr.execute("SELECT 1 FROM syndic_collection_cube LIMIT 1")
+        if not self.env.cr.rowcount:
+            self._rebuild()
+
+    # ------------------------------------------------------------------
+    # Alimentation
+    # ------------------------------------------------------------------
+    @api.model
+    def _mark_dirty(self, keys):
+        """Planifie le recalcul des périodes ``(résidence, année, mois)`` au commit."""
+        keys = {key for key in keys if key[0]}
+        if not keys:
+            return
+        pending = self.env.cr.precommit.data.setdefault(CUBE_PENDING_KEY, set())
+        if not pending:
+            self.env.cr.precommit.add(self._refresh_pending)
+        pending.update(keys)
+
+    @api.model
+    def _refresh_pending(self):
+        keys = self.env.cr.precommit.data.pop(CUBE_PENDING_KEY, set())
+        if keys:
+            self.sudo()._refresh_periods(keys)
+
+    def _flush_sources(self):
+        self.env['syndic.appel.fond'].flush_model(
+            ['residence_id', 'annee', 'mois', 'date_emission', 'type_charge', 'active'])
+        self.env['syndic.appel.fond.line'].flush_model(['appel_fond_id', 'state', 'montant'])
+        self.env['syndic.reglement'].flush_model(
+            ['residence_id', 'apartment_id', 'appel_fond_id', 'date', 'date_encaissement',
+             'mode', 'montant', 'state', 'active'])
+        self.env['syndic.apartment'].flush_model(['residence_id'])
+
+    @api.model
+    def _refresh_periods(self, keys):
+        """Recalcule les faits des périodes données : suppression puis insertion groupée."""
+        self._flush_sources()
+        residence_ids, annees, mois = zip(*keys)
+        params = {
+            'uid': self.env.uid,
+            'residence_ids': list(residence_ids),
+            'annees': list(annees),
+            'mois': list(mois),
+        }
+        self.env.cr.execute("""
+            DELETE FROM syndic_collection_cube
+             WHERE (residence_id, annee, mois) IN (
+                   SELECT * FROM unnest(%(residence_ids)s::int[], %(annees)s::int[], %(mois)s::varchar[]))
+        """, params)
+        self.env.cr.execute(CUBE_INSERT.format(scope=CUBE_SCOPE), params)
+        self.invalidate_model()
+        _logger.debug("Cube de collecte : %d période(s) recalculée(s).", len(keys))
+
+    @api.model
+    def _rebuild(self):
+        """Reconstruit tout le cube en une passe SQL groupée."""
+        self._flush_sources()
+        self.env.cr.execute("DELETE FROM syndic_collection_cube")
+        self.env.cr.execute(CUBE_INSERT.format(scope=''), {'uid': self.env.uid})
+        count = self.env.cr.rowcount
+        self.invalidate_model()
+        _logger.info("Cube de collecte reconstruit : %d ligne(s).", count)
+        return count
+
+    @api.model
+    def action_rebuild(self):
+        if not self.env.user.has_group('base.group_system'):
+            raise UserError(_('Seul un administrateur peut reconstruire le cube de collecte.'))
+        self.sudo()._rebuild()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
+
+    # ------------------------------------------------------------------
+    # Lecture (tableau de bord)
+    # ------------------------------------------------------------------
+    @api.model
+    def _get_dashboard_data(self, domain=None, groupby=None):
+        """Agrégats du cube pour le tableau de bord (endpoint JSON).
+
+        ``groupby`` accepte les dimensions de ``CUBE_DIMENSIONS`` (avec
+        granularité pour ``date``, par exemple ``date:year``).
+        """
+        groupby = list(groupby or ('residence_id', 'annee', 'mois'))
+        for spec in groupby:
+            if spec.split(':')[0] not in CUBE_DIMENSIONS:
+                raise UserError(_('Dimension inconnue : %s', spec))
+        aggregates = ['%s:sum' % fname for fname in CUBE_MEASURES]
+        rows = []
+        for group in self._read_group(domain or [], groupby, aggregates):
+            keys, values = group[:len(groupby)], group[len(groupby):]
+            row = {}
+            for spec, key in zip(groupby, keys):
+                if isinstance(key, models.BaseModel):
+                    key = {'id': key.id, 'name': key.display_name} if key else False
+                elif isinstance(key, date):
+                    key = fields.Date.to_string(key)
+                row[spec] = key
+            row.update(zip(CUBE_MEASURES, values))
+            row['taux_collecte'] = (
+                row['montant_encaisse'] / row['montant_du'] * 100 if row['montant_du'] else 0.0)
+            rows.append(row)
+        return rows
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, api
+
+_logger = logging.getLogger(__name__)
+
+# Ordre de recalcul : chaque modèle lit le display_name déjà à jour du précédent
+DISPLAY_NAME_CHAIN = ('syndic.building', 'syndic.apartment', 'syndic.person.apartment')
+
+DISPLAY_NAME_UPDATE = """
+    UPDATE {table} t
+       SET display_name = x.display_name
+      FROM (
+            SELECT s.id, {expr} AS display_name
+              FROM {table} s
+                   {joins}
+             WHERE s.id IN %(ids)s
+           ) x
+     WHERE x.id = t.id
+       AND t.display_name IS DISTINCT FROM x.display_name
+ RETURNING t.id
+"""
+
+
+def selection_label_sql(field, expr):
+    """Libellé SQL d'un champ Selection : ``(expression, paramètres nommés)``.
+
+    Valeurs et libellés sont passés en paramètres de requête. Seul le
+    libellé de la définition du champ est utilisé, comme dans les
+    ``_compute_display_name`` : les libellés traduits ne sont pas gérés.
+    """
+    values, labels = '%s_values' % field.name, '%s_labels' % field.name
+    sql = "COALESCE((%%(%s)s::text[])[array_position(%%(%s)s::text[], %s::text)], '')" % (
+        labels, values, expr)
+    return sql, {
+        values: [value for value, _label in field.selection],
+        labels: [label for _value, label in field.selection],
+    }
+
+
+class DisplayNameMixin(models.AbstractModel):
+    """Recalcul ensembliste des display_name stockés en cascade.
+
+    Renommer une résidence ou un immeuble invalide les noms de milliers de
+    lots et de liaisons. Plutôt que de laisser l'ORM les recalculer un par
+    un, ``_cascade_display_names`` reprend les enregistrements en attente de
+    recalcul sur la chaîne immeuble → lot → liaison et les met à jour par une
+    requête par modèle, limitée au sous-arbre concerné.
+
+    Chaque modèle fournit ``_display_name_sql()`` : les jointures depuis
+    l'alias ``s``, l'expression SQL équivalente à son
+    ``_compute_display_name`` et ses paramètres, ainsi que
+    ``_display_name_flush`` (champs lus par l'expression, par modèle). Un
+    modèle sans expression SQL garde le recalcul standard de l'ORM.
+    """
+    _name = 'syndic.display.name.mixin'
+    _description = 'Nom affiché recalculé en SQL'
+
+    _display_name_flush = {}
+
+    def _display_name_sql(self):
+        """Retourne ``(jointures, expression, paramètres)`` calculant display_name depuis ``s``.
+
+        ``None`` : pas de version SQL, display_name est recalculé par l'ORM.
+        """
+        return None
+
+    def write(self, vals):
+        res = super(DisplayNameMixin, self).write(vals)
+        self._cascade_display_names()
+        return res
+
+    @api.model
+    def _cascade_display_names(self):
+        """Recalcule en SQL les display_name en attente sur toute la chaîne."""
+        for model_name in DISPLAY_NAME_CHAIN:
+            Model = self.env[model_name]
+            records = self.env.records_to_compute(Model._fields['display_name'])
+            if records:
+                records._refresh_display_name()
+
+    def _refresh_display_name(self):
+        """Met à jour display_name (et la clé de recherche) de ``self`` en une requête."""
+        if not self:
+            return
+        name_sql = self._display_name_sql()
+        if name_sql is None:
+            return
+        for model_name, fnames in self._display_name_flush.items():
+            self.env[model_name].flush_model(fnames)
+        joins, expr, params = name_sql
+        self.env.cr.execute(
+            DISPLAY_NAME_UPDATE.format(table=self._table, joins=joins, expr=expr),
+            dict(params, ids=tuple(self.ids))
+        )
+        changed = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.env.remove_to_compute(self._fields['display_name'], self)
+        self.invalidate_recordset(['display_name'])
+        # Propage aux dépendants (liaisons, clé de recherche...)
+        changed.modified(['display_name'])
+        if changed and 'display_name' in getattr(self, '_search_key_fields', ()):
+            self.env.cr.execute(
+                "UPDATE %s t SET search_key = %s WHERE t.id IN %%s"
+                % (self._table, self._search_key_sql('t')),
+                [tuple(changed.ids)]
+            )
+            self.env.remove_to_compute(self._fields['search_key'], changed)
+            changed.invalidate_recordset(['search_key'])
+        _logger.debug("%s : %d display_name recalculé(s) en SQL sur %d.",
+                      self._name, len(changed), len(self))
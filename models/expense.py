@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+
+class Expense(models.Model):
+    _name = 'syndic.expense'
+    _description = 'Dépense de la copropriété'
+    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _order = 'date desc, id desc'
+
+    name = fields.Char(
+        string='Libellé',
+        required=True,
+        tracking=True
+    )
+    date = fields.Date(
+        string='Date',
+        required=True,
+        default=fields.Date.today,
+        index=True,
+        tracking=True
+    )
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        required=True,
+        index=True,
+        tracking=True
+    )
+    category_id = fields.Many2one(
+        'syndic.charge_category',
+        string='Catégorie de charge',
+        required=True,
+        index=True,
+        tracking=True
+    )
+    montant = fields.Float(
+        string='Montant',
+        required=True,
+        tracking=True
+    )
+    fournisseur = fields.Char(string='Fournisseur', tracking=True)
+    reference = fields.Char(string='N° Facture')
+
+    state = fields.Selection([
+        ('brouillon', 'Brouillon'),
+        ('valide', 'Validée'),
+        ('annule', 'Annulée'),
+    ], string='État', default='brouillon', tracking=True)
+
+    notes = fields.Text(string='Notes')
+    active = fields.Boolean(string='Actif', default=True)
+
+    def init(self):
+        # Agrégation des réalisés du budget : (résidence, catégorie) sur une année
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS syndic_expense_budget_index
+                ON syndic_expense (residence_id, category_id, date)
+             WHERE state = 'valide' AND active
+        """)
+
+    def action_validate(self):
+        self.write({'state': 'valide'})
+
+    def action_cancel(self):
+        self.write({'state': 'annule'})
+
+    def action_draft(self):
+        self.write({'state': 'brouillon'})
+
+    @api.constrains('montant')
+    def _check_montant(self):
+        for record in self:
+            if record.montant <= 0:
+                raise ValidationError(_('Le montant doit être supérieur à zéro!'))
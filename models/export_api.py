@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+EXPORT_PAGE_DEFAULT = 10000
+EXPORT_PAGE_MAX = 500000
+# Lignes lues par aller-retour du curseur serveur (mémoire constante)
+EXPORT_BATCH = 2000
+# Les transactions en cours ont un write_date antérieur à leur commit : on
+# n'exporte que les lignes modifiées depuis plus longtemps que ce délai.
+EXPORT_SAFETY_PARAM = 'syndic_cotisation.export_safety_seconds'
+EXPORT_SAFETY_DEFAULT = 300
+
+
+def iter_named_cursor(cr, query, params=None, batch=EXPORT_BATCH):
+    """Itère par lots de ``batch`` lignes le résultat de ``query`` via un curseur serveur nommé.
+
+    Le résultat reste côté PostgreSQL : la mémoire ne dépend que de ``batch``.
+    """
+    # Le curseur Odoo n'expose pas de curseur nommé : il est ouvert sur la
+    # connexion psycopg2 sous-jacente, donc dans la même transaction (mêmes
+    # données, écritures ORM déjà flushées comprises) et fermé avant sa fin.
+    with cr._cnx.cursor('syndic_%s' % uuid.uuid4().hex) as cursor:
+        cursor.itersize = batch
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield rows
+
+
+def encode_token(model_name, write_date, record_id):
+    """Jeton opaque « modifications depuis » : position (write_date, id) dans ``model_name``.
+
+    write_date est conservée à la microseconde : tronquée, la reprise
+    relirait les lignes de la même seconde et pourrait boucler.
+    """
+    payload = json.dumps({'m': model_name, 'w': write_date.isoformat(sep=' '), 'i': record_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_token(model_name, token):
+    """Retourne ``(write_date, id)`` du jeton, ou lève ``UserError`` s'il est invalide."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        write_date, record_id = datetime.fromisoformat(payload['w']), int(payload['i'])
+    except (ValueError, KeyError, TypeError):
+        raise UserError(_('Jeton de synchronisation invalide.'))
+    if payload.get('m') != model_name:
+        raise UserError(_('Ce jeton de synchronisation concerne un autre modèle (%s).', payload.get('m')))
+    return write_date, record_id
+
+
+class ExportMixin(models.AbstractModel):
+    """Export incrémental par pagination sur clé ``(write_date, id)``.
+
+    Une page est bornée à l'avance (``_export_page``, LIMIT sur l'index de
+    la clé) puis parcourue par un curseur serveur nommé (``_export_rows``) :
+    ni OFFSET ni chargement de la page en mémoire. Le jeton retourné sert de point de reprise pour la page
+    suivante comme pour la synchronisation du lendemain.
+    """
+    _name = 'syndic.export.mixin'
+    _description = 'Export incrémental (pagination par clé)'
+
+    _export_fields = ()
+
+    def _auto_init(self):
+        res = super(ExportMixin, self)._auto_init()
+        if self._auto:
+            sql.create_index(self.env.cr, '%s_write_date_id_index' % self._table,
+                             self._table, ['write_date', 'id'])
+        return res
+
+    @api.model
+    def _export_query(self, since=None):
+        """Requête des lignes visibles (droits et règles via ``_search``) après ``since``."""
+        self.check_access_rights('read')
+        # Les archivages sont des modifications à synchroniser
+        query = self.with_context(active_test=False)._search([])
+        table = self._table
+        delay = int(self.env['ir.config_parameter'].sudo().get_param(
+            EXPORT_SAFETY_PARAM, EXPORT_SAFETY_DEFAULT))
+        query.add_where('"%s"."write_date" <= %%s' % table,
+                        [fields.Datetime.now() - timedelta(seconds=delay)])
+        if since:
+            query.add_where('("%s"."write_date", "%s"."id") > (%%s, %%s)' % (table, table), list(since))
+        return query
+
+    @api.model
+    def _export_page(self, since=None, limit=EXPORT_PAGE_DEFAULT):
+        """Bornes de la page : ``(dernière clé, suite éventuelle)``.
+
+        Les ``limit + 1`` premières clés après ``since`` sont lues sur
+        l'index ``(write_date, id)`` ; seules les deux dernières remontent :
+        la ``limit``-ième borne la page, la suivante signale une suite. La
+        dernière clé vaut ``None`` si aucune ligne n'a changé depuis ``since``.
+        """
+        table = self._table
+        query = self._export_query(since)
+        query.order = '"%s"."write_date", "%s"."id"' % (table, table)
+        query.limit = limit + 1
+        select = query.select('"%s"."write_date" AS write_date' % table, '"%s"."id" AS id' % table)
+        self.env.cr.execute("""
+            SELECT write_date, id, COUNT(*) OVER ()
+              FROM (%s) page
+          ORDER BY write_date DESC, id DESC
+             LIMIT 2
+        """ % select.code, select.params)
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return None, False
+        has_more = rows[0][2] > limit
+        write_date, record_id, _count = rows[1] if has_more else rows[0]
+        return (write_date, record_id), has_more
+
+    @api.model
+    def _export_rows(self, since, until, batch=EXPORT_BATCH):
+        """Itère les enregistrements de ]since, until] par lots lus via l'ORM.
+
+        Les identifiants défilent dans un curseur serveur ; chaque lot est lu
+        avec ``read`` (droits de champ compris) puis le cache est vidé.
+        """
+        table = self._table
+        query = self._export_query(since)
+        query.add_where('("%s"."write_date", "%s"."id") <= (%%s, %%s)' % (table, table), list(until))
+        query.order = '"%s"."write_date", "%s"."id"' % (table, table)
+        select = query.select('"%s"."id"' % table)
+        fnames = ['id', 'write_date'] + list(self._export_fields)
+        for rows in iter_named_cursor(self.env.cr, select.code, select.params, batch):
+            yield from self.browse([row[0] for row in rows]).read(fnames, load=None)
+            self.env.invalidate_all()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+
+class IrSequence(models.Model):
+    _inherit = 'ir.sequence'
+
+    @api.model
+    def _next_block_by_code(self, sequence_code, count, sequence_date=None):
+        """Réserve ``count`` numéros consécutifs de la séquence ``sequence_code``.
+
+        Équivalent de ``count`` appels à ``next_by_code`` en un seul aller-retour
+        SQL : ``nextval`` sur une série pour l'implémentation standard, un seul
+        verrou et une seule incrémentation pour l'implémentation sans trou.
+        Retourne une liste de ``count`` références (``False`` si la séquence
+        n'existe pas, comme ``next_by_code``).
+        """
+        if count <= 0:
+            return []
+        self.check_access_rights('read')
+        company_id = self.env.company.id
+        seq = self.sudo().search(
+            [('code', '=', sequence_code), ('company_id', 'in', [company_id, False])],
+            order='company_id', limit=1
+        )
+        if not seq:
+            return [False] * count
+        if seq.use_date_range:
+            # Les plages de dates ont leur propre compteur : pas de réservation en bloc
+            return [seq._next(sequence_date=sequence_date) for _i in range(count)]
+        return seq.with_context(ir_sequence_date=sequence_date)._next_block(count)
+
+    def _next_block(self, count):
+        self.ensure_one()
+        if self.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ('ir_sequence_%03d' % self.id, count)
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute(
+                "SELECT number_next FROM ir_sequence WHERE id=%s FOR UPDATE NOWAIT", [self.id]
+            )
+            first = self.env.cr.fetchone()[0]
+            self.env.cr.execute(
+                "UPDATE ir_sequence SET number_next=number_next+%s WHERE id=%s",
+                (self.number_increment * count, self.id)
+            )
+            self.invalidate_recordset(['number_next'])
+            numbers = [first + i * self.number_increment for i in range(count)]
+        return [self.get_next_char(number) for number in numbers]
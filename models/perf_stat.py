@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+import functools
+import logging
+import threading
+import time
+from collections import deque
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+PERF_PARAM = 'syndic_cotisation.perf_instrumentation'
+PERF_BUFFER_PARAM = 'syndic_cotisation.perf_buffer_size'
+PERF_MODULE = 'odoo.addons.syndic_cotisation'
+PERF_PREFIXES = ('_compute_', 'action_')
+# Délai minimal (secondes) entre deux reports des compteurs d'un processus
+PERF_FLUSH_INTERVAL = 60
+
+# Compteurs du processus pas encore reportés dans la table partagée, et
+# derniers appels mesurés (ceux-ci restent propres au processus)
+_lock = threading.Lock()
+_pending = {}
+_samples = deque(maxlen=10000)
+_last_flush = time.monotonic()
+
+FLUSH_QUERY = """
+    INSERT INTO syndic_perf_stat AS s (model, method, calls, total_ms, avg_ms, max_ms, queries,
+                                       avg_queries, records, create_date, write_date)
+    SELECT v.model, v.method, v.calls, v.total_ms, v.total_ms / v.calls, v.max_ms, v.queries,
+           v.queries::float / v.calls, v.records, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+      FROM (VALUES %s) AS v(model, method, calls, total_ms, max_ms, queries, records)
+    ON CONFLICT (model, method) DO UPDATE
+       SET calls = s.calls + EXCLUDED.calls,
+           total_ms = s.total_ms + EXCLUDED.total_ms,
+           avg_ms = (s.total_ms + EXCLUDED.total_ms) / (s.calls + EXCLUDED.calls),
+           max_ms = GREATEST(s.max_ms, EXCLUDED.max_ms),
+           queries = s.queries + EXCLUDED.queries,
+           avg_queries = (s.queries + EXCLUDED.queries)::float / (s.calls + EXCLUDED.calls),
+           records = s.records + EXCLUDED.records,
+           write_date = EXCLUDED.write_date
+"""
+
+
+def _record(key, seconds, queries, nb_records):
+    with _lock:
+        stat = _pending.get(key)
+        if stat is None:
+            stat = _pending[key] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                    'queries': 0, 'records': 0}
+        stat['calls'] += 1
+        stat['seconds'] += seconds
+        stat['max_seconds'] = max(stat['max_seconds'], seconds)
+        stat['queries'] += queries
+        stat['records'] += nb_records
+        _samples.append((time.time(), key, seconds, queries, nb_records))
+
+
+def _take_pending(force=False):
+    """Retire les compteurs à reporter, au plus une fois par ``PERF_FLUSH_INTERVAL``."""
+    global _last_flush
+    with _lock:
+        now = time.monotonic()
+        if not _pending or (not force and now - _last_flush < PERF_FLUSH_INTERVAL):
+            return {}
+        _last_flush = now
+        pending = dict(_pending)
+        _pending.clear()
+        return pending
+
+
+def _flush(registry, force=False):
+    """Ajoute les compteurs du processus à la table partagée par tous les workers.
+
+    Le report se fait dans un curseur dédié, validé aussitôt : il ne dépend
+    pas de la transaction mesurée. En cas d'échec, les compteurs sont remis
+    en attente pour le report suivant.
+    """
+    pending = _take_pending(force)
+    if not pending:
+        return
+    rows = []
+    for key, stat in pending.items():
+        model_name, method = key.rsplit('.', 1)
+        rows.append((model_name, method, stat['calls'], stat['seconds'] * 1000,
+                     stat['max_seconds'] * 1000, stat['queries'], stat['records']))
+    try:
+        with registry.cursor() as cr:
+            values = ', '.join(cr.mogrify('(%s, %s, %s, %s, %s, %s, %s)', row).decode() for row in rows)
+            cr.execute(FLUSH_QUERY % values)
+    except Exception:
+        _logger.warning("Instrumentation Syndic : report des compteurs impossible.", exc_info=True)
+        with _lock:
+            for key, stat in pending.items():
+                current = _pending.setdefault(key, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                    'queries': 0, 'records': 0})
+                for name in ('calls', 'seconds', 'queries', 'records'):
+                    current[name] += stat[name]
+                current['max_seconds'] = max(current['max_seconds'], stat['max_seconds'])
+
+
+def _instrument(key, method):
+    """Enveloppe ``method`` : durée, requêtes SQL et enregistrements traités.
+
+    Les mesures sont inclusives : une méthode appelée depuis une autre est
+    comptée dans les deux.
+    """
+    is_create = key.endswith('.create')
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if is_create:
+                nb_records = len(args[0]) if args and isinstance(args[0], list) else 1
+            else:
+                nb_records = len(self)
+            _record(key, time.perf_counter() - start, cr.sql_log_count - queries, nb_records)
+            _flush(self.pool)
+    wrapper._syndic_perf = True
+    return wrapper
+
+
+class PerfStat(models.Model):
+    """Compteurs d'instrumentation agrégés sur tous les processus.
+
+    Chaque worker cumule ses mesures en mémoire et les ajoute à cette table
+    au plus une fois par ``PERF_FLUSH_INTERVAL`` (à l'appel instrumenté
+    suivant) : les mesures d'un worker inactif n'apparaissent qu'à sa
+    prochaine activité. Les derniers appels (``_recent_samples``) restent
+    propres au processus.
+    """
+    _name = 'syndic.perf.stat'
+    _description = 'Statistiques de performance (instrumentation)'
+    _order = 'total_ms desc'
+
+    method = fields.Char(string='Méthode', readonly=True, required=True)
+    model = fields.Char(string='Modèle', readonly=True, required=True)
+    calls = fields.Integer(string='Appels', readonly=True)
+    total_ms = fields.Float(string='Durée totale (ms)', readonly=True)
+    avg_ms = fields.Float(string='Durée moyenne (ms)', readonly=True, group_operator='avg')
+    max_ms = fields.Float(string='Durée max (ms)', readonly=True, group_operator='max')
+    queries = fields.Integer(string='Requêtes SQL', readonly=True)
+    avg_queries = fields.Float(string='Requêtes / appel', readonly=True, group_operator='avg')
+    records = fields.Integer(string='Enregistrements traités', readonly=True)
+
+    _sql_constraints = [
+        ('model_method_unique', 'UNIQUE(model, method)', 'Une seule ligne par méthode instrumentée.'),
+    ]
+
+    def _register_hook(self):
+        """Installe les sondes si l'instrumentation est activée.
+
+        Désactivée, aucune méthode n'est enveloppée : le coût est nul. Le
+        paramètre n'est lu qu'au chargement du registre : l'activer ou le
+        désactiver n'a d'effet qu'après un redémarrage des serveurs (ou une
+        mise à jour du module).
+        """
+        super(PerfStat, self)._register_hook()
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param(PERF_PARAM, 'False').lower() not in ('1', 'true'):
+            return
+        size = int(ICP.get_param(PERF_BUFFER_PARAM, 10000))
+        global _samples
+        if _samples.maxlen != size:
+            with _lock:
+                _samples = deque(_samples, maxlen=size)
+        count = 0
+        for model_name, cls in self.env.registry.items():
+            if not model_name.startswith('syndic.') or model_name == self._name:
+                continue
+            for attr in dir(cls):
+                if not (attr.startswith(PERF_PREFIXES) or attr == 'create'):
+                    continue
+                method = getattr(cls, attr, None)
+                if not callable(method) or getattr(method, '_syndic_perf', False):
+                    continue
+                if not getattr(method, '__module__', '').startswith(PERF_MODULE):
+                    continue
+                setattr(cls, attr, _instrument('%s.%s' % (model_name, attr), method))
+                count += 1
+        _logger.info("Instrumentation Syndic active : %d méthode(s) instrumentée(s).", count)
+
+    @api.model
+    def _recent_samples(self, limit=100):
+        """Derniers appels mesurés par ce processus : (horodatage, méthode, secondes, requêtes, enregistrements)."""
+        with _lock:
+            return list(_samples)[-limit:]
+
+    @api.model
+    def action_open_stats(self):
+        """Reporte les compteurs du processus courant et ouvre les agrégats de tous les workers."""
+        _flush(self.pool, force=True)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Statistiques de performance'),
+            'res_model': self._name,
+            'view_mode': 'tree,pivot',
+            'target': 'current',
+        }
+
+    @api.model
+    def action_reset(self):
+        """Remet à zéro la table partagée et les compteurs du processus courant.
+
+        Les compteurs pas encore reportés par les autres workers y seront
+        ajoutés à leur prochain report.
+        """
+        with _lock:
+            _pending.clear()
+            _samples.clear()
+        self.env.cr.execute("DELETE FROM syndic_perf_stat")
+        self.invalidate_model()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
+
+    @api.model
+    def _cron_log_summary(self, limit=20):
+        """Journalise les méthodes les plus coûteuses, tous workers confondus."""
+        _flush(self.pool, force=True)
+        stats = self.search([], limit=limit)
+        if not stats:
+            _logger.info("Instrumentation Syndic : aucune mesure.")
+            return
+        lines = ["%-60s %7s %10s %9s %9s" % ('méthode', 'appels', 'total ms', 'moy. ms', 'req/appel')]
+        for stat in stats:
+            lines.append("%-60s %7d %10.1f %9.2f %9.1f" % (
+                '%s.%s' % (stat.model, stat.method), stat.calls, stat.total_ms,
+                stat.avg_ms, stat.avg_queries))
+        _logger.info("Instrumentation Syndic (tous workers) :\n%s", "\n".join(lines))
@@ -7,17 +7,21 @@ import re
 class Person(models.Model):
     _name = 'syndic.person'
     _description = 'Personne (Propriétaire / Locataire)'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.search.mixin']
     _order = 'name, prenom'
+    _search_key_fields = ('display_name', 'cin', 'email', 'tel', 'mobile')
+    _search_exact_fields = ('cin', 'email', 'tel', 'mobile')
 
     # Personal Information
     name = fields.Char(
         string='Nom',
         required=True,
+        index='trigram',
         tracking=True
     )
     prenom = fields.Char(
         string='Prénom',
+        index='trigram',
         tracking=True
     )
     type_person = fields.Selection([
@@ -29,6 +33,7 @@ class Person(models.Model):
     # Identity Documents
     cin = fields.Char(
         string='CIN',
+        index='trigram',
         tracking=True
     )
     passport = fields.Char(
@@ -55,6 +60,7 @@ class Person(models.Model):
     )
     email = fields.Char(
         string='Email',
+        index='trigram',
         tracking=True
     )
     
@@ -92,6 +98,11 @@ class Person(models.Model):
         'person_id',
         string='Règlements'
     )
+    appel_fond_line_ids = fields.One2many(
+        'syndic.appel.fond.line',
+        'person_id',
+        string='Lignes d\'appels de fonds'
+    )
     
     # Computed fields
     apartment_count = fields.Integer(
@@ -100,7 +111,26 @@ class Person(models.Model):
     )
     total_paid = fields.Float(
         string='Total payé',
-        compute='_compute_payment_totals'
+        compute='_compute_payment_totals',
+        store=True,
+        help='Somme des règlements encaissés'
+    )
+    total_pending = fields.Float(
+        string='Total en attente',
+        compute='_compute_payment_totals',
+        store=True,
+        help='Somme des règlements en brouillon ou validés, pas encore encaissés'
+    )
+    total_due = fields.Float(
+        string='Total dû',
+        compute='_compute_total_due',
+        store=True,
+        help='Somme des montants appelés (montant × quote-part) des appels confirmés ou envoyés'
+    )
+    balance = fields.Float(
+        string='Solde restant dû',
+        compute='_compute_balance',
+        store=True
     )
     
     active = fields.Boolean(
@@ -116,7 +146,8 @@ class Person(models.Model):
     # Display name
     display_name = fields.Char(
         compute='_compute_display_name',
-        store=True
+        store=True,
+        index='trigram'
     )
     
     @api.depends('name', 'prenom', 'is_company', 'company_name')
@@ -134,12 +165,43 @@ class Person(models.Model):
         for record in self:
             record.apartment_count = len(record.apartment_ids)
     
-    @api.depends('reglement_ids.montant')
+    @api.depends('reglement_ids.montant', 'reglement_ids.state', 'reglement_ids.active')
     def _compute_payment_totals(self):
+        totals = {
+            (person.id, state): montant
+            for person, state, montant in self.env['syndic.reglement']._read_group(
+                [('person_id', 'in', self.ids), ('state', 'in', ('brouillon', 'valide', 'encaisse'))],
+                ['person_id', 'state'],
+                ['montant:sum'],
+            )
+        }
         for record in self:
-            record.total_paid = sum(
-                reglement.montant for reglement in record.reglement_ids
+            record.total_paid = totals.get((record.id, 'encaisse'), 0.0)
+            record.total_pending = (
+                totals.get((record.id, 'brouillon'), 0.0) + totals.get((record.id, 'valide'), 0.0)
             )
+
+    @api.depends('appel_fond_line_ids.montant', 'appel_fond_line_ids.state')
+    def _compute_total_due(self):
+        dues = dict(self.env['syndic.appel.fond.line']._read_group(
+            [('person_id', 'in', self.ids), ('state', 'in', ('confirme', 'envoye'))],
+            ['person_id'],
+            ['montant:sum'],
+        ))
+        for record in self:
+            record.total_due = dues.get(record, 0.0)
+
+    @api.depends('total_due', 'total_paid')
+    def _compute_balance(self):
+        for record in self:
+            record.balance = record.total_due - record.total_paid
+
+    def write(self, vals):
+        res = super(Person, self).write(vals)
+        if {'name', 'prenom', 'is_company', 'company_name'} & set(vals):
+            # Noms des liaisons de copropriété recalculés en une requête
+            self.env['syndic.display.name.mixin']._cascade_display_names()
+        return res
     
     @api.constrains('email')
     def _check_email(self):
@@ -1,13 +1,29 @@
 # -*- coding: utf-8 -*-
+import logging
+
+import psycopg2
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .display_name import selection_label_sql
+
+_logger = logging.getLogger(__name__)
+
+# Nombre maximum de chevauchements détaillés dans un message d'erreur
+MAX_REPORTED_OVERLAPS = 20
+
 
 class PersonApartment(models.Model):
     _name = 'syndic.person.apartment'
     _description = 'Liaison Personne - Appartement (Copropriété)'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.display.name.mixin']
     _rec_name = 'display_name'
+    _display_name_flush = {
+        'syndic.person': ['display_name'],
+        'syndic.apartment': ['display_name'],
+        'syndic.person.apartment': ['person_id', 'apartment_id', 'statut'],
+    }
 
     person_id = fields.Many2one(
         'syndic.person',
@@ -90,7 +106,16 @@ class PersonApartment(models.Model):
         store=True
     )
 
-    @api.depends('person_id.name', 'apartment_id.num', 'statut')
+    @api.model
+    def _residence_links_domain(self, residence_ids):
+        """Liaisons actives d'appartements et d'immeubles actifs des résidences données."""
+        return [
+            ('residence_id', 'in', residence_ids),
+            ('apartment_id.active', '=', True),
+            ('building_id.active', '=', True),
+        ]
+
+    @api.depends('person_id.display_name', 'apartment_id.display_name', 'statut')
     def _compute_display_name(self):
         for record in self:
             statut_label = dict(record._fields['statut'].selection).get(record.statut, '')
@@ -99,6 +124,17 @@ class PersonApartment(models.Model):
             else:
                 record.display_name = f"{statut_label}"
 
+    def _display_name_sql(self):
+        statut_label, params = selection_label_sql(self._fields['statut'], 's.statut')
+        return (
+            "LEFT JOIN syndic_person p ON p.id = s.person_id "
+            "LEFT JOIN syndic_apartment a ON a.id = s.apartment_id",
+            "CASE WHEN p.id IS NOT NULL AND a.id IS NOT NULL "
+            "THEN concat(p.display_name, ' - ', a.display_name, ' (', %(label)s, ')') "
+            "ELSE %(label)s END" % {'label': statut_label},
+            params,
+        )
+
     # ------------------- existing constraints / onchanges -------------------
     @api.constrains('part')
     def _check_part(self):
@@ -119,30 +155,128 @@ class PersonApartment(models.Model):
                 if record.date_fin < record.date_debut:
                     raise ValidationError(_('La date de fin doit être postérieure à la date de début!'))
 
-    @api.constrains('person_id', 'apartment_id', 'date_debut', 'date_fin')
+    @api.constrains('person_id', 'apartment_id', 'date_debut', 'date_fin', 'active')
     def _check_overlapping_periods(self):
-        """Vérifie qu'il n'y a pas de périodes qui se chevauchent pour la même personne et le même appartement"""
-        for record in self:
-            if not record.date_debut:
+        """Vérifie qu'il n'y a pas de périodes qui se chevauchent pour la même personne et le même appartement
+
+        Une seule requête pour tout le lot ; la contrainte d'exclusion
+        PostgreSQL garantit la même règle en cas d'écritures concurrentes.
+        """
+        self.flush_recordset(['person_id', 'apartment_id', 'date_debut', 'date_fin', 'active'])
+        self.env.cr.execute("""
+            SELECT pa.person_id, pa.apartment_id, pa.date_debut, pa.date_fin
+              FROM syndic_person_apartment pa
+              JOIN syndic_person_apartment other
+                ON other.person_id = pa.person_id
+               AND other.apartment_id = pa.apartment_id
+               AND other.id != pa.id
+               AND other.active
+               AND other.date_debut IS NOT NULL
+               AND (other.date_fin IS NULL OR other.date_fin >= other.date_debut)
+               AND daterange(other.date_debut, other.date_fin, '[]')
+                   && daterange(pa.date_debut, pa.date_fin, '[]')
+             WHERE pa.id IN %s
+               AND pa.active
+               AND pa.date_debut IS NOT NULL
+               AND (pa.date_fin IS NULL OR pa.date_fin >= pa.date_debut)
+        """, [tuple(self.ids)])
+        self._raise_overlaps(self.env.cr.fetchall())
+
+    @api.model
+    def _check_overlapping_vals(self, vals_list):
+        """Contrôle en une requête les chevauchements d'un lot à créer.
+
+        Compare les nouvelles périodes entre elles et avec l'existant, et
+        signale toutes les erreurs d'un coup avant l'insertion.
+        """
+        default_debut = fields.Date.to_date(self.default_get(['date_debut']).get('date_debut'))
+        rows = [[], [], [], []]
+        for vals in vals_list:
+            date_debut = fields.Date.to_date(vals.get('date_debut', default_debut))
+            if not date_debut or not vals.get('active', True):
                 continue
+            for column, value in zip(rows, (
+                    vals.get('person_id'), vals.get('apartment_id'),
+                    date_debut, fields.Date.to_date(vals.get('date_fin')))):
+                column.append(value)
+        if not rows[0]:
+            return
+        self.flush_model(['person_id', 'apartment_id', 'date_debut', 'date_fin', 'active'])
+        self.env.cr.execute("""
+            WITH new AS (
+                SELECT n.*, row_number() OVER () AS idx
+                  FROM unnest(%s::int[], %s::int[], %s::date[], %s::date[])
+                       AS n(person_id, apartment_id, date_debut, date_fin)
+                 WHERE n.date_fin IS NULL OR n.date_fin >= n.date_debut
+            )
+            SELECT n.person_id, n.apartment_id, n.date_debut, n.date_fin
+              FROM new n
+              JOIN syndic_person_apartment pa
+                ON pa.person_id = n.person_id
+               AND pa.apartment_id = n.apartment_id
+               AND pa.active
+               AND pa.date_debut IS NOT NULL
+               AND (pa.date_fin IS NULL OR pa.date_fin >= pa.date_debut)
+               AND daterange(pa.date_debut, pa.date_fin, '[]')
+                   && daterange(n.date_debut, n.date_fin, '[]')
+            UNION ALL
+            SELECT n.person_id, n.apartment_id, n.date_debut, n.date_fin
+              FROM new n
+              JOIN new m
+                ON m.person_id = n.person_id
+               AND m.apartment_id = n.apartment_id
+               AND m.idx < n.idx
+               AND daterange(m.date_debut, m.date_fin, '[]')
+                   && daterange(n.date_debut, n.date_fin, '[]')
+        """, rows)
+        self._raise_overlaps(self.env.cr.fetchall())
 
-            domain = [
-                ('id', '!=', record.id),
-                ('person_id', '=', record.person_id.id),
-                ('apartment_id', '=', record.apartment_id.id),
-                ('date_debut', '<=', record.date_fin or '2099-12-31'),
-            ]
+    @api.model
+    def _raise_overlaps(self, overlaps):
+        """Lève une seule erreur listant les périodes (person_id, apartment_id, début, fin) en conflit."""
+        if not overlaps:
+            return
+        persons = self.env['syndic.person'].browse({row[0] for row in overlaps})
+        apartments = self.env['syndic.apartment'].browse({row[1] for row in overlaps})
+        names = {('p', p.id): p.display_name for p in persons}
+        names.update({('a', a.id): a.display_name for a in apartments})
+        details = [
+            _('- %(person)s / %(apartment)s : du %(debut)s au %(fin)s',
+              person=names[('p', person_id)], apartment=names[('a', apartment_id)],
+              debut=date_debut, fin=date_fin or _('(sans fin)'))
+            for person_id, apartment_id, date_debut, date_fin in overlaps[:MAX_REPORTED_OVERLAPS]
+        ]
+        if len(overlaps) > MAX_REPORTED_OVERLAPS:
+            details.append(_('... et %s autre(s).', len(overlaps) - MAX_REPORTED_OVERLAPS))
+        raise ValidationError(_(
+            'Il existe déjà une période qui chevauche pour cette personne et cet appartement!\n%s',
+            '\n'.join(details)
+        ))
 
-            if record.date_fin:
-                domain.append(('date_fin', '>=', record.date_debut))
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._check_overlapping_vals(vals_list)
+        return super(PersonApartment, self).create(vals_list)
 
-            overlapping = self.search(domain, limit=1)
-            if overlapping:
-                raise ValidationError(_(
-                    'Il existe déjà une période qui chevauche pour cette personne et cet appartement!'
-                ))
+    def _auto_init(self):
+        # btree_gist : nécessaire pour l'égalité sur entiers dans la contrainte d'exclusion GiST
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error:
+            _logger.warning(
+                "Extension btree_gist indisponible : le non-chevauchement des copropriétés "
+                "ne sera contrôlé qu'au niveau applicatif.")
+        return super(PersonApartment, self)._auto_init()
 
     _sql_constraints = [
         ('person_apartment_unique', 'UNIQUE(person_id, apartment_id, date_debut)',
-         'Cette liaison existe déjà pour cette date!')
-    ]
\ No newline at end of file
+         'Cette liaison existe déjà pour cette date!'),
+        ('person_apartment_dates_check', 'CHECK(date_fin IS NULL OR date_fin >= date_debut)',
+         'La date de fin doit être postérieure à la date de début!'),
+        ('person_apartment_no_overlap',
+         "EXCLUDE USING gist (person_id WITH =, apartment_id WITH =, "
+         "daterange(date_debut, date_fin, '[]') WITH &&) "
+         "WHERE (active AND date_debut IS NOT NULL)",
+         'Il existe déjà une période qui chevauche pour cette personne et cet appartement!'),
+    ]
@@ -1,13 +1,79 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.modules.registry import Registry
+from odoo.tools.pdf import merge_pdf
+
+_logger = logging.getLogger(__name__)
+
+# Gabarit QWeb (sa date de modification sert de sel au cache des reçus)
+RECEIPT_REPORT = 'syndic_cotisation.report_reglement_receipt'
+# Action de rapport utilisée pour le rendu
+RECEIPT_REPORT_ACTION = 'syndic_cotisation.action_report_reglement_receipt'
+RECEIPT_CACHE_PREFIX = 'syndic_receipt:'
+# Champs dont la modification impose de refaire le lettrage de la personne
+ALLOCATION_FIELDS = {'person_id', 'apartment_id', 'state', 'date', 'montant', 'active'}
+# Champs dont la modification change les faits du cube de collecte
+CUBE_FIELDS = {'apartment_id', 'appel_fond_id', 'state', 'mode', 'date', 'date_encaissement',
+               'montant', 'active'}
+# Modes remis en banque sur bordereau : encaissés à la date de remise.
+# Les autres (virement, carte...) sont encaissés à la date du paiement.
+DEPOSIT_MODES = ('cheque', 'espece')
+# Date d'encaissement par mode, évaluée sur la ligne avant mise à jour
+ENCAISSEMENT_DATE_SQL = """CASE
+    WHEN old.date_encaissement IS NOT NULL THEN old.date_encaissement
+    WHEN old.mode IN %s THEN %s::date
+    ELSE old.date
+END"""
+MAX_REPORTED_ERRORS = 20
+
+
+def _stream_pdfs(streams):
+    """PDF par règlement des flux rendus par ``_render_qweb_pdf_prepare_streams``.
+
+    Quand le PDF d'un lot ne peut pas être découpé par reçu, il est rangé
+    sous la clé ``False`` (ou sans flux) : il est ignoré et les reçus
+    absents sont rendus un par un par l'appelant.
+    """
+    pdfs = {}
+    for res_id, stream_data in streams.items():
+        stream = stream_data.get('stream')
+        if stream is None:
+            continue
+        if res_id:
+            pdfs[res_id] = stream.getvalue()
+        stream.close()
+    return pdfs
+
+
+def _render_receipt_chunk(dbname, uid, context, res_ids):
+    """Rend un lot de reçus dans son propre curseur (exécuté dans un thread).
+
+    Le curseur dédié ne voit que les données validées en base : n'est
+    appelé que depuis la file de rendu, jamais depuis une requête.
+    """
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        return _stream_pdfs(env['ir.actions.report']._render_qweb_pdf_prepare_streams(
+            RECEIPT_REPORT_ACTION, {}, res_ids=res_ids))
 
 
 class Reglement(models.Model):
     _name = 'syndic.reglement'
     _description = 'Règlement / Paiement'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'syndic.bulk.state.mixin', 'syndic.export.mixin']
     _order = 'date desc, num_recu desc'
+    _export_fields = (
+        'name', 'num_recu', 'person_id', 'apartment_id', 'residence_id', 'appel_fond_id',
+        'bordereau_id', 'mode', 'date', 'date_encaissement', 'montant', 'num_cheque', 'banque',
+        'reference_virement', 'state', 'active',
+    )
+    _bulk_parent_fields = ('bordereau_id', 'appel_fond_id', 'person_id')
 
     name = fields.Char(
         string='Référence',
@@ -93,9 +159,34 @@ class Reglement(models.Model):
 
     active = fields.Boolean(string='Actif', default=True)
 
+    bordereau_id = fields.Many2one(
+        'syndic.bordereau.remise',
+        string='Bordereau de remise',
+        copy=False,
+        readonly=True,
+        index=True,
+        tracking=True
+    )
+
     # Printed
     is_printed = fields.Boolean(string='Imprimé', default=False)
 
+    # Lettrage
+    allocation_ids = fields.One2many(
+        'syndic.reglement.allocation',
+        'reglement_id',
+        string='Imputations',
+        readonly=True
+    )
+    montant_impute = fields.Float(
+        string='Montant imputé',
+        compute='_compute_montant_impute'
+    )
+    montant_non_impute = fields.Float(
+        string='Avance non imputée',
+        compute='_compute_montant_impute'
+    )
+
     _sql_constraints = [
         ('reglement_name_unique', 'UNIQUE(name)', 'La référence du règlement doit être unique!')
     ]
@@ -103,20 +194,73 @@ class Reglement(models.Model):
     # ------------------------------------------------------------------
     # CRUD
     # ------------------------------------------------------------------
-    @api.model
-    def create(self, vals):
-        # Référence
-        if vals.get('name', _('Nouveau')) == _('Nouveau'):
-            vals['name'] = (
-                self.env['ir.sequence'].next_by_code('syndic.reglement') or
-                _('Nouveau')
-            )
+    @api.model_create_multi
+    def create(self, vals_list):
+        Sequence = self.env['ir.sequence']
+
+        # Références : un seul bloc réservé pour tout le lot
+        to_name = [vals for vals in vals_list if vals.get('name', _('Nouveau')) == _('Nouveau')]
+        names = Sequence._next_block_by_code('syndic.reglement', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or _('Nouveau')
 
-        # Numéro de reçu : uniquement la séquence (pas de fallback unsafe)
-        if not vals.get('num_recu'):
-            vals['num_recu'] = self.env['ir.sequence'].next_by_code('syndic.reglement.recu')
+        # Numéros de reçu : uniquement la séquence (pas de fallback unsafe)
+        to_number = [vals for vals in vals_list if not vals.get('num_recu')]
+        numbers = Sequence._next_block_by_code('syndic.reglement.recu', len(to_number))
+        for vals, number in zip(to_number, numbers):
+            vals['num_recu'] = number
+
+        reglements = super(Reglement, self).create(vals_list)
+        cashed = reglements.filtered(lambda r: r.state == 'encaisse')
+        if cashed:
+            self.env['syndic.reglement.allocation']._reallocate(cashed.person_id.ids)
+            self.env['syndic.collection.cube']._mark_dirty(cashed._cube_keys())
+        return reglements
+
+    def write(self, vals):
+        # Périodes du cube avant et après modification
+        cube_keys = self._cube_keys() if CUBE_FIELDS.intersection(vals) else None
+        if not ALLOCATION_FIELDS.intersection(vals):
+            res = super(Reglement, self).write(vals)
+        else:
+            person_ids = set(self.person_id.ids)
+            res = super(Reglement, self).write(vals)
+            person_ids.update(self.person_id.ids)
+            self.env['syndic.reglement.allocation']._reallocate(person_ids)
+        if cube_keys is not None:
+            self.env['syndic.collection.cube']._mark_dirty(cube_keys | self._cube_keys())
+        return res
 
-        return super(Reglement, self).create(vals)
+    def unlink(self):
+        cashed = self.filtered(lambda r: r.state == 'encaisse')
+        person_ids = cashed.person_id.ids
+        cube_keys = cashed._cube_keys()
+        res = super(Reglement, self).unlink()
+        self.env['syndic.reglement.allocation']._reallocate(person_ids)
+        self.env['syndic.collection.cube']._mark_dirty(cube_keys)
+        return res
+
+    def _cube_keys(self):
+        """Périodes ``(résidence, année, mois)`` du cube de collecte concernées."""
+        keys = set()
+        for record in self:
+            residence = record.residence_id or record.apartment_id.residence_id
+            date = record.date_encaissement or record.date
+            if residence and date:
+                keys.add((residence.id, date.year, '%02d' % date.month))
+        return keys
+
+    # ------------------------------------------------------------------
+    # COMPUTE
+    # ------------------------------------------------------------------
+    @api.depends('allocation_ids.montant', 'montant', 'state')
+    def _compute_montant_impute(self):
+        totals = dict(self.env['syndic.reglement.allocation']._read_group(
+            [('reglement_id', 'in', self.ids)], ['reglement_id'], ['montant:sum']))
+        for record in self:
+            record.montant_impute = totals.get(record, 0.0)
+            record.montant_non_impute = (
+                record.montant - record.montant_impute if record.state == 'encaisse' else 0.0)
 
     # ------------------------------------------------------------------
     # ONCHANGE
@@ -143,26 +287,202 @@ class Reglement(models.Model):
     # ACTIONS
     # ------------------------------------------------------------------
     def action_validate(self):
-        self.write({'state': 'valide'})
+        self._set_state('valide')
 
-    def action_encaisse(self):
-        if self.mode == 'cheque' and not self.date_encaissement:
-            self.date_encaissement = fields.Date.today()
-        self.write({'state': 'encaisse'})
+    def action_encaisse(self, date_remise=None, bordereau=None):
+        """Encaisse tous les règlements en une passe.
+
+        Les contrôles (état, numéro de chèque, dates) portent sur l'ensemble
+        en une requête et toutes les erreurs sont remontées ensemble. La date
+        d'encaissement est fixée par mode (``DEPOSIT_MODES`` : date de
+        remise, sinon date du paiement) sauf si elle est déjà renseignée.
+        """
+        date_remise = date_remise or fields.Date.context_today(self)
+        self._check_encaissement(date_remise)
+        vals = {'bordereau_id': bordereau.id} if bordereau else {}
+        if self._use_bulk():
+            return self._bulk_set_state('encaisse', vals, exprs={
+                'date_encaissement': (ENCAISSEMENT_DATE_SQL, [DEPOSIT_MODES, date_remise]),
+            })
+        by_date = {}
+        for record in self:
+            date = record.date_encaissement or (
+                date_remise if record.mode in DEPOSIT_MODES else record.date)
+            by_date.setdefault(date, self.browse())
+            by_date[date] |= record
+        for date, records in by_date.items():
+            records.write(dict(vals, state='encaisse', date_encaissement=date))
+        return True
+
+    def _check_encaissement(self, date_remise):
+        """Équivalent ensembliste de ``_check_cheque``/``_check_dates`` avant encaissement."""
+        errors = self._encaissement_errors(date_remise)
+        if not errors:
+            return
+        details = '\n'.join(
+            '- %s : %s' % (name, message) for _id, name, message in errors[:MAX_REPORTED_ERRORS])
+        if len(errors) > MAX_REPORTED_ERRORS:
+            details += '\n' + _('... et %s autre(s).', len(errors) - MAX_REPORTED_ERRORS)
+        raise ValidationError(_('%s règlement(s) ne peuvent pas être encaissés :\n%s', len(errors), details))
+
+    def _encaissement_errors(self, date_remise):
+        """Règlements qui ne peuvent pas être encaissés, en une requête : ``(id, nom, motif)``."""
+        if not self:
+            return []
+        self.flush_recordset(['name', 'state', 'mode', 'num_cheque', 'date', 'date_encaissement'])
+        self.env.cr.execute("""
+            SELECT id, name,
+                   CASE
+                       WHEN state NOT IN ('brouillon', 'valide') THEN 'state'
+                       WHEN mode = 'cheque' AND COALESCE(num_cheque, '') = '' THEN 'cheque'
+                       WHEN COALESCE(date_encaissement,
+                                     CASE WHEN mode IN %(modes)s THEN %(date)s::date ELSE date END
+                                    ) < date THEN 'date'
+                   END AS error
+              FROM syndic_reglement
+             WHERE id IN %(ids)s
+               AND (state NOT IN ('brouillon', 'valide')
+                    OR (mode = 'cheque' AND COALESCE(num_cheque, '') = '')
+                    OR COALESCE(date_encaissement,
+                                CASE WHEN mode IN %(modes)s THEN %(date)s::date ELSE date END
+                               ) < date)
+          ORDER BY name
+        """, {'ids': tuple(self.ids), 'modes': DEPOSIT_MODES, 'date': date_remise})
+        messages = {
+            'state': _('état incompatible avec l\'encaissement'),
+            'cheque': _('numéro de chèque manquant'),
+            'date': _('date d\'encaissement antérieure à la date de paiement'),
+        }
+        return [(record_id, name, messages[error]) for record_id, name, error in self.env.cr.fetchall()]
 
     def action_reject(self):
-        self.write({'state': 'rejete'})
+        self._set_state('rejete')
 
     def action_cancel(self):
-        self.write({'state': 'annule'})
+        self._set_state('annule')
 
     def action_draft(self):
-        self.write({'state': 'brouillon'})
+        self._set_state('brouillon')
+
+    def _bulk_after_state(self, state, old_states):
+        super(Reglement, self)._bulk_after_state(state, old_states)
+        # L'écriture SQL contourne write() : relettrer si l'encaissement change
+        if state == 'encaisse' or 'encaisse' in old_states.values():
+            self.env['syndic.reglement.allocation']._reallocate(self.person_id.ids)
+            self.env['syndic.collection.cube']._mark_dirty(self._cube_keys())
 
     def action_print_receipt(self):
         """Imprimer le reçu de paiement"""
         self.write({'is_printed': True})
-        return self.env.ref('syndic_cotisation.action_report_reglement_receipt').report_action(self)
+        return self.env.ref(RECEIPT_REPORT_ACTION).report_action(self)
+
+    def action_print_receipts_mass(self):
+        """Impression en masse : rendu par lots, cache PDF par reçu.
+
+        Le PDF fusionné est porté par un enregistrement transitoire (nettoyé
+        par le ramasse-miettes) et téléchargé depuis celui-ci. Une sélection
+        qui tient en un lot est rendue dans la requête ; au-delà, le rendu
+        est confié à la file (tâche planifiée) qui répartit les lots sur
+        plusieurs threads à partir des données validées.
+        """
+        not_printable = self.filtered(lambda r: r.state not in ('valide', 'encaisse'))
+        if not_printable:
+            raise UserError(_(
+                'Seuls les règlements validés ou encaissés peuvent être imprimés '
+                '(%s règlement(s) à retirer de la sélection).', len(not_printable)))
+        self.write({'is_printed': True})
+        Download = self.env['syndic.receipt.download']
+        if len(self) > self._receipt_chunk_size():
+            return Download._enqueue(self).action_open()
+        pdfs = self._get_receipt_pdfs()
+        download = Download.create({
+            'pdf_filename': Download._default_pdf_filename(),
+            'pdf_file': merge_pdf([pdfs[record.id] for record in self]),
+        })
+        return download.action_download()
+
+    @api.model
+    def _receipt_chunk_size(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'syndic_cotisation.receipt_chunk_size', 200))
+
+    def _receipt_hash(self, salt=''):
+        """Empreinte du contenu imprimé : change dès que le reçu doit être re-rendu."""
+        self.ensure_one()
+        content = repr((
+            salt, self.name, self.num_recu, self.date, self.montant, self.mode, self.state,
+            self.person_id.name, self.person_id.display_name, self.apartment_id.display_name,
+            self.appel_fond_id.name, self.residence_id.name,
+        ))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _get_receipt_pdfs(self, workers=1):
+        """PDF de chaque reçu, servis depuis les pièces jointes si inchangés.
+
+        Les reçus absents du cache ou modifiés sont rendus par lots de
+        ``syndic_cotisation.receipt_chunk_size``, puis mis en cache. Voir
+        ``_render_receipt_chunks`` pour ``workers``.
+        """
+        Attachment = self.env['ir.attachment'].sudo()
+        # Une modification du gabarit invalide tout le cache
+        salt = str(self.env.ref(RECEIPT_REPORT).sudo().write_date)
+        keys = {record.id: RECEIPT_CACHE_PREFIX + record._receipt_hash(salt) for record in self}
+        cached = Attachment.search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('description', '=like', RECEIPT_CACHE_PREFIX + '%'),
+        ])
+        pdfs = {att.res_id: att.raw for att in cached if att.description == keys[att.res_id]}
+        todo = self.filtered(lambda r: r.id not in pdfs)
+        if not todo:
+            return pdfs
+
+        rendered = todo._render_receipts(workers)
+        cached.filtered(lambda att: att.res_id in rendered).unlink()
+        Attachment.create([{
+            'name': _('Reçu - %s.pdf', record.name),
+            'raw': rendered[record.id],
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+            'res_id': record.id,
+            'description': keys[record.id],
+        } for record in todo])
+        pdfs.update(rendered)
+        return pdfs
+
+    def _render_receipts(self, workers=1):
+        pdfs = self._render_receipt_chunks(workers)
+        # Lot non découpable par reçu : rendu unitaire des manquants
+        for record in self.filtered(lambda r: r.id not in pdfs):
+            pdfs[record.id] = self.env['ir.actions.report']._render_qweb_pdf(
+                RECEIPT_REPORT_ACTION, record.ids)[0]
+        return pdfs
+
+    def _render_receipt_chunks(self, workers=1):
+        """Rend les reçus par lots, un processus wkhtmltopdf par lot.
+
+        Par défaut le rendu reste dans le curseur courant : il voit les
+        données non encore validées et rien n'est validé en cas d'échec.
+        Avec ``workers`` > 1, les lots sont répartis sur autant de threads
+        ayant chacun leur curseur : ils ne voient que les données validées,
+        ce que seule la file de rendu (``syndic.receipt.download``) garantit.
+        """
+        chunk_size = self._receipt_chunk_size()
+        chunks = [self.ids[i:i + chunk_size] for i in range(0, len(self), chunk_size)]
+        testing = getattr(threading.current_thread(), 'testing', False)
+        pdfs = {}
+        if workers <= 1 or len(chunks) == 1 or testing:
+            Report = self.env['ir.actions.report']
+            for chunk in chunks:
+                pdfs.update(_stream_pdfs(Report._render_qweb_pdf_prepare_streams(
+                    RECEIPT_REPORT_ACTION, {}, res_ids=chunk)))
+        else:
+            args = (self.env.cr.dbname, self.env.uid, dict(self.env.context))
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                for chunk_pdfs in executor.map(lambda chunk: _render_receipt_chunk(*args, chunk), chunks):
+                    pdfs.update(chunk_pdfs)
+        _logger.info("Reçus: %d PDF rendus en %d lot(s).", len(pdfs), len(chunks))
+        return pdfs
 
     # ------------------------------------------------------------------
     # CONTRAINTES
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+# Intersection des intervalles cumulés [début, fin[ des dus et des paiements
+# d'une même poche : c'est l'imputation FIFO, calculée en une seule requête.
+FIFO_INSERT = """
+    INSERT INTO syndic_reglement_allocation (
+        reglement_id, appel_fond_line_id, appel_fond_id, person_id, apartment_id,
+        residence_id, date, montant, create_uid, create_date, write_uid, write_date
+    )
+    SELECT p.reglement_id, d.line_id, d.appel_fond_id, d.person_id, d.apartment_id,
+           d.residence_id, p.date,
+           LEAST(d.d_end, p.p_end) - GREATEST(d.d_start, p.p_start),
+           %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+      FROM dues d
+      JOIN pays p ON p.pocket = d.pocket
+               AND d.d_start < p.p_end
+               AND p.p_start < d.d_end
+"""
+
+
+class ReglementAllocation(models.Model):
+    _name = 'syndic.reglement.allocation'
+    _description = 'Imputation d\'un règlement sur une ligne d\'appel (lettrage)'
+    _order = 'date, id'
+
+    reglement_id = fields.Many2one(
+        'syndic.reglement',
+        string='Règlement',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    appel_fond_line_id = fields.Many2one(
+        'syndic.appel.fond.line',
+        string='Ligne d\'appel',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    appel_fond_id = fields.Many2one(
+        'syndic.appel.fond',
+        string='Appel de fonds',
+        index=True
+    )
+    person_id = fields.Many2one(
+        'syndic.person',
+        string='Personne',
+        index=True
+    )
+    apartment_id = fields.Many2one(
+        'syndic.apartment',
+        string='Appartement'
+    )
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        index=True
+    )
+    date = fields.Date(string='Date du règlement')
+    montant = fields.Float(string='Montant imputé')
+
+    @api.model
+    def _reallocate(self, person_ids):
+        """Recalcule le lettrage FIFO de toutes les poches de ces personnes.
+
+        1. Les règlements encaissés rattachés à un appartement soldent les
+           lignes les plus anciennes de ce même appartement.
+        2. Les règlements sans appartement soldent ensuite le reste dû des
+           lignes les plus anciennes de la personne, tous lots confondus.
+        Chaque passe est une seule requête ensembliste, quel que soit le
+        nombre de personnes.
+        """
+        person_ids = tuple(set(person_ids) - {False})
+        if not person_ids:
+            return
+        self.env['syndic.reglement'].flush_model(
+            ['person_id', 'apartment_id', 'state', 'active', 'date', 'montant'])
+        self.env['syndic.appel.fond.line'].flush_model(
+            ['person_id', 'apartment_id', 'state', 'montant', 'date_echeance'])
+        self.env['syndic.appel.fond'].flush_model(['active', 'date_emission'])
+        cr = self.env.cr
+        params = {'uid': self.env.uid, 'person_ids': person_ids}
+        cr.execute("DELETE FROM syndic_reglement_allocation WHERE person_id IN %(person_ids)s", params)
+
+        # Passe 1 : poche (personne, appartement)
+        cr.execute("""
+            WITH dues AS (
+                SELECT l.id AS line_id, l.appel_fond_id, l.person_id, l.apartment_id, l.residence_id,
+                       ARRAY[l.person_id, l.apartment_id] AS pocket,
+                       SUM(l.montant) OVER w - l.montant AS d_start,
+                       SUM(l.montant) OVER w AS d_end
+                  FROM syndic_appel_fond_line l
+                  JOIN syndic_appel_fond af ON af.id = l.appel_fond_id
+                 WHERE l.person_id IN %(person_ids)s
+                   AND l.state IN ('confirme', 'envoye')
+                   AND af.active
+                   AND l.montant > 0
+                WINDOW w AS (
+                    PARTITION BY l.person_id, l.apartment_id
+                    ORDER BY COALESCE(l.date_echeance, af.date_emission), l.appel_fond_id, l.id
+                )
+            ), pays AS (
+                SELECT r.id AS reglement_id, r.date,
+                       ARRAY[r.person_id, r.apartment_id] AS pocket,
+                       SUM(r.montant) OVER w - r.montant AS p_start,
+                       SUM(r.montant) OVER w AS p_end
+                  FROM syndic_reglement r
+                 WHERE r.person_id IN %(person_ids)s
+                   AND r.apartment_id IS NOT NULL
+                   AND r.state = 'encaisse'
+                   AND r.active
+                   AND r.montant > 0
+                WINDOW w AS (PARTITION BY r.person_id, r.apartment_id ORDER BY r.date, r.id)
+            )
+        """ + FIFO_INSERT, params)
+
+        # Passe 2 : poche (personne), sur le reste dû après la passe 1
+        cr.execute("""
+            WITH allocated AS (
+                SELECT appel_fond_line_id, SUM(montant) AS montant
+                  FROM syndic_reglement_allocation
+                 WHERE person_id IN %(person_ids)s
+              GROUP BY appel_fond_line_id
+            ), remaining AS (
+                SELECT l.id AS line_id, l.appel_fond_id, l.person_id, l.apartment_id, l.residence_id,
+                       l.montant - COALESCE(a.montant, 0) AS reste,
+                       COALESCE(l.date_echeance, af.date_emission) AS echeance
+                  FROM syndic_appel_fond_line l
+                  JOIN syndic_appel_fond af ON af.id = l.appel_fond_id
+             LEFT JOIN allocated a ON a.appel_fond_line_id = l.id
+                 WHERE l.person_id IN %(person_ids)s
+                   AND l.state IN ('confirme', 'envoye')
+                   AND af.active
+                   AND l.montant - COALESCE(a.montant, 0) > 0.000001
+            ), dues AS (
+                SELECT line_id, appel_fond_id, person_id, apartment_id, residence_id,
+                       ARRAY[person_id] AS pocket,
+                       SUM(reste) OVER w - reste AS d_start,
+                       SUM(reste) OVER w AS d_end
+                  FROM remaining
+                WINDOW w AS (PARTITION BY person_id ORDER BY echeance, appel_fond_id, line_id)
+            ), pays AS (
+                SELECT r.id AS reglement_id, r.date,
+                       ARRAY[r.person_id] AS pocket,
+                       SUM(r.montant) OVER w - r.montant AS p_start,
+                       SUM(r.montant) OVER w AS p_end
+                  FROM syndic_reglement r
+                 WHERE r.person_id IN %(person_ids)s
+                   AND r.apartment_id IS NULL
+                   AND r.state = 'encaisse'
+                   AND r.active
+                   AND r.montant > 0
+                WINDOW w AS (PARTITION BY r.person_id ORDER BY r.date, r.id)
+            )
+        """ + FIFO_INSERT, params)
+        self.invalidate_model()
+        self.env['syndic.reglement'].invalidate_model(['allocation_ids'])
+        _logger.debug("Lettrage recalculé pour %d personne(s).", len(person_ids))
+
+    @api.model
+    def _reallocate_residences(self, residence_ids):
+        """Relettre toutes les personnes ayant des dus ou des règlements dans ces résidences."""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT person_id FROM syndic_appel_fond_line WHERE residence_id IN %(ids)s
+             UNION
+            SELECT r.person_id
+              FROM syndic_reglement r
+         LEFT JOIN syndic_apartment a ON a.id = r.apartment_id
+             WHERE COALESCE(r.residence_id, a.residence_id) IN %(ids)s
+        """, {'ids': tuple(residence_ids)})
+        person_ids = [row[0] for row in self.env.cr.fetchall()]
+        self._reallocate(person_ids)
+        return len(person_ids)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+
+class RepartitionKey(models.Model):
+    _name = 'syndic.repartition.key'
+    _description = 'Clé de répartition (tantièmes)'
+    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _order = 'residence_id, code'
+
+    name = fields.Char(string='Nom', required=True, tracking=True)
+    code = fields.Char(string='Code', required=True, tracking=True)
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        tracking=True
+    )
+    category_ids = fields.Many2many(
+        'syndic.charge_category',
+        string='Catégories de charges',
+        help='Catégories réparties par défaut avec cette clé'
+    )
+    line_ids = fields.One2many(
+        'syndic.repartition.key.line',
+        'key_id',
+        string='Tantièmes par lot'
+    )
+    total_tantiemes = fields.Float(
+        string='Total tantièmes',
+        compute='_compute_totals',
+        store=True
+    )
+    nb_lots = fields.Integer(
+        string='Nombre de lots',
+        compute='_compute_totals',
+        store=True
+    )
+    active = fields.Boolean(string='Actif', default=True)
+
+    _sql_constraints = [
+        ('residence_code_unique', 'UNIQUE(residence_id, code)',
+         'Ce code de clé existe déjà pour cette résidence!'),
+    ]
+
+    @api.depends('line_ids.tantiemes')
+    def _compute_totals(self):
+        totals = {
+            key: (count, tantiemes)
+            for key, count, tantiemes in self.env['syndic.repartition.key.line']._read_group(
+                [('key_id', 'in', self.ids)], ['key_id'], ['__count', 'tantiemes:sum'])
+        }
+        for record in self:
+            record.nb_lots, record.total_tantiemes = totals.get(record, (0, 0.0))
+
+    def action_fill_from_quote_parts(self):
+        """Ajoute les lots manquants avec pour poids la somme des quotes-parts actives.
+
+        Comme pour la génération des appels, les lots et immeubles archivés
+        sont ignorés.
+        """
+        Line = self.env['syndic.repartition.key.line']
+        self.env['syndic.person.apartment'].flush_model(
+            ['residence_id', 'apartment_id', 'quote_part', 'active'])
+        self.env['syndic.apartment'].flush_model(['building_id', 'active'])
+        self.env['syndic.building'].flush_model(['active'])
+        Line.flush_model(['key_id', 'apartment_id'])
+        self.env.cr.execute("""
+            INSERT INTO syndic_repartition_key_line (
+                key_id, apartment_id, tantiemes, create_uid, create_date, write_uid, write_date
+            )
+            SELECT k.id, pa.apartment_id, SUM(pa.quote_part),
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM syndic_repartition_key k
+              JOIN syndic_person_apartment pa ON pa.residence_id = k.residence_id AND pa.active
+              JOIN syndic_apartment a ON a.id = pa.apartment_id AND a.active
+              JOIN syndic_building b ON b.id = a.building_id AND b.active
+             WHERE k.id IN %(ids)s
+          GROUP BY k.id, pa.apartment_id
+            ON CONFLICT (key_id, apartment_id) DO NOTHING
+            RETURNING id
+        """, {'uid': self.env.uid, 'ids': tuple(self.ids)})
+        lines = Line.browse([row[0] for row in self.env.cr.fetchall()])
+        self.invalidate_recordset(['line_ids'])
+        lines.modified(['key_id', 'apartment_id', 'tantiemes'], create=True)
+
+
+class RepartitionKeyLine(models.Model):
+    _name = 'syndic.repartition.key.line'
+    _description = 'Tantièmes d\'un lot pour une clé de répartition'
+    _order = 'key_id, apartment_id'
+
+    key_id = fields.Many2one(
+        'syndic.repartition.key',
+        string='Clé',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    residence_id = fields.Many2one(
+        related='key_id.residence_id',
+        store=True,
+        readonly=True
+    )
+    apartment_id = fields.Many2one(
+        'syndic.apartment',
+        string='Appartement',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    tantiemes = fields.Float(string='Tantièmes', required=True, default=0.0)
+
+    _sql_constraints = [
+        ('key_apartment_unique', 'UNIQUE(key_id, apartment_id)',
+         'Ce lot a déjà des tantièmes pour cette clé!'),
+        ('tantiemes_positive', 'CHECK(tantiemes >= 0)',
+         'Les tantièmes ne peuvent pas être négatifs!'),
+    ]
+
+    @api.constrains('key_id', 'apartment_id')
+    def _check_residence(self):
+        for record in self:
+            if record.apartment_id.residence_id != record.key_id.residence_id:
+                raise ValidationError(_(
+                    'Le lot %s n\'appartient pas à la résidence de la clé %s.',
+                    record.apartment_id.display_name, record.key_id.name))
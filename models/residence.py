@@ -47,19 +47,33 @@ class Residence(models.Model):
         'residence_id',
         string='Appels de fonds'
     )
+    person_apartment_ids = fields.One2many(
+        'syndic.person.apartment',
+        'residence_id',
+        string='Copropriétés'
+    )
     
+    apartment_ids = fields.One2many(
+        'syndic.apartment',
+        'residence_id',
+        string='Appartements'
+    )
+
     # Computed fields
     building_count = fields.Integer(
         string='Nombre d\'immeubles',
-        compute='_compute_building_count'
+        compute='_compute_building_count',
+        store=True
     )
     apartment_count = fields.Integer(
         string='Nombre d\'appartements',
-        compute='_compute_apartment_count'
+        compute='_compute_apartment_count',
+        store=True
     )
     owner_count = fields.Integer(
         string='Nombre de propriétaires',
-        compute='_compute_owner_count'
+        compute='_compute_owner_count',
+        store=True
     )
     
     active = fields.Boolean(
@@ -67,27 +81,55 @@ class Residence(models.Model):
         default=True
     )
     
-    @api.depends('building_ids')
+    @api.depends('building_ids', 'building_ids.active')
     def _compute_building_count(self):
+        counts = dict(self.env['syndic.building']._read_group(
+            [('residence_id', 'in', self.ids)], ['residence_id'], ['__count']))
         for record in self:
-            record.building_count = len(record.building_ids)
+            record.building_count = counts.get(record, 0)
     
-    @api.depends('building_ids.apartment_ids')
+    @api.depends('apartment_ids', 'apartment_ids.active', 'building_ids.active')
     def _compute_apartment_count(self):
+        counts = dict(self.env['syndic.apartment']._read_group(
+            [('residence_id', 'in', self.ids), ('building_id.active', '=', True)],
+            ['residence_id'], ['__count']))
         for record in self:
-            record.apartment_count = sum(
-                len(building.apartment_ids) for building in record.building_ids
-            )
+            record.apartment_count = counts.get(record, 0)
     
-    @api.depends('building_ids.apartment_ids.person_apartment_ids')
+    @api.depends(
+        'person_apartment_ids.person_id',
+        'person_apartment_ids.active',
+        'apartment_ids.active',
+        'building_ids.active',
+    )
     def _compute_owner_count(self):
+        PersonApartment = self.env['syndic.person.apartment']
+        counts = dict(PersonApartment._read_group(
+            PersonApartment._residence_links_domain(self.ids),
+            ['residence_id'], ['person_id:count_distinct']))
         for record in self:
-            person_ids = set()
-            for building in record.building_ids:
-                for apartment in building.apartment_ids:
-                    for pa in apartment.person_apartment_ids:
-                        person_ids.add(pa.person_id.id)
-            record.owner_count = len(person_ids)
+            record.owner_count = counts.get(record, 0)
+
+    def write(self, vals):
+        res = super(Residence, self).write(vals)
+        if 'name' in vals:
+            # Noms des immeubles recalculés en une requête
+            self.env['syndic.display.name.mixin']._cascade_display_names()
+        return res
+    
+    def action_reallocate(self):
+        """Refait le lettrage FIFO de tous les règlements des résidences."""
+        nb_persons = self.env['syndic.reglement.allocation']._reallocate_residences(self.ids)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Lettrage'),
+                'message': _('Lettrage recalculé pour %s personne(s).', nb_persons),
+                'type': 'success',
+                'sticky': False,
+            },
+        }
     
     _sql_constraints = [
         ('name_unique', 'UNIQUE(name)', 'Le nom de la résidence doit être unique!')
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import psycopg2
+
+from odoo import models, fields, api, _
+from odoo.osv import expression
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+SEARCH_UNACCENT_PARAM = 'syndic_cotisation.search_unaccent'
+
+# Même table de correspondance en Python et en SQL (translate), sans dépendre
+# de l'extension unaccent : la clé peut aussi être recalculée en SQL.
+ACCENTS_FROM = 'àâäáãåçéèêëíìîïñóòôöõúùûüýÿ'
+ACCENTS_TO = 'aaaaaaceeeeiiiinooooouuuuyy'
+UNACCENT_TABLE = str.maketrans(ACCENTS_FROM, ACCENTS_TO)
+
+
+def normalize_search(value):
+    """Forme de recherche : minuscules, sans accents."""
+    return (value or '').lower().translate(UNACCENT_TABLE)
+
+
+def normalize_search_sql(expr):
+    """Équivalent SQL de ``normalize_search`` appliqué à l'expression ``expr``."""
+    return "translate(lower(%s), '%s', '%s')" % (expr, ACCENTS_FROM, ACCENTS_TO)
+
+
+class SearchMixin(models.AbstractModel):
+    """Recherche rapide et classée pour les listes déroulantes (many2one).
+
+    Les champs de ``_search_key_fields`` sont concaténés dans ``search_key``
+    (minuscules, sans accents), indexé en trigrammes (pg_trgm). Le
+    ``_name_search`` classe les résultats : correspondance exacte sur
+    ``_search_exact_fields`` (CIN, email, téléphone...), puis préfixe du nom,
+    puis similarité trigramme.
+    """
+    _name = 'syndic.search.mixin'
+    _description = 'Recherche rapide (trigrammes)'
+
+    _search_key_fields = ()
+    _search_exact_fields = ()
+
+    search_key = fields.Char(
+        string='Clé de recherche',
+        compute='_compute_search_key',
+        store=True,
+        index='trigram',
+        unaccent=False,
+        readonly=True
+    )
+
+    def _auto_init(self):
+        # pg_trgm avant la création des index : sinon Odoo se rabat sur un btree
+        if not self.pool.has_trigram:
+            try:
+                with self.env.cr.savepoint(flush=False):
+                    self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                self.pool.has_trigram = True
+            except psycopg2.Error:
+                _logger.warning(
+                    "Extension pg_trgm indisponible : la recherche rapide utilisera des index btree.")
+        return super(SearchMixin, self)._auto_init()
+
+    @api.depends(lambda self: self._search_key_fields)
+    def _compute_search_key(self):
+        for record in self:
+            record.search_key = normalize_search(' '.join(
+                str(record[fname]) for fname in self._search_key_fields if record[fname]))
+
+    @api.model
+    def _search_key_sql(self, alias):
+        """Expression SQL de ``search_key`` (pour les mises à jour ensemblistes)."""
+        return normalize_search_sql("concat_ws(' ', %s)" % ', '.join(
+            "NULLIF(%s.%s, '')" % (alias, fname) for fname in self._search_key_fields))
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        if not name or operator not in ('ilike', 'like', '=ilike', '=like'):
+            return super(SearchMixin, self)._name_search(name, domain, operator, limit, order)
+        term = name.strip()
+        unaccent = self.env['ir.config_parameter'].sudo().get_param(
+            SEARCH_UNACCENT_PARAM, 'True').lower() in ('1', 'true')
+        if unaccent:
+            key = normalize_search(term)
+            search_domain = [('search_key', 'ilike', key)]
+        else:
+            key = term.lower()
+            fnames = ['display_name'] + list(self._search_exact_fields)
+            search_domain = expression.OR([[(fname, 'ilike', term)] for fname in fnames])
+        # Droits et règles d'accès appliqués par _search
+        query = self._search(expression.AND([domain or [], search_domain]))
+
+        self.flush_model(list(self._search_exact_fields) + ['display_name'])
+        table = self._table
+        exact = SQL(' OR ').join(
+            SQL('lower(%s) = %s', SQL.identifier(table, fname), term.lower())
+            for fname in self._search_exact_fields
+        ) if self._search_exact_fields else SQL('FALSE')
+        similarity = SQL('similarity(%s, %s)', SQL.identifier(table, 'search_key'), key) \
+            if self.pool.has_trigram else SQL('0')
+        self.env.cr.execute(SQL("""
+            SELECT %(table)s.id
+              FROM %(table)s
+             WHERE %(table)s.id IN %(ids)s
+          ORDER BY (%(exact)s) DESC,
+                   (%(search_key)s LIKE %(prefix)s) DESC,
+                   %(similarity)s DESC,
+                   %(table)s.display_name, %(table)s.id
+             LIMIT %(limit)s
+        """,
+            table=SQL.identifier(table),
+            ids=query.subselect(),
+            exact=exact,
+            search_key=SQL.identifier(table, 'search_key'),
+            prefix=normalize_search(term) + '%',
+            similarity=similarity,
+            limit=limit,
+        ))
+        return [row[0] for row in self.env.cr.fetchall()]
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import test_export_api
+from . import test_receipt_rendering
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+from urllib.parse import urlencode
+
+from odoo.tests import HttpCase, tagged
+
+from ..models.export_api import EXPORT_SAFETY_PARAM, encode_token, decode_token
+
+
+@tagged('post_install', '-at_install')
+class TestExportApi(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestExportApi, cls).setUpClass()
+        # Lignes de la transaction de test exportables sans attendre le délai
+        cls.env['ir.config_parameter'].sudo().set_param(EXPORT_SAFETY_PARAM, -60)
+        person = cls.env['syndic.person'].create({
+            'name': 'Export', 'prenom': 'Test', 'cin': 'SYNDIC-EXPORT-TEST',
+        })
+        cls.reglements = cls.env['syndic.reglement'].create([
+            {'person_id': person.id, 'montant': 100.0 + i, 'mode': 'virement'}
+            for i in range(3)
+        ])
+        cls.env.flush_all()
+        # Les règlements créés ici sont les plus récents : le jeton placé juste
+        # avant le premier isole l'export des données déjà présentes en base.
+        cls.env.cr.execute("SELECT write_date FROM syndic_reglement WHERE id = %s",
+                           [cls.reglements[0].id])
+        cls.write_date = cls.env.cr.fetchone()[0]
+        cls.since = encode_token('syndic.reglement', cls.write_date, cls.reglements[0].id - 1)
+
+    def setUp(self):
+        super(TestExportApi, self).setUp()
+        self.authenticate('admin', 'admin')
+
+    def _export(self, **params):
+        response = self.url_open('/syndic/export/reglements?%s' % urlencode(params))
+        self.assertEqual(response.status_code, 200, response.text)
+        return response
+
+    def test_token_round_trip(self):
+        token = encode_token('syndic.reglement', self.write_date, 42)
+        self.assertEqual(decode_token('syndic.reglement', token), (self.write_date, 42))
+        response = self.url_open('/syndic/export/appels?%s' % urlencode({'since': token}))
+        self.assertEqual(response.status_code, 400, "Un jeton d'un autre modèle doit être refusé")
+        response = self.url_open('/syndic/export/reglements?since=invalide')
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_ndjson(self):
+        ids = self.reglements.ids
+        response = self._export(since=self.since, limit=2)
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row['id'] for row in rows], ids[:2])
+        self.assertEqual(response.headers['X-Syndic-Has-More'], '1')
+        token = response.headers['X-Syndic-Next-Token']
+        self.assertEqual(decode_token('syndic.reglement', token), (self.write_date, ids[1]))
+
+        response = self._export(since=token, limit=2)
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row['id'] for row in rows], ids[2:])
+        self.assertEqual(rows[0]['montant'], 102.0)
+        self.assertEqual(response.headers['X-Syndic-Has-More'], '0')
+        token = response.headers['X-Syndic-Next-Token']
+
+        # Rien de nouveau : réponse vide, le jeton reste valable
+        response = self._export(since=token)
+        self.assertEqual(response.text, '')
+        self.assertEqual(response.headers['X-Syndic-Has-More'], '0')
+        self.assertEqual(response.headers['X-Syndic-Next-Token'], token)
+
+    def test_csv(self):
+        response = self._export(since=self.since, limit=3, format='csv')
+        self.assertTrue(response.headers['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        self.assertEqual([int(row['id']) for row in rows], self.reglements.ids)
+        self.assertEqual([float(row['montant']) for row in rows], [100.0, 101.0, 102.0])
+        self.assertIn('write_date', rows[0])
+        self.assertEqual(response.headers['X-Syndic-Has-More'], '0')
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.addons.base.models import ir_actions_report
+from odoo.tests import TransactionCase, tagged
+
+from ..models.reglement import RECEIPT_REPORT_ACTION
+
+
+@tagged('post_install', '-at_install')
+class TestReceiptRendering(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestReceiptRendering, cls).setUpClass()
+        person = cls.env['syndic.person'].create({
+            'name': 'Reçu', 'prenom': 'Test', 'cin': 'SYNDIC-RECEIPT-TEST',
+        })
+        cls.reglements = cls.env['syndic.reglement'].create([
+            {'person_id': person.id, 'montant': 100.0 + i, 'mode': 'virement'}
+            for i in range(3)
+        ])
+        cls.reglements.action_validate()
+        cls.env['ir.config_parameter'].sudo().set_param('syndic_cotisation.receipt_chunk_size', 2)
+
+    def test_render_chunks(self):
+        if ir_actions_report.wkhtmltopdf_state != 'ok':
+            self.skipTest("wkhtmltopdf n'est pas disponible")
+        pdfs = self.reglements._render_receipt_chunks()
+        self.assertEqual(set(pdfs), set(self.reglements.ids))
+        for pdf in pdfs.values():
+            self.assertTrue(pdf.startswith(b'%PDF'))
+
+        # Deuxième passage servi depuis le cache des pièces jointes
+        cached = self.reglements._get_receipt_pdfs()
+        with patch.object(type(self.reglements), '_render_receipts') as render:
+            self.assertEqual(self.reglements._get_receipt_pdfs(), cached)
+        render.assert_not_called()
+
+    def test_unsplittable_chunk(self):
+        """Un lot sans découpage par reçu est rendu reçu par reçu."""
+        def prepare_streams(report_ref, data, res_ids=None):
+            self.assertEqual(report_ref, RECEIPT_REPORT_ACTION)
+            return {False: {'stream': None, 'attachment': None}}
+
+        def render_pdf(report_ref, res_ids=None, data=None):
+            self.assertEqual(report_ref, RECEIPT_REPORT_ACTION)
+            return b'%PDF-' + str(res_ids[0]).encode(), 'pdf'
+
+        Report = type(self.env['ir.actions.report'])
+        with patch.object(Report, '_render_qweb_pdf_prepare_streams', side_effect=prepare_streams), \
+                patch.object(Report, '_render_qweb_pdf', side_effect=render_pdf):
+            pdfs = self.reglements._render_receipts()
+        self.assertEqual(pdfs, {
+            record.id: b'%PDF-' + str(record.id).encode() for record in self.reglements
+        })
+
+    def test_mass_print_queue(self):
+        """Au-delà d'un lot, l'impression est rendue par la file."""
+        action = self.reglements.action_print_receipts_mass()
+        download = self.env['syndic.receipt.download'].browse(action['res_id'])
+        self.assertEqual(download.state, 'pending')
+        self.assertEqual(download.reglement_ids, self.reglements)
+        self.assertTrue(all(self.reglements.mapped('is_printed')))
+
+        pdfs = {record.id: b'%PDF' for record in self.reglements}
+        with patch.object(type(self.reglements), '_get_receipt_pdfs', return_value=pdfs), \
+                patch('odoo.addons.syndic_cotisation.wizard.receipt_download.merge_pdf',
+                      return_value=b'%PDF-merged') as merge:
+            self.env['syndic.receipt.download']._cron_render_pending()
+        self.assertEqual(merge.call_count, 1)
+        self.assertEqual(download.state, 'done')
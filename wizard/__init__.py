@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from . import bank_statement_import
+from . import encaissement_wizard
+from . import ledger_export_wizard
+from . import onboarding_import
+from . import receipt_download
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import logging
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from lxml import etree
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# ``error`` : date ou montant illisible, la ligne n'est pas rapprochée
+StatementLine = namedtuple('StatementLine', ['date', 'amount', 'reference', 'label', 'error'])
+
+# Nombre maximum de lignes non rapprochées (ou illisibles) détaillées dans le compte rendu
+MAX_REPORTED_LINES = 200
+
+CSV_COLUMNS = {
+    'date': ('date', 'date operation', 'date valeur', 'booking date', 'value date'),
+    'amount': ('montant', 'amount', 'credit', 'montant credit'),
+    'reference': ('reference', 'ref', 'reference virement', 'end to end id'),
+    'label': ('libelle', 'label', 'description', 'motif', 'communication'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y%m%d')
+TOKEN_RE = re.compile(r'[A-Z0-9]{6,}')
+OFX_TAG_RE = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def _normalize(value):
+    """Majuscules sans accents ni séparateurs, pour comparer des références."""
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Z0-9]', '', value.upper())
+
+
+def _tokens(*values):
+    for value in values:
+        value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode()
+        yield from TOKEN_RE.findall(value.upper())
+
+
+def _parse_date(value):
+    """Date du relevé, ou ``None`` si aucun format ne convient."""
+    value = (value or '').strip()[:10]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    """Montant du relevé, ou ``None`` s'il est illisible."""
+    value = (value or '').strip().replace('\xa0', '').replace(' ', '')
+    if ',' in value and '.' in value:
+        value = value.replace('.', '').replace(',', '.') if value.rfind(',') > value.rfind('.') \
+            else value.replace(',', '')
+    try:
+        return float(value.replace(',', '.') or 0.0)
+    except ValueError:
+        return None
+
+
+def _statement_line(position, date, amount, reference, label, sign=1):
+    """Ligne de relevé ; une date ou un montant illisible est décrit dans ``error``."""
+    parsed_date, parsed_amount = _parse_date(date), _parse_amount(amount)
+    error = None
+    if parsed_date is None:
+        error = _('%s : date non reconnue (%s)', position, date)
+    elif parsed_amount is None:
+        error = _('%s : montant non reconnu (%s)', position, amount)
+    return StatementLine(
+        date=parsed_date,
+        amount=(parsed_amount or 0.0) * sign,
+        reference=reference,
+        label=label,
+        error=error,
+    )
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_csv(stream, delimiter=';'):
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''), delimiter=delimiter)
+    header = [_normalize(column).lower() for column in next(reader, [])]
+    index = {}
+    for key, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if _normalize(alias).lower() in header:
+                index[key] = header.index(_normalize(alias).lower())
+                break
+    if 'date' not in index or 'amount' not in index:
+        raise UserError(_('Le fichier CSV doit contenir au moins les colonnes Date et Montant.'))
+    for row in reader:
+        if not row or len(row) <= max(index.values()):
+            continue
+        yield _statement_line(
+            _('ligne %s', reader.line_num),
+            row[index['date']],
+            row[index['amount']],
+            row[index['reference']].strip() if 'reference' in index else '',
+            row[index['label']].strip() if 'label' in index else '',
+        )
+
+
+def iter_camt(stream):
+    """Entrées (Ntry) d'un relevé CAMT.053, lues au fil de l'eau."""
+    for position, (_event, entry) in enumerate(
+            etree.iterparse(stream, events=('end',), tag='{*}Ntry'), 1):
+        values = {}
+        references = []
+        for element in entry.iter():
+            name = _localname(element.tag) if isinstance(element.tag, str) else ''
+            text = (element.text or '').strip()
+            if name == 'Amt' and 'amount' not in values:
+                values['amount'] = text
+            elif name == 'CdtDbtInd' and 'sign' not in values:
+                values['sign'] = -1 if text == 'DBIT' else 1
+            elif name == 'Dt' and _localname(element.getparent().tag) in ('BookgDt', 'ValDt'):
+                values.setdefault('date', text)
+            elif name in ('EndToEndId', 'AcctSvcrRef', 'InstrId') and text and text != 'NOTPROVIDED':
+                references.append(text)
+            elif name == 'Ustrd' and text:
+                values['label'] = ' '.join(filter(None, (values.get('label'), text)))
+        if 'date' in values and 'amount' in values:
+            yield _statement_line(
+                _('entrée %s', position),
+                values['date'],
+                values['amount'],
+                references[0] if references else '',
+                values.get('label', ''),
+                sign=values.get('sign', 1),
+            )
+        # Libère les éléments déjà traités : mémoire constante
+        entry.clear()
+        while entry.getprevious() is not None:
+            del entry.getparent()[0]
+
+
+def iter_ofx(stream):
+    """Transactions (STMTTRN) d'un fichier OFX, en SGML comme en XML."""
+    values = None
+    position = 0
+    for raw_line in io.TextIOWrapper(stream, encoding='latin-1', newline=''):
+        for tag, text in OFX_TAG_RE.findall(raw_line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                values = {}
+            elif values is not None and text.strip():
+                values[tag] = text.strip()
+        if values is not None and '</STMTTRN>' in raw_line.upper():
+            position += 1
+            if 'DTPOSTED' in values and 'TRNAMT' in values:
+                yield _statement_line(
+                    _('transaction %s', position),
+                    values['DTPOSTED'][:8],
+                    values['TRNAMT'],
+                    values.get('REFNUM') or values.get('FITID', ''),
+                    ' '.join(filter(None, (values.get('NAME'), values.get('MEMO')))),
+                )
+            values = None
+
+
+class BankStatementImport(models.TransientModel):
+    _name = 'syndic.bank.statement.import'
+    _description = 'Import de relevé bancaire et rapprochement des virements'
+
+    # Stocké en pièce jointe : le relevé est relu depuis le filestore, en flux
+    data_file = fields.Binary(
+        string='Relevé bancaire',
+        required=True,
+        attachment=True
+    )
+    filename = fields.Char(string='Nom du fichier')
+    file_format = fields.Selection([
+        ('auto', 'Détection automatique'),
+        ('csv', 'CSV'),
+        ('camt', 'CAMT.053'),
+        ('ofx', 'OFX'),
+    ], string='Format', default='auto', required=True)
+    csv_delimiter = fields.Char(
+        string='Séparateur CSV',
+        default=';',
+        size=1
+    )
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        help='Limiter le rapprochement aux règlements et appels de cette résidence'
+    )
+    date_window = fields.Integer(
+        string='Tolérance de date (jours)',
+        default=5,
+        help='Écart maximal entre la date du relevé et la date du règlement '
+             'pour un rapprochement sur le seul montant'
+    )
+
+    # Résultat
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('error', 'Erreurs'),
+        ('done', 'Terminé'),
+    ], default='draft')
+    nb_lines = fields.Integer(string='Lignes lues', readonly=True)
+    nb_invalid = fields.Integer(string='Lignes illisibles', readonly=True)
+    nb_matched = fields.Integer(string='Règlements rapprochés', readonly=True)
+    nb_created = fields.Integer(string='Règlements créés', readonly=True)
+    nb_unmatched = fields.Integer(string='Lignes non rapprochées', readonly=True)
+    nb_rejected = fields.Integer(string='Règlements non encaissés', readonly=True)
+    report = fields.Text(string='Compte rendu', readonly=True)
+
+    # ------------------------------------------------------------------
+    # LECTURE
+    # ------------------------------------------------------------------
+    def _detect_format(self, head):
+        if self.file_format != 'auto':
+            return self.file_format
+        head = head.lstrip().upper()
+        if b'<DOCUMENT' in head or b'CAMT.053' in head:
+            return 'camt'
+        if b'OFXHEADER' in head or b'<OFX>' in head:
+            return 'ofx'
+        return 'csv'
+
+    def _open_statement(self):
+        """Fichier binaire du relevé, ouvert directement dans le filestore si possible."""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'data_file'),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_('Aucun relevé bancaire à importer.'))
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw)
+
+    def _iter_statement_lines(self):
+        with self._open_statement() as stream:
+            file_format = self._detect_format(stream.read(2048))
+            stream.seek(0)
+            if file_format == 'camt':
+                yield from iter_camt(stream)
+            elif file_format == 'ofx':
+                yield from iter_ofx(stream)
+            else:
+                yield from iter_csv(stream, self.csv_delimiter or ';')
+
+    # ------------------------------------------------------------------
+    # INDEX DE RAPPROCHEMENT
+    # ------------------------------------------------------------------
+    def _build_payment_index(self):
+        """Règlements en attente indexés par référence et par montant (en centimes).
+
+        Retourne aussi la date de chaque règlement.
+        """
+        domain = [('state', 'in', ('brouillon', 'valide'))]
+        if self.residence_id:
+            domain.append(('residence_id', '=', self.residence_id.id))
+        by_reference = defaultdict(list)
+        by_amount = defaultdict(list)
+        dates = {}
+        for payment in self.env['syndic.reglement'].search_read(
+                domain, ['name', 'reference_virement', 'montant', 'date'], load=None):
+            cents = round(payment['montant'] * 100)
+            for reference in (payment['reference_virement'], payment['name']):
+                if reference:
+                    by_reference[(_normalize(reference), cents)].append(payment['id'])
+            by_amount[cents].append((payment['date'], payment['id']))
+            dates[payment['id']] = payment['date']
+        return by_reference, by_amount, dates
+
+    def _build_call_line_index(self):
+        """Lignes d'appels ouvertes (sans règlement) indexées par référence d'appel et montant."""
+        self.env.flush_all()
+        query = """
+            SELECT l.id, af.name, l.montant
+              FROM syndic_appel_fond_line l
+              JOIN syndic_appel_fond af ON af.id = l.appel_fond_id
+             WHERE l.state IN ('confirme', 'envoye')
+               AND (%(residence_id)s IS NULL OR l.residence_id = %(residence_id)s)
+               AND NOT EXISTS (
+                   SELECT 1 FROM syndic_reglement r
+                    WHERE r.appel_fond_id = l.appel_fond_id
+                      AND r.person_id = l.person_id
+                      AND (r.apartment_id = l.apartment_id OR r.apartment_id IS NULL)
+                      AND r.state NOT IN ('annule', 'rejete')
+                      AND r.active
+               )
+        """
+        self.env.cr.execute(query, {'residence_id': self.residence_id.id or None})
+        by_call = defaultdict(list)
+        for line_id, call_name, montant in self.env.cr.fetchall():
+            by_call[(_normalize(call_name), round(montant * 100))].append(line_id)
+        return by_call
+
+    # ------------------------------------------------------------------
+    # RAPPROCHEMENT
+    # ------------------------------------------------------------------
+    def action_import(self):
+        self.ensure_one()
+        by_reference, by_amount, payment_dates = self._build_payment_index()
+        by_call = self._build_call_line_index()
+        window = timedelta(days=max(self.date_window, 0))
+        used = set()
+        matched = defaultdict(list)     # date d'encaissement -> règlements
+        to_create = []                  # (ligne d'appel, ligne de relevé)
+        unmatched = []
+        invalid = []
+        nb_lines = 0
+
+        for line in self._iter_statement_lines():
+            if line.error:
+                invalid.append(line.error)
+                continue
+            if line.amount <= 0:
+                continue
+            nb_lines += 1
+            cents = round(line.amount * 100)
+            tokens = [_normalize(line.reference)] + list(_tokens(line.reference, line.label))
+
+            # 1. Référence du virement (ou du règlement) et montant
+            payment_id = next((
+                candidate for token in tokens
+                for candidate in by_reference.get((token, cents), ())
+                if candidate not in used
+            ), None)
+            # 2. Montant seul, si un unique règlement tombe dans la fenêtre de dates
+            if payment_id is None:
+                candidates = [
+                    candidate for date, candidate in by_amount.get(cents, ())
+                    if candidate not in used and abs(date - line.date) <= window
+                ]
+                if len(candidates) == 1:
+                    payment_id = candidates[0]
+            if payment_id is not None:
+                used.add(payment_id)
+                # L'encaissement ne peut précéder la date du règlement
+                matched[max(line.date, payment_dates[payment_id])].append(payment_id)
+                continue
+            # 3. Ligne d'appel ouverte citée dans le libellé
+            call_line_id = next((
+                candidate for token in tokens
+                for candidate in by_call.get((token, cents), ())
+                if ('line', candidate) not in used
+            ), None)
+            if call_line_id is not None:
+                used.add(('line', call_line_id))
+                to_create.append((call_line_id, line))
+                continue
+            unmatched.append(line)
+
+        if invalid:
+            # Relevé à corriger : toutes les lignes illisibles, aucun règlement modifié
+            report = '\n'.join(invalid[:MAX_REPORTED_LINES])
+            if len(invalid) > MAX_REPORTED_LINES:
+                report += '\n' + _('... et %s autre(s) ligne(s).', len(invalid) - MAX_REPORTED_LINES)
+            self.write({'state': 'error', 'nb_invalid': len(invalid), 'report': report})
+            _logger.info("Relevé %s: %d ligne(s) illisible(s), rien n'a été importé.",
+                         self.filename, len(invalid))
+            return self._reopen()
+
+        created = self._create_payments_from_call_lines(to_create)
+        for payment in created:
+            matched[payment.date].append(payment.id)
+        rejected = self._cash_matched_payments(matched)
+
+        report = '\n'.join(
+            '%s  %.2f  %s  %s' % (line.date, line.amount, line.reference, line.label)
+            for line in unmatched[:MAX_REPORTED_LINES]
+        )
+        if len(unmatched) > MAX_REPORTED_LINES:
+            report += '\n' + _('... et %s autre(s) ligne(s).', len(unmatched) - MAX_REPORTED_LINES)
+        if rejected:
+            report = '\n'.join(filter(None, [
+                report,
+                _('Règlements rapprochés mais non encaissés :'),
+                '\n'.join('- %s : %s' % (name, message) for name, message in rejected[:MAX_REPORTED_LINES]),
+            ]))
+            if len(rejected) > MAX_REPORTED_LINES:
+                report += '\n' + _('... et %s autre(s).', len(rejected) - MAX_REPORTED_LINES)
+        self.write({
+            'state': 'done',
+            'nb_invalid': 0,
+            'nb_lines': nb_lines,
+            'nb_matched': sum(len(ids) for ids in matched.values()) - len(created) - len(rejected),
+            'nb_created': len(created),
+            'nb_unmatched': len(unmatched),
+            'nb_rejected': len(rejected),
+            'report': report,
+        })
+        _logger.info("Relevé %s: %d lignes, %d rapprochées, %d créées, %d non rapprochées.",
+                     self.filename, nb_lines, self.nb_matched, len(created), len(unmatched))
+        return self._reopen()
+
+    def action_retry(self):
+        self.ensure_one()
+        self.write({'state': 'draft', 'nb_invalid': 0, 'report': False})
+        return self._reopen()
+
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _create_payments_from_call_lines(self, to_create):
+        if not to_create:
+            return self.env['syndic.reglement']
+        call_lines = self.env['syndic.appel.fond.line'].browse([line_id for line_id, _line in to_create])
+        call_lines.fetch(['appel_fond_id', 'person_id', 'apartment_id'])
+        return self.env['syndic.reglement'].create([{
+            'person_id': call_line.person_id.id,
+            'apartment_id': call_line.apartment_id.id,
+            'appel_fond_id': call_line.appel_fond_id.id,
+            'mode': 'virement',
+            'date': statement_line.date,
+            'montant': statement_line.amount,
+            'reference_virement': statement_line.reference or statement_line.label[:64],
+        } for call_line, (_line_id, statement_line) in zip(call_lines, to_create)])
+
+    def _cash_matched_payments(self, matched):
+        """Passe les règlements rapprochés à l'état encaissé, une écriture par date de relevé.
+
+        Les règlements refusés par les contrôles d'encaissement
+        (``_encaissement_errors``) sont retirés de ``matched`` et retournés
+        en ``(nom, motif)`` pour le compte rendu. Au-delà du seuil du mode
+        masse, une requête par date et un message récapitulatif par appel
+        de fonds remplacent le suivi par règlement.
+        """
+        Reglement = self.env['syndic.reglement']
+        rejected = []
+        for date, payment_ids in matched.items():
+            errors = Reglement.browse(payment_ids)._encaissement_errors(date)
+            if errors:
+                excluded = {payment_id for payment_id, _name, _message in errors}
+                payment_ids[:] = [payment_id for payment_id in payment_ids if payment_id not in excluded]
+                rejected += [(name, message) for _id, name, message in errors]
+            if payment_ids:
+                Reglement.browse(payment_ids)._set_state('encaisse', {'date_encaissement': date})
+        return rejected
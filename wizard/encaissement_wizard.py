@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class EncaissementWizard(models.TransientModel):
+    _name = 'syndic.encaissement.wizard'
+    _description = 'Encaissement en masse des règlements'
+
+    reglement_ids = fields.Many2many(
+        'syndic.reglement',
+        string='Règlements',
+        default=lambda self: self._default_reglement_ids()
+    )
+    date_remise = fields.Date(
+        string='Date de remise',
+        required=True,
+        default=fields.Date.context_today,
+        help='Date d\'encaissement des chèques et espèces ; les autres modes '
+             'sont encaissés à leur date de paiement.'
+    )
+    create_bordereau = fields.Boolean(
+        string='Créer un bordereau de remise',
+        default=True
+    )
+    bank_account_id = fields.Many2one(
+        'syndic.bank_account',
+        string='Compte bancaire'
+    )
+    reference_banque = fields.Char(string='Référence banque')
+
+    nb_reglements = fields.Integer(string='Règlements', compute='_compute_summary')
+    nb_cheques = fields.Integer(string='Chèques', compute='_compute_summary')
+    montant_total = fields.Float(string='Montant total', compute='_compute_summary')
+
+    @api.model
+    def _default_reglement_ids(self):
+        if self.env.context.get('active_model') == 'syndic.reglement':
+            return [(6, 0, self.env.context.get('active_ids', []))]
+        return False
+
+    @api.depends('reglement_ids')
+    def _compute_summary(self):
+        for wizard in self:
+            reglements = wizard.reglement_ids
+            wizard.nb_reglements = len(reglements)
+            wizard.nb_cheques = len(reglements.filtered(lambda r: r.mode == 'cheque'))
+            wizard.montant_total = sum(reglements.mapped('montant'))
+
+    def action_encaisser(self):
+        self.ensure_one()
+        reglements = self.reglement_ids
+        if not reglements:
+            raise UserError(_('Aucun règlement à encaisser.'))
+        bordereau = self.env['syndic.bordereau.remise']
+        if self.create_bordereau:
+            bordereau = bordereau.create({
+                'date': self.date_remise,
+                'bank_account_id': self.bank_account_id.id,
+                'reference_banque': self.reference_banque,
+            })
+        reglements.action_encaisse(date_remise=self.date_remise, bordereau=bordereau)
+        _logger.info("Encaissement en masse : %d règlement(s), bordereau %s.",
+                     len(reglements), bordereau.name or '-')
+        if not bordereau:
+            return {'type': 'ir.actions.act_window_close'}
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': bordereau._name,
+            'res_id': bordereau.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
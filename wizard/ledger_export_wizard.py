@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import logging
+
+import xlsxwriter
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from ..models.export_api import iter_named_cursor
+
+_logger = logging.getLogger(__name__)
+
+# Lignes par feuille XLSX (limite Excel : 1 048 576, en-tête compris)
+XLSX_MAX_ROWS = 1000000
+
+# Grand livre : appels (débit) et encaissements (crédit) par copropriétaire,
+# solde progressif par fenêtre SQL. Les mouvements antérieurs à la date de
+# début alimentent le solde sans être restitués.
+LEDGER_QUERY = """
+    SELECT p.display_name, m.date, m.piece, m.libelle, a.display_name,
+           m.debit, m.credit, m.solde
+      FROM (
+            SELECT mv.*,
+                   SUM(mv.debit - mv.credit) OVER (
+                       PARTITION BY mv.person_id ORDER BY mv.date, mv.sens, mv.id
+                   ) AS solde
+              FROM (
+                    SELECT l.person_id, l.apartment_id,
+                           COALESCE(l.date_echeance, af.date_emission) AS date,
+                           af.name AS piece, af.libelle,
+                           l.montant AS debit, 0 AS credit, 0 AS sens, l.id
+                      FROM syndic_appel_fond_line l
+                      JOIN syndic_appel_fond af ON af.id = l.appel_fond_id
+                     WHERE l.residence_id = %(residence_id)s
+                       AND l.state IN ('confirme', 'envoye') AND af.active
+                 UNION ALL
+                    SELECT r.person_id, r.apartment_id,
+                           COALESCE(r.date_encaissement, r.date),
+                           r.name, COALESCE(r.num_recu, ''),
+                           0, r.montant, 1, r.id
+                      FROM syndic_reglement r
+                 LEFT JOIN syndic_apartment ra ON ra.id = r.apartment_id
+                     WHERE COALESCE(r.residence_id, ra.residence_id) = %(residence_id)s
+                       AND r.state = 'encaisse' AND r.active
+                   ) mv
+             WHERE mv.date <= %(date_to)s
+               AND (%(person_ids)s IS NULL OR mv.person_id = ANY(%(person_ids)s))
+           ) m
+      JOIN syndic_person p ON p.id = m.person_id
+ LEFT JOIN syndic_apartment a ON a.id = m.apartment_id
+     WHERE %(date_from)s IS NULL OR m.date >= %(date_from)s
+  ORDER BY p.display_name, m.person_id, m.date, m.sens, m.id
+"""
+
+
+class LedgerExportWizard(models.TransientModel):
+    _name = 'syndic.ledger.export.wizard'
+    _description = 'Export du grand livre des copropriétaires'
+
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        required=True,
+        default=lambda self: self._default_residence_id()
+    )
+    person_ids = fields.Many2many(
+        'syndic.person',
+        string='Copropriétaires',
+        help='Laisser vide pour exporter tous les copropriétaires de la résidence'
+    )
+    date_from = fields.Date(string='Du')
+    date_to = fields.Date(
+        string='Au',
+        required=True,
+        default=fields.Date.context_today
+    )
+    file_format = fields.Selection([
+        ('xlsx', 'Excel (XLSX)'),
+        ('csv', 'CSV'),
+    ], string='Format', required=True, default='xlsx')
+
+    @api.model
+    def _default_residence_id(self):
+        if self.env.context.get('active_model') == 'syndic.residence':
+            return self.env.context.get('active_id')
+        return False
+
+    def _ledger_headers(self):
+        return [_('Copropriétaire'), _('Date'), _('Pièce'), _('Libellé / N° reçu'), _('Lot'),
+                _('Débit'), _('Crédit'), _('Solde')]
+
+    def _ledger_filename(self):
+        self.ensure_one()
+        return '%s - %s.%s' % (_('Grand livre'), self.residence_id.name, self.file_format)
+
+    def _ledger_batches(self):
+        """Lots de lignes du grand livre, lus par un curseur serveur nommé."""
+        self.ensure_one()
+        if self.date_from and self.date_from > self.date_to:
+            raise UserError(_('La date de début doit précéder la date de fin.'))
+        # Requête SQL directe : droits vérifiés explicitement
+        for model_name in ('syndic.reglement', 'syndic.appel.fond.line'):
+            self.env[model_name].check_access_rights('read')
+        self.residence_id.check_access_rule('read')
+        for model_name in ('syndic.appel.fond', 'syndic.appel.fond.line', 'syndic.reglement',
+                           'syndic.apartment', 'syndic.person'):
+            self.env[model_name].flush_model()
+        params = {
+            'residence_id': self.residence_id.id,
+            'person_ids': self.person_ids.ids or None,
+            'date_from': self.date_from or None,
+            'date_to': self.date_to,
+        }
+        return iter_named_cursor(self.env.cr, LEDGER_QUERY, params)
+
+    def _write_ledger(self, fileobj):
+        """Écrit le grand livre dans ``fileobj`` (binaire) au fil de la lecture.
+
+        Mémoire bornée : les lignes arrivent par lots du curseur serveur et
+        le classeur XLSX est écrit en mode ``constant_memory`` (une nouvelle
+        feuille est ouverte au-delà de ``XLSX_MAX_ROWS`` lignes).
+        """
+        self.ensure_one()
+        count = 0
+        if self.file_format == 'csv':
+            stream = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+            writer = csv.writer(stream)
+            writer.writerow(self._ledger_headers())
+            for rows in self._ledger_batches():
+                writer.writerows(rows)
+                count += len(rows)
+            stream.flush()
+            stream.detach()
+        else:
+            workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True, 'in_memory': False})
+            bold = workbook.add_format({'bold': True})
+            date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+            amount_format = workbook.add_format({'num_format': '#,##0.00'})
+            sheet, row_index = None, XLSX_MAX_ROWS
+            for rows in self._ledger_batches():
+                for row in rows:
+                    if row_index >= XLSX_MAX_ROWS:
+                        sheet = workbook.add_worksheet('%s %d' % (_('Grand livre'), len(workbook.worksheets()) + 1))
+                        sheet.write_row(0, 0, self._ledger_headers(), bold)
+                        sheet.set_column(0, 0, 30)
+                        sheet.set_column(2, 4, 20)
+                        row_index = 1
+                    sheet.write_string(row_index, 0, row[0] or '')
+                    sheet.write_datetime(row_index, 1, row[1], date_format)
+                    sheet.write_row(row_index, 2, [value or '' for value in row[2:5]])
+                    sheet.write_row(row_index, 5, row[5:8], amount_format)
+                    row_index += 1
+                count += len(rows)
+            if sheet is None:
+                workbook.add_worksheet(_('Grand livre')).write_row(0, 0, self._ledger_headers(), bold)
+            workbook.close()
+        _logger.info("Grand livre %s : %d ligne(s) exportée(s) (%s).",
+                     self.residence_id.name, count, self.file_format)
+        return count
+
+    def action_export(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/syndic/ledger/%s' % self.id,
+            'target': 'self',
+        }
@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+import base64
+import csv
+import io
+import logging
+import re
+import unicodedata
+
+from markupsafe import Markup, escape
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Nombre maximum d'erreurs détaillées dans le compte rendu
+MAX_REPORTED_ERRORS = 500
+
+# Colonnes attendues par fichier et intitulés acceptés (sans accents, minuscules)
+LOT_COLUMNS = {
+    'immeuble': ('immeuble', 'batiment', 'building'),
+    'lot': ('lot', 'numero', 'num', 'numero lot'),
+    'type': ('type', 'type lot'),
+    'etage': ('etage', 'floor'),
+    'surface': ('surface', 'surface m2'),
+    'pieces': ('pieces', 'nb pieces', 'nombre pieces'),
+}
+PERSON_COLUMNS = {
+    'ref': ('ref', 'reference', 'code', 'code coproprietaire'),
+    'nom': ('nom', 'name'),
+    'prenom': ('prenom', 'first name'),
+    'societe': ('societe', 'raison sociale'),
+    'cin': ('cin',),
+    'passeport': ('passeport', 'passport'),
+    'email': ('email', 'e-mail', 'mail'),
+    'tel': ('tel', 'telephone'),
+    'mobile': ('mobile', 'gsm'),
+    'adresse': ('adresse', 'address'),
+    'ville': ('ville', 'city'),
+}
+LINK_COLUMNS = {
+    'ref': ('ref', 'reference', 'ref personne', 'code coproprietaire'),
+    'immeuble': ('immeuble', 'batiment', 'building'),
+    'lot': ('lot', 'numero', 'num', 'numero lot'),
+    'statut': ('statut', 'qualite'),
+    'quote_part': ('quote part', 'quote-part', 'quotepart', 'tantiemes'),
+    'part': ('part', 'part %', 'pourcentage'),
+    'date_debut': ('date debut', 'debut', 'date entree'),
+    'date_fin': ('date fin', 'fin', 'date sortie'),
+}
+
+STAGING_LOT = 'syndic_onboarding_lot'
+STAGING_PERSON = 'syndic_onboarding_person'
+STAGING_LINK = 'syndic_onboarding_link'
+
+# Conversion tolérante des dates (ISO ou jj/mm/aaaa) : NULL si invalide
+DATE_FUNCTION = r"""
+    CREATE OR REPLACE FUNCTION pg_temp.syndic_onboarding_date(value text) RETURNS date
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    BEGIN
+        IF value ~ '^\d{4}-\d{2}-\d{2}$' THEN
+            RETURN to_date(value, 'YYYY-MM-DD');
+        ELSIF value ~ '^\d{2}/\d{2}/\d{4}$' THEN
+            RETURN to_date(value, 'DD/MM/YYYY');
+        END IF;
+        RETURN NULL;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END
+    $$
+"""
+
+# Valeurs positives uniquement (comme les contraintes des modèles), bornées
+# pour que les conversions ::float et ::int de l'insertion ne puissent échouer
+NUMBER_RE = r'^\d{1,12}([.,]\d{1,12})?$'
+INTEGER_RE = r'^\d{1,9}$'
+# Même motif que ``syndic.person._check_email``
+EMAIL_RE = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+# Immeubles et lots déjà présents dans la résidence, par nom d'immeuble normalisé
+EXISTING_CTE = """
+    building_map AS (
+        SELECT DISTINCT ON (lower(name)) lower(name) AS key, id
+          FROM syndic_building
+         WHERE residence_id = %(residence_id)s
+      ORDER BY lower(name), id
+    ), existing_lot AS (
+        SELECT bm.key, a.num, a.id
+          FROM syndic_apartment a
+          JOIN building_map bm ON bm.id = a.building_id
+    )
+"""
+
+# Toutes les erreurs des trois fichiers : (fichier, ligne, code, valeur)
+VALIDATION_QUERY = r"""
+    WITH {existing}, lots AS (
+        SELECT s.*, row_number() OVER (PARTITION BY lower(s.immeuble), s.lot ORDER BY s.line) AS rank
+          FROM syndic_onboarding_lot s
+    ), persons AS (
+        SELECT s.*, p.id AS existing_id,
+               row_number() OVER (PARTITION BY s.ref ORDER BY s.line) AS rank_ref,
+               row_number() OVER (PARTITION BY s.cin ORDER BY s.line) AS rank_cin,
+               row_number() OVER (PARTITION BY lower(s.email) ORDER BY s.line) AS rank_email
+          FROM syndic_onboarding_person s
+     LEFT JOIN syndic_person p ON p.cin = s.cin
+    ), links AS (
+        SELECT s.*, p.existing_id AS person_id, el.id AS apartment_id,
+               lower(s.immeuble) AS lot_key,
+               COALESCE(s.debut, CURRENT_DATE) AS debut_effectif,
+               (p.line IS NOT NULL) AS person_found,
+               (l.line IS NOT NULL OR el.id IS NOT NULL) AS lot_found
+          FROM syndic_onboarding_link s
+     LEFT JOIN persons p ON p.ref = s.ref AND p.rank_ref = 1
+     LEFT JOIN lots l ON lower(l.immeuble) = lower(s.immeuble) AND l.lot = s.lot AND l.rank = 1
+     LEFT JOIN existing_lot el ON el.key = lower(s.immeuble) AND el.num = s.lot
+    )
+    SELECT 'lot', line, 'required', NULL FROM lots WHERE immeuble IS NULL OR lot IS NULL
+    UNION ALL
+    SELECT 'lot', line, 'lot_type', type FROM lots WHERE lower(type) <> ALL(%(lot_types)s)
+    UNION ALL
+    SELECT 'lot', line, 'number', concat_ws(' / ', etage, pieces, surface) FROM lots
+     WHERE etage !~ '{integer}' OR pieces !~ '{integer}' OR surface !~ '{number}'
+    UNION ALL
+    SELECT 'lot', line, 'lot_duplicate', concat(immeuble, ' / ', lot) FROM lots WHERE rank > 1
+    UNION ALL
+    SELECT 'lot', s.line, 'lot_exists', concat(s.immeuble, ' / ', s.lot)
+      FROM lots s JOIN existing_lot el ON el.key = lower(s.immeuble) AND el.num = s.lot
+    UNION ALL
+    SELECT 'person', line, 'required', NULL FROM persons WHERE ref IS NULL OR (nom IS NULL AND societe IS NULL)
+    UNION ALL
+    SELECT 'person', line, 'ref_duplicate', ref FROM persons WHERE ref IS NOT NULL AND rank_ref > 1
+    UNION ALL
+    SELECT 'person', line, 'identity', ref FROM persons
+     WHERE cin IS NULL AND passeport IS NULL AND societe IS NULL
+    UNION ALL
+    SELECT 'person', line, 'email', email FROM persons WHERE email !~ '{email}'
+    UNION ALL
+    SELECT 'person', line, 'cin_duplicate', cin FROM persons WHERE cin IS NOT NULL AND rank_cin > 1
+    UNION ALL
+    SELECT 'person', line, 'email_duplicate', email FROM persons WHERE email IS NOT NULL AND rank_email > 1
+    UNION ALL
+    SELECT 'person', s.line, 'email_used', s.email
+      FROM persons s JOIN syndic_person p ON p.email = s.email
+     WHERE p.id IS DISTINCT FROM s.existing_id
+    UNION ALL
+    SELECT 'link', line, 'link_person', ref FROM links WHERE NOT person_found
+    UNION ALL
+    SELECT 'link', line, 'link_lot', concat(immeuble, ' / ', lot) FROM links WHERE NOT lot_found
+    UNION ALL
+    SELECT 'link', line, 'statut', statut FROM links WHERE lower(statut) <> ALL(%(statuts)s)
+    UNION ALL
+    SELECT 'link', line, 'quote_part', quote_part FROM links
+     WHERE quote_part IS NULL OR quote_part !~ '{number}'
+    UNION ALL
+    SELECT 'link', line, 'part', part FROM links
+     WHERE CASE WHEN part ~ '{number}' THEN replace(part, ',', '.')::float NOT BETWEEN 0 AND 100
+                ELSE part IS NOT NULL END
+    UNION ALL
+    SELECT 'link', line, 'date', concat_ws(' / ', date_debut, date_fin) FROM links
+     WHERE (date_debut IS NOT NULL AND debut IS NULL) OR (date_fin IS NOT NULL AND fin IS NULL)
+    UNION ALL
+    SELECT 'link', line, 'date_order', concat_ws(' / ', date_debut, date_fin) FROM links WHERE fin < debut_effectif
+    UNION ALL
+    SELECT 'link', n.line, 'overlap', concat(n.ref, ' / ', n.immeuble, ' / ', n.lot)
+      FROM links n
+     WHERE EXISTS (
+           SELECT 1 FROM links m
+            WHERE m.ref = n.ref AND m.lot_key = n.lot_key AND m.lot = n.lot AND m.line < n.line
+              AND daterange(m.debut_effectif, m.fin, '[]') && daterange(n.debut_effectif, n.fin, '[]'))
+        OR EXISTS (
+           SELECT 1 FROM syndic_person_apartment pa
+            WHERE pa.person_id = n.person_id AND pa.apartment_id = n.apartment_id AND pa.active
+              AND pa.date_debut IS NOT NULL
+              AND (pa.date_fin IS NULL OR pa.date_fin >= pa.date_debut)
+              AND daterange(pa.date_debut, pa.date_fin, '[]') && daterange(n.debut_effectif, n.fin, '[]'))
+    UNION ALL
+    SELECT 'link', MIN(line), 'part_total', concat(MIN(immeuble), ' / ', lot, ' : ', SUM(replace(COALESCE(part, '100'), ',', '.')::float))
+      FROM links
+     WHERE COALESCE(lower(statut), 'proprietaire') = 'proprietaire' AND fin IS NULL
+       AND COALESCE(part, '100') ~ '{number}'
+  GROUP BY lot_key, lot
+    HAVING SUM(replace(COALESCE(part, '100'), ',', '.')::float) > 100.001
+    UNION ALL
+    SELECT 'link', NULL, 'quote_part_total', round(total::numeric, 4)::text
+      FROM (
+            SELECT COALESCE((SELECT SUM(quote_part) FROM syndic_person_apartment
+                              WHERE residence_id = %(residence_id)s AND active), 0)
+                 + COALESCE((SELECT SUM(replace(quote_part, ',', '.')::float) FROM links
+                              WHERE quote_part ~ '{number}'), 0) AS total
+           ) t
+     WHERE %(quote_part_total)s > 0 AND abs(total - %(quote_part_total)s) > 0.0001
+  ORDER BY 1, 2
+""".format(existing=EXISTING_CTE, integer=INTEGER_RE, number=NUMBER_RE,
+           email=EMAIL_RE.replace('%', '%%'))
+
+
+def _column_key(value):
+    """Intitulé de colonne comparable : minuscules, sans accents ni espaces superflus."""
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[\s_]+', ' ', value.strip().lower())
+
+
+class OnboardingImport(models.TransientModel):
+    """Reprise d'une copropriété depuis les fichiers du syndic précédent.
+
+    Trois fichiers CSV (lots, personnes, copropriétés) sont chargés par COPY
+    dans des tables temporaires, contrôlés en SQL (toutes les erreurs sont
+    remontées ensemble) puis insérés en masse : identifiants réservés sur
+    les séquences, noms affichés et clés de recherche calculés en SQL,
+    compteurs recalculés par agrégation. Ni suivi de messagerie ni
+    contrainte Python par enregistrement : les règles équivalentes sont
+    vérifiées sur les tables de transit.
+    """
+    _name = 'syndic.onboarding.import'
+    _description = 'Reprise d\'une copropriété (import en masse)'
+
+    residence_id = fields.Many2one(
+        'syndic.residence',
+        string='Résidence',
+        required=True,
+        default=lambda self: self._default_residence_id()
+    )
+    lots_file = fields.Binary(string='Lots', required=True, attachment=False)
+    lots_filename = fields.Char(string='Fichier des lots')
+    persons_file = fields.Binary(string='Personnes', required=True, attachment=False)
+    persons_filename = fields.Char(string='Fichier des personnes')
+    links_file = fields.Binary(string='Copropriétés', required=True, attachment=False)
+    links_filename = fields.Char(string='Fichier des copropriétés')
+    csv_delimiter = fields.Char(
+        string='Séparateur CSV',
+        default=';',
+        size=1
+    )
+    quote_part_total = fields.Float(
+        string='Total des quotes-parts attendu',
+        help='Somme attendue des quotes-parts actives de la résidence après import '
+             '(par exemple 1 ou 1000) ; 0 pour ne pas contrôler'
+    )
+
+    # Résultat
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('error', 'Erreurs'),
+        ('done', 'Terminé'),
+    ], default='draft')
+    nb_errors = fields.Integer(string='Erreurs', readonly=True)
+    nb_buildings = fields.Integer(string='Immeubles créés', readonly=True)
+    nb_apartments = fields.Integer(string='Lots créés', readonly=True)
+    nb_persons = fields.Integer(string='Personnes créées', readonly=True)
+    nb_persons_matched = fields.Integer(string='Personnes existantes (CIN)', readonly=True)
+    nb_links = fields.Integer(string='Copropriétés créées', readonly=True)
+    report = fields.Text(string='Compte rendu', readonly=True)
+
+    @api.model
+    def _default_residence_id(self):
+        if self.env.context.get('active_model') == 'syndic.residence':
+            return self.env.context.get('active_id')
+        return False
+
+    # ------------------------------------------------------------------
+    # CHARGEMENT (COPY)
+    # ------------------------------------------------------------------
+    def _copy_to_staging(self, table, source, columns, data, filename):
+        """Crée la table de transit ``table`` et y charge le fichier par COPY.
+
+        Le fichier est relu ligne à ligne par ``csv.reader`` avant le COPY :
+        les lignes vides sont ignorées, les lignes au nombre de colonnes
+        différent de l'en-tête sont complétées ou tronquées et signalées, et
+        chaque ligne est chargée avec son numéro de ligne physique dans le
+        fichier. Les colonnes reconnues prennent leur nom canonique, les
+        autres sont chargées sous ``extra_<n>`` et ignorées. Toutes les
+        valeurs sont du texte, débarrassé des espaces ; les conversions se
+        font en SQL.
+
+        Retourne les erreurs de structure ``(source, ligne, code, valeur)``.
+        """
+        delimiter = self.csv_delimiter or ';'
+        stream = io.TextIOWrapper(io.BytesIO(base64.b64decode(data)), encoding='utf-8-sig', newline='')
+        reader = csv.reader(stream, delimiter=delimiter)
+        errors = []
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        try:
+            header = next((row for row in reader if any(value.strip() for value in row)), [])
+            if not header:
+                raise UserError(_('Le fichier %s est vide ou sans ligne d\'en-tête.', filename))
+            width = len(header)
+            start = reader.line_num + 1
+            for row in reader:
+                if any(value.strip() for value in row):
+                    if len(row) != width:
+                        errors.append((source, start, 'columns', _('%s au lieu de %s', len(row), width)))
+                        row = (row + [''] * width)[:width]
+                    writer.writerow([start] + row)
+                # Une valeur entre guillemets peut s'étendre sur plusieurs lignes
+                start = reader.line_num + 1
+        except csv.Error as e:
+            raise UserError(_('Fichier %s, ligne %s : %s', filename, reader.line_num, e))
+        buffer.seek(0)
+
+        aliases = {_column_key(alias): key for key, names in columns.items() for alias in names}
+        names = []
+        for index, title in enumerate(header):
+            key = aliases.get(_column_key(title))
+            names.append(key if key and key not in names else 'extra_%d' % index)
+        names_sql = ', '.join(names)
+        columns_sql = ', '.join('%s text' % name for name in names + [key for key in columns if key not in names])
+        cr = self.env.cr
+        cr.execute("DROP TABLE IF EXISTS %s" % table)
+        cr.execute("CREATE TEMP TABLE %s (line int, %s) ON COMMIT DROP" % (table, columns_sql))
+        cr.copy_expert("COPY %s (line, %s) FROM STDIN WITH (FORMAT csv)" % (table, names_sql), buffer)
+        cr.execute("UPDATE %s SET %s" % (table, ', '.join(
+            '%s = NULLIF(btrim(%s), \'\')' % (key, key) for key in columns)))
+        return errors
+
+    def _load_staging(self):
+        """Charge les trois fichiers ; retourne leurs erreurs de structure."""
+        cr = self.env.cr
+        errors = self._copy_to_staging(STAGING_LOT, 'lot', LOT_COLUMNS, self.lots_file,
+                                       self.lots_filename or _('des lots'))
+        errors += self._copy_to_staging(STAGING_PERSON, 'person', PERSON_COLUMNS, self.persons_file,
+                                        self.persons_filename or _('des personnes'))
+        errors += self._copy_to_staging(STAGING_LINK, 'link', LINK_COLUMNS, self.links_file,
+                                        self.links_filename or _('des copropriétés'))
+        cr.execute(DATE_FUNCTION)
+        cr.execute("""
+            ALTER TABLE syndic_onboarding_link ADD debut date, ADD fin date;
+            UPDATE syndic_onboarding_link
+               SET debut = pg_temp.syndic_onboarding_date(date_debut),
+                   fin = pg_temp.syndic_onboarding_date(date_fin);
+            ALTER TABLE syndic_onboarding_lot ADD building_id int, ADD new_building boolean, ADD apartment_id int;
+            ALTER TABLE syndic_onboarding_person ADD person_id int, ADD new_person boolean;
+            ANALYZE syndic_onboarding_lot;
+            ANALYZE syndic_onboarding_person;
+            ANALYZE syndic_onboarding_link;
+        """)
+        return errors
+
+    # ------------------------------------------------------------------
+    # CONTRÔLES
+    # ------------------------------------------------------------------
+    def _validate_staging(self):
+        """Liste ``(fichier, ligne, code, valeur)`` de toutes les erreurs, en une requête."""
+        self.env['syndic.person'].flush_model(['cin', 'email'])
+        self.env['syndic.person.apartment'].flush_model(
+            ['person_id', 'apartment_id', 'residence_id', 'quote_part', 'date_debut', 'date_fin', 'active'])
+        self.env['syndic.apartment'].flush_model(['num', 'building_id'])
+        self.env['syndic.building'].flush_model(['name', 'residence_id'])
+        self.env.cr.execute(VALIDATION_QUERY, {
+            'residence_id': self.residence_id.id,
+            'lot_types': [value for value, _label in self.env['syndic.apartment']._fields['type'].selection],
+            'statuts': [value for value, _label in self.env['syndic.person.apartment']._fields['statut'].selection],
+            'quote_part_total': self.quote_part_total or 0.0,
+        })
+        return self.env.cr.fetchall()
+
+    def _format_errors(self, errors):
+        sources = {
+            'lot': _('Lots'),
+            'person': _('Personnes'),
+            'link': _('Copropriétés'),
+        }
+        messages = {
+            'columns': _('nombre de colonnes différent de l\'en-tête'),
+            'required': _('champ obligatoire manquant'),
+            'lot_type': _('type de lot inconnu'),
+            'number': _('valeur numérique invalide, négative ou trop grande'),
+            'lot_duplicate': _('lot en double dans le fichier'),
+            'lot_exists': _('lot déjà existant dans la résidence'),
+            'ref_duplicate': _('référence en double'),
+            'identity': _('CIN ou passeport obligatoire'),
+            'email': _('email invalide'),
+            'cin_duplicate': _('CIN en double dans le fichier'),
+            'email_duplicate': _('email en double dans le fichier'),
+            'email_used': _('email déjà utilisé par une autre personne'),
+            'link_person': _('personne inconnue dans le fichier des personnes'),
+            'link_lot': _('lot inconnu'),
+            'statut': _('statut inconnu'),
+            'quote_part': _('quote-part manquante ou invalide'),
+            'part': _('part invalide (0 à 100)'),
+            'date': _('date invalide (AAAA-MM-JJ ou JJ/MM/AAAA)'),
+            'date_order': _('date de fin antérieure à la date de début'),
+            'overlap': _('période qui chevauche une autre copropriété'),
+            'part_total': _('parts des propriétaires supérieures à 100 %'),
+            'quote_part_total': _('total des quotes-parts différent du total attendu'),
+        }
+        lines = [
+            '%s%s : %s%s' % (
+                sources[source], _(', ligne %s', line) if line else '',
+                messages[code], ' (%s)' % value if value else '')
+            for source, line, code, value in errors[:MAX_REPORTED_ERRORS]
+        ]
+        if len(errors) > MAX_REPORTED_ERRORS:
+            lines.append(_('... et %s autre(s) erreur(s).', len(errors) - MAX_REPORTED_ERRORS))
+        return '\n'.join(lines)
+
+    # ------------------------------------------------------------------
+    # INSERTION
+    # ------------------------------------------------------------------
+    def _insert_from_staging(self):
+        """Insère immeubles, lots, personnes et copropriétés en une requête par table.
+
+        Retourne les enregistrements créés par modèle.
+        """
+        cr = self.env.cr
+        params = {'residence_id': self.residence_id.id, 'uid': self.env.uid}
+        log_access = "%(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'"
+
+        # Identifiants réservés sur les séquences : correspondance fichier -> id sans RETURNING
+        cr.execute("""
+            WITH {existing}
+            UPDATE syndic_onboarding_lot s
+               SET building_id = bm.id, new_building = FALSE
+              FROM building_map bm
+             WHERE bm.key = lower(s.immeuble)
+        """.format(existing=EXISTING_CTE), params)
+        cr.execute("""
+            WITH new AS (
+                SELECT key, nextval(pg_get_serial_sequence('syndic_building', 'id')) AS id
+                  FROM (SELECT DISTINCT lower(immeuble) AS key
+                          FROM syndic_onboarding_lot WHERE building_id IS NULL) k
+            )
+            UPDATE syndic_onboarding_lot s
+               SET building_id = new.id, new_building = TRUE
+              FROM new
+             WHERE new.key = lower(s.immeuble)
+        """)
+        cr.execute("""
+            UPDATE syndic_onboarding_lot
+               SET apartment_id = nextval(pg_get_serial_sequence('syndic_apartment', 'id'))
+        """)
+        cr.execute("""
+            UPDATE syndic_onboarding_person s
+               SET person_id = p.id, new_person = FALSE
+              FROM syndic_person p
+             WHERE p.cin = s.cin
+        """)
+        cr.execute("""
+            UPDATE syndic_onboarding_person
+               SET person_id = nextval(pg_get_serial_sequence('syndic_person', 'id')), new_person = TRUE
+             WHERE person_id IS NULL
+        """)
+
+        cr.execute("""
+            INSERT INTO syndic_building (
+                id, name, residence_id, nb_floors, active, create_uid, create_date, write_uid, write_date
+            )
+            SELECT DISTINCT ON (building_id) building_id, immeuble, %(residence_id)s, 1, TRUE, {log_access}
+              FROM syndic_onboarding_lot
+             WHERE new_building
+          ORDER BY building_id, line
+            RETURNING id
+        """.format(log_access=log_access), params)
+        buildings = self.env['syndic.building'].browse([row[0] for row in cr.fetchall()])
+
+        cr.execute("""
+            INSERT INTO syndic_apartment (
+                id, num, type, building_id, floor, surface, nb_rooms, active,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT apartment_id, lot, COALESCE(lower(type), 'appartement'), building_id,
+                   etage::int, replace(surface, ',', '.')::float, pieces::int, TRUE, {log_access}
+              FROM syndic_onboarding_lot
+            RETURNING id
+        """.format(log_access=log_access), params)
+        apartments = self.env['syndic.apartment'].browse([row[0] for row in cr.fetchall()])
+
+        Person = self.env['syndic.person']
+        cr.execute("""
+            INSERT INTO syndic_person (
+                id, name, prenom, type_person, cin, passport, email, tel, mobile, adresse, city,
+                is_company, company_name, active, total_paid, total_pending, total_due, balance,
+                display_name, create_uid, create_date, write_uid, write_date
+            )
+            SELECT person_id, COALESCE(nom, societe), prenom, 'proprietaire', cin, passeport, email,
+                   tel, mobile, adresse, ville, societe IS NOT NULL, societe, TRUE, 0, 0, 0, 0,
+                   CASE
+                       WHEN societe IS NOT NULL THEN societe
+                       WHEN prenom IS NOT NULL THEN concat(COALESCE(nom, societe), ' ', prenom)
+                       ELSE COALESCE(nom, societe)
+                   END,
+                   {log_access}
+              FROM syndic_onboarding_person
+             WHERE new_person
+            RETURNING id
+        """.format(log_access=log_access), params)
+        persons = Person.browse([row[0] for row in cr.fetchall()])
+        if persons:
+            cr.execute("UPDATE syndic_person t SET search_key = %s WHERE t.id IN %%s"
+                       % Person._search_key_sql('t'), [tuple(persons.ids)])
+
+        cr.execute("""
+            WITH {existing}
+            INSERT INTO syndic_person_apartment (
+                person_id, apartment_id, quote_part, part, statut, date_debut, date_fin, active,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT p.person_id, COALESCE(l.apartment_id, el.id),
+                   replace(s.quote_part, ',', '.')::float,
+                   COALESCE(replace(s.part, ',', '.')::float, 100),
+                   COALESCE(lower(s.statut), 'proprietaire'),
+                   COALESCE(s.debut, CURRENT_DATE), s.fin, TRUE, {log_access}
+              FROM syndic_onboarding_link s
+              JOIN syndic_onboarding_person p ON p.ref = s.ref
+         LEFT JOIN syndic_onboarding_lot l ON lower(l.immeuble) = lower(s.immeuble) AND l.lot = s.lot
+         LEFT JOIN existing_lot el ON el.key = lower(s.immeuble) AND el.num = s.lot
+          ORDER BY s.line
+            RETURNING id
+        """.format(existing=EXISTING_CTE, log_access=log_access), params)
+        links = self.env['syndic.person.apartment'].browse([row[0] for row in cr.fetchall()])
+
+        # Champs calculés : noms en SQL (cascade), compteurs et champs liés
+        # par les calculs ORM groupés (_read_group) au flush.
+        for records in (buildings, apartments, persons, links):
+            records.invalidate_model()
+        buildings.modified(['name', 'residence_id', 'active'], create=True)
+        apartments.modified(['num', 'type', 'building_id', 'active'], create=True)
+        links.modified(['person_id', 'apartment_id', 'quote_part', 'part', 'statut',
+                        'date_debut', 'date_fin', 'active'], create=True)
+        self.env['syndic.display.name.mixin']._cascade_display_names()
+        self.env.flush_all()
+        return buildings, apartments, persons, links
+
+    # ------------------------------------------------------------------
+    # ACTION
+    # ------------------------------------------------------------------
+    def action_import(self):
+        self.ensure_one()
+        for model_name in ('syndic.building', 'syndic.apartment', 'syndic.person', 'syndic.person.apartment'):
+            self.env[model_name].check_access_rights('create')
+        self.residence_id.check_access_rule('write')
+
+        errors = self._load_staging() + self._validate_staging()
+        errors.sort(key=lambda error: (error[0], error[1] is None, error[1] or 0))
+        if errors:
+            self.write({
+                'state': 'error',
+                'nb_errors': len(errors),
+                'report': self._format_errors(errors),
+            })
+            _logger.info("Reprise %s : %d erreur(s), aucune donnée importée.",
+                         self.residence_id.name, len(errors))
+        else:
+            buildings, apartments, persons, links = self._insert_from_staging()
+            self.env.cr.execute("SELECT COUNT(*) FROM syndic_onboarding_person WHERE NOT new_person")
+            nb_matched = self.env.cr.fetchone()[0]
+            self.write({
+                'state': 'done',
+                'nb_errors': 0,
+                'nb_buildings': len(buildings),
+                'nb_apartments': len(apartments),
+                'nb_persons': len(persons),
+                'nb_persons_matched': nb_matched,
+                'nb_links': len(links),
+                'report': False,
+            })
+            self.residence_id.message_post(
+                body=Markup('<p>%s</p>') % escape(_(
+                    'Reprise importée par %(user)s : %(buildings)s immeuble(s), %(apartments)s lot(s), '
+                    '%(persons)s personne(s) créée(s) (%(matched)s existante(s)), %(links)s copropriété(s).',
+                    user=self.env.user.name, buildings=len(buildings), apartments=len(apartments),
+                    persons=len(persons), matched=nb_matched, links=len(links))),
+                subtype_xmlid='mail.mt_note')
+            _logger.info("Reprise %s : %d immeubles, %d lots, %d personnes, %d copropriétés.",
+                         self.residence_id.name, len(buildings), len(apartments), len(persons), len(links))
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_retry(self):
+        self.ensure_one()
+        self.write({'state': 'draft', 'nb_errors': 0, 'report': False})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.pdf import merge_pdf
+
+_logger = logging.getLogger(__name__)
+
+
+class ReceiptDownload(models.TransientModel):
+    """PDF fusionné d'une impression en masse, supprimé par le ramasse-miettes.
+
+    Les grosses impressions sont mises en file (état « En cours ») et rendues
+    par la tâche planifiée, dans une transaction distincte de la requête.
+    """
+    _name = 'syndic.receipt.download'
+    _description = 'Téléchargement des reçus imprimés en masse'
+
+    state = fields.Selection([
+        ('pending', 'En cours'),
+        ('done', 'Prêt'),
+        ('error', 'Erreur'),
+    ], string='État', default='done', readonly=True)
+    reglement_ids = fields.Many2many('syndic.reglement', string='Règlements', readonly=True)
+    nb_reglements = fields.Integer(string='Nombre de reçus', compute='_compute_nb_reglements')
+    pdf_file = fields.Binary(string='Reçus', attachment=False, readonly=True)
+    pdf_filename = fields.Char(string='Nom du fichier', readonly=True)
+    error_message = fields.Text(string='Erreur', readonly=True)
+
+    @api.depends('reglement_ids')
+    def _compute_nb_reglements(self):
+        for record in self:
+            record.nb_reglements = len(record.reglement_ids)
+
+    @api.model
+    def _default_pdf_filename(self):
+        return _('Reçus - %s.pdf', fields.Datetime.now().strftime('%Y%m%d-%H%M%S'))
+
+    @api.model
+    def _enqueue(self, reglements):
+        """Met en file le rendu de ``reglements`` et réveille la tâche planifiée."""
+        download = self.create({
+            'state': 'pending',
+            'reglement_ids': [(6, 0, reglements.ids)],
+            'pdf_filename': self._default_pdf_filename(),
+        })
+        self.env.ref('syndic_cotisation.ir_cron_syndic_render_receipts').sudo()._trigger()
+        return download
+
+    def action_open(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Impression des reçus'),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content?model=%s&id=%s&field=pdf_file&filename_field=pdf_filename&download=true'
+                   % (self._name, self.id),
+            'target': 'self',
+        }
+
+    @api.model
+    def _cron_render_pending(self):
+        """Rend les impressions en file, une transaction par impression.
+
+        Les règlements ont été validés en base par la requête qui a créé
+        l'impression : les lots peuvent donc être répartis sur
+        ``syndic_cotisation.receipt_workers`` threads ayant chacun leur curseur.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'syndic_cotisation.receipt_workers', 4))
+        for download in self.search([('state', '=', 'pending')], order='id'):
+            reglements = download.reglement_ids
+            try:
+                pdfs = reglements._get_receipt_pdfs(workers=workers)
+                download.write({
+                    'state': 'done',
+                    'pdf_file': merge_pdf([pdfs[record.id] for record in reglements]),
+                })
+            except (UserError, OSError) as e:
+                _logger.warning("Reçus: échec du rendu de l'impression %s: %s", download.id, e)
+                if auto_commit:
+                    self.env.cr.rollback()
+                download.write({'state': 'error', 'error_message': str(e)})
+            if auto_commit:
+                self.env.cr.commit()